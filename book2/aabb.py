@@ -1,10 +1,12 @@
-from typing import Optional
+from typing import Optional, Tuple
+import numpy as np
+from constants import INFINITY
 from ray import Ray
 from vec import Point3
 from interval import Interval
 
 
-__all__ = ["AABB"]
+__all__ = ["AABB", "slab_test"]
 
 
 class AABB:
@@ -84,37 +86,63 @@ class AABB:
 
         Args:
             ray: The :class:`Ray` to be tested.
-            ray_t: The :class:`Interval` for the test range.
+            ray_t: The :class:`Interval` for the test range. It is left
+                untouched.
 
         Returns:
             bool: If the box can be hit by the ray.
 
         '''
-        ray_origin = ray.origin()
-        ray_dir = ray.direction()
-
-        for axis in range(3):
-            ax = self.axis_interval(axis)
-            adinv = 1.0 / ray_dir[axis]
+        t_enter, t_exit = self.slab(ray, ray_t)
+        return t_enter < t_exit
 
-            t0 = (ax.min - ray_origin[axis]) * adinv
-            t1 = (ax.max - ray_origin[axis]) * adinv
+    def slab(self, ray: "Ray", ray_t: "Interval") -> Tuple[float, float]:
+        '''
+        Clip the :class:`Interval` of the ray to the box with the slab test.
+        The reciprocal direction and the signs precomputed on the ray pick the
+        near and far plane of every axis without a division or a branch on
+        the direction.
 
-            if t0 < t1:
-                if t0 > ray_t.min:
-                    ray_t.min = t0
-                if t1 < ray_t.max:
-                    ray_t.max = t1
-            else:
-                if t1 > ray_t.min:
-                    ray_t.min = t1
-                if t0 < ray_t.max:
-                    ray_t.max = t0
+        Args:
+            ray: The :class:`Ray` to be tested.
+            ray_t: The :class:`Interval` for the test range.
 
-            if ray_t.max <= ray_t.min:
-                return False
+        Returns:
+            float: The distance where the ray enters the box.
+            float: The distance where it leaves the box. The box is missed
+                unless it is larger than the entry distance.
 
-        return True
+        '''
+        orig = ray.orig
+        ix, iy, iz = ray.inv_dir
+        sx, sy, sz = ray.sign
+        t_enter = ray_t.min
+        t_exit = ray_t.max
+
+        x = self.x
+        t0 = ((x.max if sx else x.min) - orig.x) * ix
+        t1 = ((x.min if sx else x.max) - orig.x) * ix
+        # A ray on a slab plane gives NaN, which compares false and leaves
+        # the range alone.
+        t_enter = t0 if t0 > t_enter else t_enter
+        t_exit = t1 if t1 < t_exit else t_exit
+        if t_exit <= t_enter:
+            return t_enter, t_exit
+
+        y = self.y
+        t0 = ((y.max if sy else y.min) - orig.y) * iy
+        t1 = ((y.min if sy else y.max) - orig.y) * iy
+        t_enter = t0 if t0 > t_enter else t_enter
+        t_exit = t1 if t1 < t_exit else t_exit
+        if t_exit <= t_enter:
+            return t_enter, t_exit
+
+        z = self.z
+        t0 = ((z.max if sz else z.min) - orig.z) * iz
+        t1 = ((z.min if sz else z.max) - orig.z) * iz
+        t_enter = t0 if t0 > t_enter else t_enter
+        t_exit = t1 if t1 < t_exit else t_exit
+        return t_enter, t_exit
 
     def longest_axis(self) -> int:
         '''
@@ -133,3 +161,43 @@ class AABB:
             self.y = self.y.expand(delta)
         if self.z.size() < delta:
             self.z = self.z.expand(delta)
+
+
+def slab_test(bounds: "np.ndarray", origins: "np.ndarray",
+              inv_dirs: "np.ndarray", t_min: float = 0.0,
+              t_max: float = INFINITY) -> Tuple["np.ndarray", "np.ndarray"]:
+    '''
+    The batched :meth:`AABB.slab`. The arguments broadcast against each
+    other, so one ray can be tested against many boxes, or many rays against
+    one box.
+
+    Args:
+        bounds: The boxes in the shape of ``(..., 6)``, laid out as
+            ``xmin, xmax, ymin, ymax, zmin, zmax`` like
+            :attr:`FlatBVH.bounds`.
+        origins: The ray origins in the shape of ``(..., 3)``.
+        inv_dirs: The :attr:`Ray.inv_dir` of the rays in the shape of
+            ``(..., 3)``.
+        t_min: The start of the ray interval.
+        t_max: The end of the ray interval.
+
+    Returns:
+        np.ndarray: The entry distances.
+        np.ndarray: The exit distances. A box is hit where the exit is larger
+            than the entry.
+
+    '''
+    bounds = np.asarray(bounds, dtype=float)
+    origins = np.asarray(origins, dtype=float)
+    inv_dirs = np.asarray(inv_dirs, dtype=float)
+    negative = np.signbit(inv_dirs)
+    low = bounds[..., 0::2]
+    high = bounds[..., 1::2]
+    with np.errstate(invalid='ignore'):
+        t_near = (np.where(negative, high, low) - origins) * inv_dirs
+        t_far = (np.where(negative, low, high) - origins) * inv_dirs
+    # fmax and fmin skip the NaN of a ray lying on a slab plane, like the
+    # comparisons of :meth:`AABB.slab`.
+    t_enter = np.fmax.reduce(t_near, axis=-1, initial=t_min)
+    t_exit = np.fmin.reduce(t_far, axis=-1, initial=t_max)
+    return t_enter, t_exit
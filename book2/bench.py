@@ -0,0 +1,220 @@
+import argparse
+import cProfile
+import io
+import json
+import os
+import platform
+import pstats
+import sys
+import time
+from typing import Any, Dict, List
+from bvh import FlatBVH
+from instrument import Instrumentation
+from progress import ProgressReporter
+from scenes import SCENES
+
+
+__all__ = ['run_scene', 'run', 'compare']
+
+
+# Metrics where a larger value is a regression, and where a smaller one is.
+LOWER_IS_BETTER = ('build_s', 'render_s')
+HIGHER_IS_BETTER = ('rays_per_sec', 'samples_per_sec')
+
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_scene(name: str, width: int = 64, samples_per_pixel: int = 4,
+              max_depth: int = 10, seed: int = 1, engine: str = 'scalar',
+              profile: bool = True, counters: bool = False,
+              repeats: int = 3) -> Dict[str, Any]:
+    '''
+    Benchmark one reference scene of :data:`SCENES`.
+
+    Args:
+        name: The scene name.
+        width: The image width, the height follows the scene aspect ratio.
+        samples_per_pixel: The samples of every pixel.
+        max_depth: Maximum number of ray bounces into scene.
+        seed: The camera seed.
+        engine: The render engine, see :meth:`Camera.render`.
+        profile: Render a second time under :mod:`cProfile` to split the
+            time by subsystem.
+        counters: Render once more under :class:`Instrumentation` to count
+            the rays, tests and bounces.
+        repeats: How often the BVH is built and the scene rendered, the
+            fastest run is reported to keep the timings stable.
+
+    Returns:
+        dict: ``build_s`` for the BVH, ``render_s``, ``rays``,
+            ``rays_per_sec`` and ``samples_per_sec`` of the render, and the
+            share of the profiled time spent in every module as
+            ``subsystems``. With :arg:`counters`, the
+            :meth:`Instrumentation.summary` without its tiles as
+            ``counters``.
+
+    '''
+    world, cam = SCENES[name]()
+    cam.image_width = width
+    cam.samples_per_pixel = samples_per_pixel
+    cam.max_depth = max_depth
+    cam.seed = seed
+
+    build_s = render_s = float('inf')
+    for _ in range(max(repeats, 1)):
+        start = time.perf_counter()
+        bvh = FlatBVH(world=world, strategy='sah', max_leaf_size=4)
+        build_s = min(build_s, time.perf_counter() - start)
+
+    for _ in range(max(repeats, 1)):
+        metrics: List[Dict[str, Any]] = list()
+        progress = ProgressReporter(silent=True, callback=metrics.append)
+        start = time.perf_counter()
+        cam.render(bvh, io.BytesIO(), engine=engine, progress=progress)
+        render_s = min(render_s, time.perf_counter() - start)
+    result = {
+        'primitives': len(bvh.objects),
+        'build_s': build_s,
+        'render_s': render_s,
+        'rays': metrics[-1]['rays'],
+        'rays_per_sec': metrics[-1]['rays'] / render_s,
+        'samples_per_sec': metrics[-1]['samples'] / render_s,
+        'bvh': bvh.stats(),
+    }
+
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        cam.render(bvh, io.BytesIO(), engine=engine,
+                   progress=ProgressReporter(silent=True))
+        profiler.disable()
+        result['subsystems'] = _subsystems(profiler)
+
+    if counters:
+        with Instrumentation() as stats:
+            cam.render(bvh, io.BytesIO(), engine=engine,
+                       progress=ProgressReporter(silent=True))
+        result['counters'] = stats.summary()
+        del result['counters']['tiles']
+    return result
+
+
+def run(scenes: List[str], **options: Any) -> Dict[str, Any]:
+    '''
+    Benchmark the given scenes, see :func:`run_scene` for the options.
+
+    '''
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'node': platform.node(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'options': options,
+        },
+        'scenes': {name: run_scene(name, **options) for name in scenes},
+    }
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any],
+            tolerance: float = 0.25, min_time: float = 0.05) -> List[str]:
+    '''
+    Compare a result of :func:`run` with a baseline.
+
+    Args:
+        result: The new result.
+        baseline: The stored result.
+        tolerance: The relative change allowed before a metric counts as a
+            regression.
+        min_time: Timings shorter than this in seconds are too noisy to
+            compare and are skipped, as are the rates of such renders.
+
+    Returns:
+        List[str]: One message for every regressed metric.
+
+    '''
+    regressions = list()
+    for name, metrics in result['scenes'].items():
+        base = baseline['scenes'].get(name)
+        if base is None:
+            continue
+        for key in LOWER_IS_BETTER:
+            if max(metrics[key], base[key]) < min_time:
+                continue
+            if metrics[key] > base[key] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {key} {metrics[key]:.4g} > {base[key]:.4g}")
+        for key in HIGHER_IS_BETTER:
+            if max(metrics['render_s'], base['render_s']) < min_time:
+                continue
+            if metrics[key] < base[key] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: {key} {metrics[key]:.4g} < {base[key]:.4g}")
+    return regressions
+
+
+def _subsystems(profiler: "cProfile.Profile") -> Dict[str, float]:
+    '''Share of the profiled time spent in the functions of every module.'''
+    stats = pstats.Stats(profiler)
+    times: Dict[str, float] = dict()
+    for (filename, _, _), (_, _, tottime, _, _) in stats.stats.items():
+        module = os.path.splitext(os.path.basename(filename))[0]
+        # Built-ins are listed under '~' and frozen modules under
+        # '<frozen ...>', which are no files of the renderer.
+        if not os.path.isfile(filename) or \
+                os.path.dirname(os.path.abspath(filename)) != _HERE:
+            module = 'other'
+        times[module] = times.get(module, 0.0) + tottime
+    total = sum(times.values()) or 1.0
+    return {module: t / total for module, t in
+            sorted(times.items(), key=lambda item: -item[1])}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the reference scenes.')
+    parser.add_argument('--scenes', default=','.join(SCENES),
+                        help='comma separated scene names')
+    parser.add_argument('--width', type=int, default=64)
+    parser.add_argument('--spp', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--engine', default='scalar')
+    parser.add_argument('--no-profile', action='store_true')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='time the fastest of this many runs')
+    parser.add_argument('--counters', action='store_true',
+                        help='count rays, tests and bounces per scene')
+    parser.add_argument('--out', default='bench.json',
+                        help='where to write the results')
+    parser.add_argument('--baseline', default=None,
+                        help='the stored results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store the results as the new baseline')
+    args = parser.parse_args()
+
+    result = run(args.scenes.split(','), width=args.width,
+                 samples_per_pixel=args.spp, max_depth=args.depth,
+                 seed=args.seed, engine=args.engine,
+                 profile=not args.no_profile, counters=args.counters,
+                 repeats=args.repeats)
+    with open(args.out, 'w') as f:
+        json.dump(result, f, indent=2)
+    for name, metrics in result['scenes'].items():
+        print(f"{name}: build {metrics['build_s']:.3f}s, render "
+              f"{metrics['render_s']:.3f}s, "
+              f"{metrics['rays_per_sec']:.0f} rays/s")
+
+    if args.baseline is not None:
+        if args.save_baseline:
+            with open(args.baseline, 'w') as f:
+                json.dump(result, f, indent=2)
+        else:
+            with open(args.baseline) as f:
+                regressions = compare(result, json.load(f), args.tolerance)
+            for message in regressions:
+                print(f"Regression: {message}")
+            if regressions:
+                sys.exit(1)
@@ -1,13 +1,20 @@
-import functools
-from typing import List, Optional, Tuple
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
 from aabb import AABB
+from constants import INFINITY
 from world import World
-from hittable import HitRecord
 from interval import EMPTY, Interval
 from ray import Ray
 from hittable import Hittable
 
 
+SAH_TRAVERSAL_COST = 0.5
+SAH_INTERSECT_COST = 1.0
+# Node sizes from which build_flat bins the primitives with NumPy.
+NUMPY_BUILD_SIZE = 128
+
+
 class BVHNode(Hittable):
     '''
     A bounding volume hierarchy, or BVH, is a container for hittable objects.
@@ -22,13 +29,22 @@ class BVHNode(Hittable):
             sorting.
         world: The :class:`World` object, which is for the  initialization of
             the BVH tree.
+        strategy: ``'median'`` splits the longest axis at the median object,
+            ``'sah'`` picks the cheapest of the binned surface area heuristic
+            splits.
+        bins: The number of bins per axis of the ``'sah'`` strategy.
+        max_leaf_size: The largest number of objects the ``'sah'`` strategy
+            may gather in one :class:`BVHLeaf`.
 
     '''
     def __init__(self,
                  objects: List["Hittable"] = list(),
                  start: int = 0,
                  end: int = 0,
-                 world: "World" = None) -> None:
+                 world: "World" = None,
+                 strategy: str = 'median',
+                 bins: int = 12,
+                 max_leaf_size: int = 4) -> None:
         if world is not None:
             objects = world.objects
             start = 0
@@ -39,10 +55,8 @@ class BVHNode(Hittable):
             self.bbox = AABB(box0=self.bbox,
                              box1=objects[object_index].bounding_box())
 
-        axis = self.bbox.longest_axis()
-        comparator = self.box_x_compare \
-            if axis == 0 else self.box_y_compare \
-            if axis == 1 else self.box_z_compare
+        options = dict(strategy=strategy, bins=bins,
+                       max_leaf_size=max_leaf_size)
         object_span = end - start
         if object_span == 1:
             self.left = objects[start]
@@ -50,51 +64,674 @@ class BVHNode(Hittable):
         elif object_span == 2:
             self.left = objects[start]
             self.right = objects[start + 1]
-        else:
-            objects[start:end] = sorted(objects[start:end],
-                                        key=functools.cmp_to_key(comparator))
+        elif strategy == 'sah':
+            boxes = [_box_bounds(obj.bounding_box())
+                     for obj in objects[start:end]]
+            _, _, left, right = sah_split(boxes, list(range(object_span)),
+                                          bins)
+            objects[start:end] = [objects[start + k] for k in left + right]
+            mid = start + len(left)
+            self.left = _bvh_child(objects, start, mid, options)
+            self.right = _bvh_child(objects, mid, end, options)
+        elif strategy == 'median':
+            axis = self.bbox.longest_axis()
+            objects[start:end] = sorted(
+                objects[start:end],
+                key=lambda obj: obj.bounding_box().axis_interval(axis).min)
             mid = int(start + object_span / 2)
             self.left = BVHNode(objects=objects, start=start, end=mid)
             self.right = BVHNode(objects=objects, start=mid, end=end)
+        else:
+            raise RuntimeError(f"Unknown strategy {strategy}")
 
-    @staticmethod
-    def box_x_compare(a: "Hittable", b: "Hittable") -> bool:
-        a_axis_interval = a.bounding_box().axis_interval(0)
-        b_axis_interval = b.bounding_box().axis_interval(0)
-        return a_axis_interval.min - b_axis_interval.min
-
-    @staticmethod
-    def box_y_compare(a: "Hittable", b: "Hittable") -> bool:
-        a_axis_interval = a.bounding_box().axis_interval(1)
-        b_axis_interval = b.bounding_box().axis_interval(1)
-        return a_axis_interval.min - b_axis_interval.min
-
-    @staticmethod
-    def box_z_compare(a: "Hittable", b: "Hittable") -> bool:
-        a_axis_interval = a.bounding_box().axis_interval(2)
-        b_axis_interval = b.bounding_box().axis_interval(2)
-        return a_axis_interval.min - b_axis_interval.min
-
-    def hit(self, ray: Ray, interval: Interval) -> \
-            Tuple[bool, Optional["HitRecord"]]:
+    def intersect(self, ray: Ray, interval: Interval) -> \
+            Tuple[float, Optional["Hittable"]]:
         '''
-        Test if the :class:`BVHNode` can be hit.
+        Find the closest hit in the :class:`BVHNode`.
         '''
+        t_enter, t_exit = self.bbox.slab(ray, interval)
+        if t_exit <= t_enter:
+            return INFINITY, None
+        # The slab test leaves the interval alone, so the range clipped to
+        # this box does not leak into the children.
+        t_left, prim_left = self.left.intersect(ray, interval)
+        if prim_left is not None:
+            # The right child only matters if it is hit before the left one.
+            interval = Interval(interval.min, t_left)
+        t_right, prim_right = self.right.intersect(ray, interval)
+        if prim_right is not None:
+            return t_right, prim_right
+        return t_left, prim_left
+
+    def occluded(self, ray: Ray, interval: Interval) -> bool:
         if not self.bbox.hit(ray, interval):
-            return False, None
-        hit_left, rec_left = self.left.hit(ray, interval)
-        hit_right, rec_right = self.right.hit(ray, interval)
-        if hit_left and hit_right:
-            if rec_left.t < rec_right.t:
-                return True, rec_left
-            else:
-                return True, rec_right
-        elif hit_left:
-            return True, rec_left
-        elif hit_right:
-            return True, rec_right
-        else:
-            return False, None
+            return False
+        return self.left.occluded(ray, interval) or \
+            (self.right is not self.left and
+             self.right.occluded(ray, interval))
+
+    def bounding_box(self) -> "AABB":
+        return self.bbox
+
+    def primitives(self) -> List["Hittable"]:
+        # A node holding a single object stores it as both children.
+        if self.left is self.right:
+            return self.left.primitives()
+        return self.left.primitives() + self.right.primitives()
+
+
+class BVHLeaf(Hittable):
+    '''
+    A leaf of the BVH holding several objects, which are tested one by one
+    like a small :class:`World`.
+
+    Attributes:
+        objects: The objects of the leaf.
+        bbox: The bounding box of the objects.
+
+    '''
+    def __init__(self, objects: List["Hittable"]) -> None:
+        self.objects = list(objects)
+        self.bbox = AABB(x=EMPTY, y=EMPTY, z=EMPTY)
+        for obj in self.objects:
+            self.bbox = AABB(box0=self.bbox, box1=obj.bounding_box())
+
+    def intersect(self, ray: Ray, interval: Interval) -> \
+            Tuple[float, Optional["Hittable"]]:
+        closest = INFINITY
+        closest_prim = None
+        bounds = Interval(interval.min, interval.max)
+        for obj in self.objects:
+            t, prim = obj.intersect(ray, bounds)
+            if prim is not None:
+                closest = bounds.max = t
+                closest_prim = prim
+        return closest, closest_prim
+
+    def occluded(self, ray: Ray, interval: Interval) -> bool:
+        for obj in self.objects:
+            if obj.occluded(ray, interval):
+                return True
+        return False
 
     def bounding_box(self) -> "AABB":
         return self.bbox
+
+    def primitives(self) -> List["Hittable"]:
+        return [prim for obj in self.objects for prim in obj.primitives()]
+
+
+class FlatBVH(Hittable):
+    '''
+    A bounding volume hierarchy compiled into flat arrays.
+    The nodes are laid out in depth-first order, so the left child of a node
+    is always the next node and only the right child needs an offset. The
+    traversal visits the child on the near side of the split axis first and
+    shrinks the ray interval to the closest hit so far, so a subtree whose
+    box begins beyond that hit is never entered.
+
+    The tree is built over the bounding boxes of the objects, or over the
+    given :arg:`boxes`, one ``(xmin, xmax, ymin, ymax, zmin, zmax)`` per
+    object, as :class:`MotionBVH` does for its time slices.
+
+    Attributes:
+        objects: The primitives, reordered so that every leaf holds a
+            contiguous run.
+        bounds: Six floats per node, ``xmin, xmax, ymin, ymax, zmin, zmax``.
+        offsets: The index of the right child for an interior node, or the
+            index of the first primitive for a leaf.
+        counts: The number of primitives of a leaf, ``0`` for an interior
+            node.
+        axes: The split axis of an interior node.
+        max_leaf_size: The largest number of primitives in one leaf.
+        strategy: ``'median'`` or ``'sah'``, see :class:`BVHNode`.
+        bins: The number of bins per axis of the ``'sah'`` strategy.
+        bbox: The bounding box of the whole hierarchy.
+
+    '''
+    def __init__(self,
+                 world: "Hittable" = None,
+                 objects: List["Hittable"] = None,
+                 max_leaf_size: int = 1,
+                 strategy: str = 'median',
+                 bins: int = 12,
+                 boxes: Optional[List[Tuple[float, ...]]] = None) -> None:
+        if world is not None:
+            objects = world.primitives()
+        objects = list(objects)
+        if strategy not in ('median', 'sah'):
+            raise RuntimeError(f"Unknown strategy {strategy}")
+        self.max_leaf_size = max_leaf_size
+        self.strategy = strategy
+        self.bins = bins
+        if boxes is None:
+            boxes = [_box_bounds(obj.bounding_box()) for obj in objects]
+        self.bounds, self.offsets, self.counts, self.axes, order = \
+            build_flat(boxes, max_leaf_size, strategy, bins)
+        self.objects = [objects[k] for k in order]
+
+        low_x, high_x, low_y, high_y, low_z, high_z = \
+            _union_bounds(boxes, range(len(boxes)))
+        self.bbox = AABB(x=Interval(low_x, high_x), y=Interval(low_y, high_y),
+                         z=Interval(low_z, high_z))
+
+    def stats(self) -> Dict[str, Any]:
+        '''
+        Report the quality of the tree, see :func:`bvh_stats`.
+
+        '''
+        def walk(node: int, depth: int):
+            b = 6 * node
+            yield self.bounds[b:b + 6], self.counts[node], depth
+            if not self.counts[node]:
+                yield from walk(node + 1, depth + 1)
+                yield from walk(self.offsets[node], depth + 1)
+
+        return _tree_stats(walk(0, 0) if self.counts else iter(()))
+
+    def intersect(self, ray: Ray, interval: Interval) -> \
+            Tuple[float, Optional["Hittable"]]:
+        '''
+        Find the closest hit of the :class:`Ray` within the interval.
+        '''
+        objects = self.objects
+        closest_prim = None
+        # Narrowed in place to the closest hit so far.
+        ray_t = Interval(interval.min, interval.max)
+        for first, count in flat_leaves(self.bounds, self.offsets,
+                                        self.counts, self.axes, ray, ray_t):
+            for obj in objects[first:first + count]:
+                t, prim = obj.intersect(ray, ray_t)
+                if prim is not None:
+                    ray_t.max = t
+                    closest_prim = prim
+        if closest_prim is None:
+            return INFINITY, None
+        return ray_t.max, closest_prim
+
+    def occluded(self, ray: Ray, interval: Interval) -> bool:
+        '''
+        Test if the :class:`Ray` hits anything within the interval, stopping
+        at the first hit.
+        '''
+        objects = self.objects
+        for first, count in flat_leaves(self.bounds, self.offsets,
+                                        self.counts, self.axes, ray,
+                                        interval, nearest_first=False):
+            for obj in objects[first:first + count]:
+                if obj.occluded(ray, interval):
+                    return True
+        return False
+
+    def bounding_box(self) -> "AABB":
+        return self.bbox
+
+    def primitives(self) -> List["Hittable"]:
+        return list(self.objects)
+
+
+class MotionBVH(Hittable):
+    '''
+    A bounding volume hierarchy for moving objects.
+    The box of a moving object covers its whole path over the shutter, so in
+    a static tree the boxes of fast objects grow long and overlap, and a ray
+    enters most of them. Here the shutter ``[0, 1]`` is split into
+    :arg:`time_slices` equal slices, each with a :class:`FlatBVH` over the
+    boxes the objects sweep during that slice only, found by interpolating
+    their :meth:`Hittable.motion_boxes`. A ray is traced in the tree of the
+    slice of its time, where every box is at most a slice of the path long.
+
+    Interpolating the node boxes by the ray time while traversing one tree
+    tests fewer objects still, but costs more per node than it saves.
+
+    Attributes:
+        trees: The :class:`FlatBVH` of every time slice.
+        time_slices: The number of time slices of the shutter.
+        bbox: The bounding box of the whole hierarchy over the shutter.
+
+    '''
+    def __init__(self,
+                 world: "Hittable" = None,
+                 objects: List["Hittable"] = None,
+                 max_leaf_size: int = 1,
+                 strategy: str = 'sah',
+                 bins: int = 12,
+                 time_slices: int = 4) -> None:
+        if world is not None:
+            objects = world.primitives()
+        objects = list(objects)
+        self.time_slices = time_slices
+        motion = [tuple(_box_bounds(box) for box in obj.motion_boxes())
+                  for obj in objects]
+        self.trees = list()
+        for k in range(time_slices):
+            boxes = [_union_bounds((_lerp_bounds(b0, b1, k / time_slices),
+                                    _lerp_bounds(b0, b1,
+                                                 (k + 1) / time_slices)),
+                                   (0, 1))
+                     for b0, b1 in motion]
+            self.trees.append(FlatBVH(objects=objects,
+                                      max_leaf_size=max_leaf_size,
+                                      strategy=strategy, bins=bins,
+                                      boxes=boxes))
+
+        self.bbox = AABB(x=EMPTY, y=EMPTY, z=EMPTY)
+        for obj in objects:
+            self.bbox = AABB(box0=self.bbox, box1=obj.bounding_box())
+
+    def stats(self) -> Dict[str, Any]:
+        '''
+        Report the quality of the tree of the first time slice, see
+        :func:`bvh_stats`.
+
+        '''
+        return self.trees[0].stats()
+
+    def _tree(self, time: float) -> "FlatBVH":
+        n = self.time_slices
+        return self.trees[min(max(int(time * n), 0), n - 1)]
+
+    def intersect(self, ray: Ray, interval: Interval) -> \
+            Tuple[float, Optional["Hittable"]]:
+        return self._tree(ray.time()).intersect(ray, interval)
+
+    def occluded(self, ray: Ray, interval: Interval) -> bool:
+        return self._tree(ray.time()).occluded(ray, interval)
+
+    def bounding_box(self) -> "AABB":
+        return self.bbox
+
+    def primitives(self) -> List["Hittable"]:
+        return self.trees[0].primitives()
+
+
+def build_flat(boxes: List[Tuple[float, ...]], max_leaf_size: int = 1,
+               strategy: str = 'median', bins: int = 12) -> \
+        Tuple[array, array, array, array, List[int]]:
+    '''
+    Build the flat arrays of a :class:`FlatBVH` over bare boxes, so that any
+    list of primitives can be arranged, objects or the triangles of a mesh.
+
+    Args:
+        boxes: The ``xmin, xmax, ymin, ymax, zmin, zmax`` of every primitive.
+        max_leaf_size: The largest number of primitives in one leaf.
+        strategy: ``'median'`` or ``'sah'``, see :class:`BVHNode`.
+        bins: The number of bins per axis of the ``'sah'`` strategy.
+
+    Returns:
+        array: The :attr:`FlatBVH.bounds`.
+        array: The :attr:`FlatBVH.offsets`.
+        array: The :attr:`FlatBVH.counts`.
+        array: The :attr:`FlatBVH.axes`.
+        List[int]: The primitive indices in leaf order.
+
+    '''
+    bounds = array('d')
+    offsets = array('l')
+    counts = array('l')
+    axes = array('b')
+    order: List[int] = list()
+    # Large nodes, such as the top of a mesh, are split in bulk.
+    box_array = np.array(boxes, dtype=float).reshape(-1, 6) \
+        if len(boxes) >= NUMPY_BUILD_SIZE else None
+
+    def build(indices: List[int]) -> None:
+        node = len(counts)
+        if len(indices) >= NUMPY_BUILD_SIZE:
+            bbox = _union_bounds_array(box_array[indices])
+        else:
+            bbox = _union_bounds(boxes, indices)
+        bounds.extend(bbox)
+
+        split = None
+        if strategy == 'sah' and len(indices) >= NUMPY_BUILD_SIZE:
+            split = _sah_split_array(box_array, indices, bins)
+        elif strategy == 'sah' and len(indices) > 1:
+            split = sah_split(boxes, indices, bins)
+            if len(indices) <= max_leaf_size and \
+                    split[0] >= SAH_INTERSECT_COST * len(indices):
+                split = None
+        elif len(indices) > max_leaf_size:
+            axis = _longest_axis(bbox)
+            indices.sort(key=lambda k: boxes[k][2 * axis])
+            mid = len(indices) // 2
+            split = (0.0, axis, indices[:mid], indices[mid:])
+
+        if split is None:
+            axes.append(0)
+            offsets.append(len(order))
+            counts.append(len(indices))
+            order.extend(indices)
+            return
+
+        _, axis, left, right = split
+        axes.append(axis)
+        offsets.append(0)
+        counts.append(0)
+        build(left)
+        offsets[node] = len(counts)
+        build(right)
+
+    if boxes:
+        build(list(range(len(boxes))))
+    return bounds, offsets, counts, axes, order
+
+
+def flat_leaves(bounds: Sequence[float], offsets: Sequence[int],
+                counts: Sequence[int], axes: Sequence[int], ray: "Ray",
+                ray_t: "Interval", nearest_first: bool = True) -> \
+        Iterator[Tuple[int, int]]:
+    '''
+    Walk the arrays of :func:`build_flat` and yield the leaves whose box the
+    :class:`Ray` enters within :arg:`ray_t`. This is the traversal of
+    :class:`FlatBVH` and :class:`TriangleMesh`.
+
+    The caller may narrow ``ray_t.max`` to its closest hit before it asks
+    for the next leaf, and the boxes beyond it are then skipped. That only
+    pays when the near child is visited first, so a query which stops at
+    any hit turns :arg:`nearest_first` off and walks the left child first.
+
+    Yields:
+        int: The index of the first primitive of the leaf.
+        int: The number of primitives of the leaf.
+
+    '''
+    if not counts:
+        return
+    orig = ray.origin()
+    ox, oy, oz = orig.x, orig.y, orig.z
+    ix, iy, iz = ray.inv_dir
+    negative = ray.sign if nearest_first else (False, False, False)
+    t_min = ray_t.min
+    t_max = ray_t.max
+
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        b = 6 * node
+        t0 = (bounds[b] - ox) * ix
+        t1 = (bounds[b + 1] - ox) * ix
+        lo, hi = (t0, t1) if t0 < t1 else (t1, t0)
+        lo = lo if lo > t_min else t_min
+        hi = hi if hi < t_max else t_max
+        t0 = (bounds[b + 2] - oy) * iy
+        t1 = (bounds[b + 3] - oy) * iy
+        if t0 > t1:
+            t0, t1 = t1, t0
+        lo = t0 if t0 > lo else lo
+        hi = t1 if t1 < hi else hi
+        t0 = (bounds[b + 4] - oz) * iz
+        t1 = (bounds[b + 5] - oz) * iz
+        if t0 > t1:
+            t0, t1 = t1, t0
+        lo = t0 if t0 > lo else lo
+        hi = t1 if t1 < hi else hi
+        if hi <= lo:
+            continue
+
+        count = counts[node]
+        if count:
+            yield offsets[node], count
+            t_max = ray_t.max
+        elif negative[axes[node]]:
+            # The right child lies nearer, so it is popped first.
+            stack.append(node + 1)
+            stack.append(offsets[node])
+        else:
+            stack.append(offsets[node])
+            stack.append(node + 1)
+
+
+def sah_split(boxes: List[Tuple[float, ...]], indices: List[int],
+              bins: int = 12) -> \
+        Tuple[float, int, List[int], List[int]]:
+    '''
+    Find the cheapest split of the objects with the binned surface area
+    heuristic. The centroids are dropped into :arg:`bins` equal bins along
+    each axis and every boundary between two bins is a candidate.
+
+    Args:
+        boxes: The bounds of every object as
+            ``(xmin, xmax, ymin, ymax, zmin, zmax)``.
+        indices: The objects to split.
+        bins: The number of bins per axis.
+
+    Returns:
+        float: The estimated cost of the split, which can be compared with
+            ``SAH_INTERSECT_COST * len(indices)`` for a leaf.
+        int: The split axis.
+        List[int]: The objects on the left side.
+        List[int]: The objects on the right side.
+
+    '''
+    centroids = [((boxes[k][0] + boxes[k][1]) * 0.5,
+                  (boxes[k][2] + boxes[k][3]) * 0.5,
+                  (boxes[k][4] + boxes[k][5]) * 0.5) for k in indices]
+    parent_area = _area(_union_bounds(boxes, indices))
+    best = (INFINITY, 0, 0, 0.0, 0.0)
+
+    for axis in range(3):
+        low = min(c[axis] for c in centroids)
+        high = max(c[axis] for c in centroids)
+        if high - low < 1e-12:
+            continue
+        scale = bins / (high - low)
+        counts = [0] * bins
+        bounds = [list(_EMPTY_BOUNDS) for _ in range(bins)]
+        for k, c in zip(indices, centroids):
+            b = min(bins - 1, int((c[axis] - low) * scale))
+            counts[b] += 1
+            _grow(bounds[b], boxes[k])
+
+        right_area = [0.0] * bins
+        right_count = [0] * bins
+        acc = list(_EMPTY_BOUNDS)
+        count = 0
+        for b in range(bins - 1, 0, -1):
+            _grow(acc, bounds[b])
+            count += counts[b]
+            right_area[b] = _area(acc)
+            right_count[b] = count
+
+        acc = list(_EMPTY_BOUNDS)
+        count = 0
+        for b in range(1, bins):
+            _grow(acc, bounds[b - 1])
+            count += counts[b - 1]
+            if count == 0 or right_count[b] == 0:
+                continue
+            cost = SAH_TRAVERSAL_COST + SAH_INTERSECT_COST * \
+                (_area(acc) * count + right_area[b] * right_count[b]) / \
+                parent_area
+            if cost < best[0]:
+                best = (cost, axis, b, low, scale)
+
+    cost, axis, split, low, scale = best
+    if cost == INFINITY:
+        # All the centroids coincide, so only an arbitrary halving is left.
+        mid = len(indices) // 2
+        return cost, 0, indices[:mid], indices[mid:]
+    left = list()
+    right = list()
+    for k, c in zip(indices, centroids):
+        if min(bins - 1, int((c[axis] - low) * scale)) < split:
+            left.append(k)
+        else:
+            right.append(k)
+    return cost, axis, left, right
+
+
+def bvh_stats(root: "Hittable") -> Dict[str, Any]:
+    '''
+    Report the quality of a tree of :class:`BVHNode` and :class:`BVHLeaf`.
+
+    Returns:
+        dict: ``sah_cost`` is the expected cost of a random ray under the
+            surface area heuristic, ``depth`` the depth of the deepest leaf,
+            ``nodes`` and ``leaves`` the node counts, and ``leaf_size_min``,
+            ``leaf_size_mean`` and ``leaf_size_max`` the leaf occupancy.
+
+    '''
+    def walk(node: "Hittable", depth: int):
+        if isinstance(node, BVHNode):
+            if node.left is node.right:
+                yield from walk(node.left, depth)
+                return
+            yield _box_bounds(node.bbox), 0, depth
+            yield from walk(node.left, depth + 1)
+            yield from walk(node.right, depth + 1)
+        elif isinstance(node, BVHLeaf):
+            yield _box_bounds(node.bbox), len(node.objects), depth
+        else:
+            yield _box_bounds(node.bounding_box()), 1, depth
+
+    return _tree_stats(walk(root, 0))
+
+
+def _tree_stats(nodes) -> Dict[str, Any]:
+    root_area = None
+    cost = 0.0
+    depth = 0
+    node_count = 0
+    leaf_sizes = list()
+    for bounds, count, node_depth in nodes:
+        area = _area(bounds)
+        if root_area is None:
+            root_area = area if area > 0 else 1.0
+        node_count += 1
+        depth = max(depth, node_depth)
+        if count:
+            leaf_sizes.append(count)
+            cost += SAH_INTERSECT_COST * count * area / root_area
+        else:
+            cost += SAH_TRAVERSAL_COST * area / root_area
+    return {
+        'sah_cost': cost,
+        'depth': depth,
+        'nodes': node_count,
+        'leaves': len(leaf_sizes),
+        'leaf_size_min': min(leaf_sizes, default=0),
+        'leaf_size_mean': sum(leaf_sizes) / len(leaf_sizes)
+        if leaf_sizes else 0.0,
+        'leaf_size_max': max(leaf_sizes, default=0),
+    }
+
+
+def _sah_split_array(boxes: "np.ndarray", indices: List[int],
+                     bins: int) -> Tuple[float, int, List[int], List[int]]:
+    '''The :func:`sah_split` of many objects at once, with NumPy.'''
+    indices = np.asarray(indices)
+    low_sides = boxes[indices, 0::2]
+    high_sides = boxes[indices, 1::2]
+    centroids = (low_sides + high_sides) * 0.5
+    parent_area = _areas(low_sides.min(axis=0), high_sides.max(axis=0))
+    best = (INFINITY, 0, None, 0)
+
+    for axis in range(3):
+        low = centroids[:, axis].min()
+        high = centroids[:, axis].max()
+        if high - low < 1e-12:
+            continue
+        scale = bins / (high - low)
+        which = np.minimum(bins - 1, ((centroids[:, axis] - low) * scale)
+                           .astype(np.int64))
+        counts = np.bincount(which, minlength=bins)
+        bin_low = np.full((bins, 3), INFINITY)
+        bin_high = np.full((bins, 3), -INFINITY)
+        np.minimum.at(bin_low, which, low_sides)
+        np.maximum.at(bin_high, which, high_sides)
+
+        # Boundary b splits the bins below b from the rest.
+        left_area = _areas(np.minimum.accumulate(bin_low)[:-1],
+                           np.maximum.accumulate(bin_high)[:-1])
+        right_area = _areas(np.minimum.accumulate(bin_low[::-1])[::-1][1:],
+                            np.maximum.accumulate(bin_high[::-1])[::-1][1:])
+        left_count = np.cumsum(counts)[:-1]
+        right_count = len(indices) - left_count
+        cost = SAH_TRAVERSAL_COST + SAH_INTERSECT_COST * \
+            (left_area * left_count + right_area * right_count) / parent_area
+        cost[(left_count == 0) | (right_count == 0)] = INFINITY
+        b = int(np.argmin(cost))
+        if cost[b] < best[0]:
+            best = (float(cost[b]), axis, which, b + 1)
+
+    cost, axis, which, split = best
+    if which is None:
+        mid = len(indices) // 2
+        return cost, 0, indices[:mid].tolist(), indices[mid:].tolist()
+    left = which < split
+    return cost, axis, indices[left].tolist(), indices[~left].tolist()
+
+
+def _bvh_child(objects: List["Hittable"], start: int, end: int,
+               options: Dict[str, Any]) -> "Hittable":
+    if end - start == 1:
+        return objects[start]
+    if end - start <= options['max_leaf_size']:
+        boxes = [_box_bounds(obj.bounding_box())
+                 for obj in objects[start:end]]
+        cost, _, _, _ = sah_split(boxes, list(range(end - start)),
+                                  options['bins'])
+        if cost >= SAH_INTERSECT_COST * (end - start):
+            return BVHLeaf(objects[start:end])
+    return BVHNode(objects=objects, start=start, end=end, **options)
+
+
+_EMPTY_BOUNDS = (INFINITY, -INFINITY, INFINITY, -INFINITY,
+                 INFINITY, -INFINITY)
+
+
+def _lerp_bounds(b0: Tuple[float, ...], b1: Tuple[float, ...],
+                 w: float) -> Tuple[float, ...]:
+    return tuple(a + (b - a) * w for a, b in zip(b0, b1))
+
+
+def _box_bounds(box: "AABB") -> Tuple[float, ...]:
+    return (box.x.min, box.x.max, box.y.min, box.y.max,
+            box.z.min, box.z.max)
+
+
+def _union_bounds(boxes: List[Tuple[float, ...]],
+                  indices: List[int]) -> Tuple[float, ...]:
+    acc = list(_EMPTY_BOUNDS)
+    for k in indices:
+        _grow(acc, boxes[k])
+    return tuple(acc)
+
+
+def _grow(acc: List[float], bounds: Tuple[float, ...]) -> None:
+    for axis in (0, 2, 4):
+        if bounds[axis] < acc[axis]:
+            acc[axis] = bounds[axis]
+        if bounds[axis + 1] > acc[axis + 1]:
+            acc[axis + 1] = bounds[axis + 1]
+
+
+def _area(bounds: Tuple[float, ...]) -> float:
+    dx = bounds[1] - bounds[0]
+    dy = bounds[3] - bounds[2]
+    dz = bounds[5] - bounds[4]
+    if dx < 0 or dy < 0 or dz < 0:
+        return 0.0
+    return 2.0 * (dx * dy + dy * dz + dz * dx)
+
+
+def _areas(low: "np.ndarray", high: "np.ndarray") -> "np.ndarray":
+    '''The :func:`_area` of the boxes between rows of corners.'''
+    with np.errstate(invalid='ignore'):
+        d = np.maximum(high - low, 0.0)
+        d[np.isnan(d)] = 0.0
+    return 2.0 * (d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] +
+                  d[..., 2] * d[..., 0])
+
+
+def _union_bounds_array(boxes: "np.ndarray") -> Tuple[float, ...]:
+    low = boxes[:, 0::2].min(axis=0)
+    high = boxes[:, 1::2].max(axis=0)
+    return (low[0], high[0], low[1], high[1], low[2], high[2])
+
+
+def _longest_axis(bounds: Tuple[float, ...]) -> int:
+    sizes = (bounds[1] - bounds[0], bounds[3] - bounds[2],
+             bounds[5] - bounds[4])
+    return sizes.index(max(sizes))
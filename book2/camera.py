@@ -1,14 +1,48 @@
-from math import tan
-from typing import TextIO
+import contextlib
+import multiprocessing
+import os
+import random
+import time
+from array import array
+from math import sqrt, tan
+from typing import BinaryIO, Callable, ContextManager, Dict, Iterator, \
+    List, NamedTuple, Optional, TextIO, Tuple, Union
+import numpy as np
 from constants import INFINITY
+from checkpoint import Checkpoint
+from farm import RenderFarm
+from hittable import HitRecord
 from interval import Interval
+from material import DiffuseLight
+from output import ImageWriter, open_writer
+from progress import ProgressReporter
 from ray import Ray
-from utils import degrees_to_radians, random_float, write_color
+from raygen import CAMERA_COUNTERS, RayGenerator
+from sampler import Sampler, Stream, set_stream
+from utils import average_row, degrees_to_radians, encode_row, luminance, \
+    random_float
 from vec import Color, Point3, Vector3
+from wavefront import WavefrontIntegrator
 from world import World
 
 
-__all__ = ['Camera']
+__all__ = ['Band', 'Camera']
+
+
+class Band(NamedTuple):
+    '''
+    The rendered samples of a band of scanlines.
+
+    Attributes:
+        rows: The flat ``r, g, b`` sums of the samples of every pixel, one
+            array per row.
+        counts: The number of samples of every pixel, one array per row.
+        rays: The number of rays cast for the band.
+
+    '''
+    rows: List[array]
+    counts: List[array]
+    rays: int
 
 
 class Camera:
@@ -33,6 +67,29 @@ class Camera:
         vup: Camera-relative "up" direction.
         background: The background color of the image when we do diffuse light
             rendering.
+        seed: The seed of the :class:`Sampler`. Every sample of every pixel
+            draws from its own stream derived from the seed, so the image does
+            not depend on how the scanlines are spread over the workers.
+        adaptive_threshold: Turn on adaptive sampling. A pixel stops taking
+            samples once the standard error of its mean luminance falls below
+            this fraction of the mean. :arg:`samples_per_pixel` is then the
+            largest number of samples of a pixel.
+        min_samples: The number of samples every pixel takes before adaptive
+            sampling checks it.
+        adaptive_step: The number of samples taken between two checks.
+        roulette_depth: The number of bounces after which paths are ended by
+            Russian roulette. A path survives every further bounce with a
+            probability of its largest throughput component and the
+            survivors are weighted up, so the image stays unbiased. ``None``
+            traces every path to :arg:`max_depth`.
+        light_sampling: Light every diffuse hit directly from a point chosen
+            on one of the :class:`DiffuseLight` shapes, weighing it against
+            the scattered ray with multiple importance sampling. This removes
+            most of the noise of small lights.
+        sample_pattern: How the samples of a pixel spread over the pixel and
+            the shutter time, one of ``'random'``, ``'stratified'``,
+            ``'halton'`` and ``'sobol'``, see :class:`RayGenerator`. The
+            better spread patterns reach the same noise with fewer samples.
 
     '''
 
@@ -45,7 +102,14 @@ class Camera:
                  look_from: "Point3" = Point3(0, 0, 0),
                  look_at: "Point3" = Point3(0, 0, -1),
                  vup: "Vector3" = Vector3(0, 1, 0),
-                 background: "Color" = Color(0, 0, 0)) -> None:
+                 background: "Color" = Color(0, 0, 0),
+                 seed: Optional[int] = None,
+                 adaptive_threshold: Optional[float] = None,
+                 min_samples: int = 16,
+                 adaptive_step: int = 8,
+                 roulette_depth: Optional[int] = 5,
+                 light_sampling: bool = True,
+                 sample_pattern: str = 'sobol') -> None:
 
         self.aspect_ratio = aspect_ratio
         self.image_width = image_width
@@ -56,44 +120,391 @@ class Camera:
         self.look_at = look_at
         self.vup = vup
         self.background = background
+        self.seed = seed
+        self.adaptive_threshold = adaptive_threshold
+        self.min_samples = min_samples
+        self.adaptive_step = adaptive_step
+        self.roulette_depth = roulette_depth
+        self.light_sampling = light_sampling
+        self.sample_pattern = sample_pattern
 
-    def render(self, world: "World", out: TextIO):
+    def render(self, world: "World",
+               out: Union[str, BinaryIO, TextIO],
+               workers: Union[int, "RenderFarm"] = 1,
+               band_height: int = 2,
+               engine: str = 'scalar',
+               format: Optional[str] = None,
+               flush_rows: int = 16,
+               progress: Optional["ProgressReporter"] = None,
+               checkpoint: Optional[str] = None,
+               checkpoint_interval: float = 60.0):
         '''
         Render the image of the ray tracing model.
-        The result of the rendering process is a ``.ppm`` image from the output
-        stream.
+        The result of the rendering process is a ``.ppm`` or ``.png`` image
+        written to the output stream or file.
+
+        The image is split into bands of scanlines. With more than one worker
+        the bands are rendered in a process pool and written back in order.
+
+        Arguments:
+            world: The hittable objects for rendering.
+            out: A file name, a binary stream, or a :type:`TextIO` stream
+                which receives the plain text ``P3`` format.
+            workers: The number of worker processes. ``1`` renders in the
+                current process. With a :class:`RenderFarm` the bands are
+                rendered by the workers connected to it.
+            band_height: The number of scanlines in one job.
+            engine: ``'scalar'`` traces one sample at a time, while
+                ``'wavefront'`` traces the samples of a whole band in batches
+                with :class:`WavefrontIntegrator`.
+            format: The image format, see :func:`open_writer`. By default it
+                follows the file extension.
+            flush_rows: The number of finished rows kept in memory before
+                they are written.
+            progress: The :class:`ProgressReporter`. By default the progress
+                is printed once a second.
+            checkpoint: A file which receives a :class:`Checkpoint` of the
+                finished bands, so that :meth:`resume` can finish the image
+                if the render dies.
+            checkpoint_interval: The least number of seconds between two
+                writes of the checkpoint.
+        '''
+        self._prepare(world, engine)
+        if checkpoint is not None:
+            checkpoint = Checkpoint.create(
+                checkpoint, self.image_width, self.image_height,
+                self._base_seed, self._fingerprint(engine, world),
+                checkpoint_interval)
+        self._render_rows(world, out, dict(), workers, band_height, format,
+                          flush_rows, progress, checkpoint)
+
+    def resume(self, world: "World", checkpoint: str,
+               out: Union[str, BinaryIO, TextIO],
+               workers: Union[int, "RenderFarm"] = 1,
+               band_height: int = 2,
+               engine: str = 'scalar',
+               format: Optional[str] = None,
+               flush_rows: int = 16,
+               progress: Optional["ProgressReporter"] = None,
+               checkpoint_interval: float = 60.0):
+        '''
+        Finish a render started by :meth:`render` with a checkpoint.
+        The rows stored in the checkpoint are taken as they are and only the
+        missing ones are rendered, with the seed of the checkpoint, so the
+        image is the same as the one of an uninterrupted render. The new rows
+        are added to the checkpoint as well.
+
+        The camera, the engine and the scene must be set up as for the first
+        render.
+
+        Arguments:
+            checkpoint: The checkpoint file.
+
+        See :meth:`render` for the other arguments.
+        '''
+        self._prepare(world, engine)
+        checkpoint, done = Checkpoint.open(checkpoint, checkpoint_interval)
+        # The sampler only keeps 64 bits of the seed, and so does the
+        # checkpoint.
+        if self.seed is not None and \
+                Sampler(self.seed).seed != Sampler(checkpoint.seed).seed:
+            raise RuntimeError(
+                f"The checkpoint was rendered with seed {checkpoint.seed}")
+        if checkpoint.fingerprint != self._fingerprint(engine, world):
+            raise RuntimeError("The checkpoint was rendered with other "
+                               "camera settings or another scene")
+        self._base_seed = checkpoint.seed
+        self._sampler = Sampler(checkpoint.seed)
+        self._ray_generator = RayGenerator(self, self.sample_pattern)
+        self._render_rows(world, out, done, workers, band_height, format,
+                          flush_rows, progress, checkpoint)
+
+    def _render_rows(self, world: "World",
+                     out: Union[str, BinaryIO, TextIO],
+                     done: Dict[int, Tuple[array, array]],
+                     workers: Union[int, "RenderFarm"],
+                     band_height: int,
+                     format: Optional[str],
+                     flush_rows: int,
+                     progress: Optional["ProgressReporter"],
+                     checkpoint: Optional["Checkpoint"]) -> None:
+        '''
+        Render the rows missing from :arg:`done` and write the whole image.
+
+        '''
+        progress = progress if progress is not None else ProgressReporter()
+        progress.start(self.image_height, self.image_width)
+        jobs = self._band_jobs(band_height, 0, self.samples_per_pixel,
+                               self.adaptive_threshold is not None,
+                               [j for j in range(self.image_height)
+                                if j not in done])
+        stream = open(out, 'wb') if isinstance(out, str) else out
+        try:
+            writer = open_writer(stream, self.image_width, self.image_height,
+                                 format, flush_rows)
+            next_row = 0
+            with self._pool(world, workers) as pool:
+                for job, (rows, counts, rays) in \
+                        zip(jobs, self._render_jobs(world, pool, jobs)):
+                    _write_done(writer, progress, done, next_row, job[0])
+                    if checkpoint is not None:
+                        checkpoint.add(job[0], rows, counts)
+                    for row, row_counts in zip(rows, counts):
+                        writer.write_row(encode_row(average_row(row,
+                                                                row_counts)))
+                    progress.update(len(rows), _total(counts), rays)
+                    next_row = job[1]
+            _write_done(writer, progress, done, next_row, self.image_height)
+            writer.close()
+            progress.finish()
+        finally:
+            if checkpoint is not None:
+                checkpoint.flush()
+            if stream is not out:
+                stream.close()
+
+    def render_progressive(self, world: "World", out: str,
+                           passes: int = 8,
+                           workers: Union[int, "RenderFarm"] = 1,
+                           band_height: int = 2,
+                           engine: str = 'scalar',
+                           format: Optional[str] = None,
+                           time_limit: Optional[float] = None,
+                           on_pass: Optional[Callable[[int], None]] = None,
+                           progress: Optional["ProgressReporter"] = None) -> \
+            int:
+        '''
+        Render the image in progressive passes.
+        Every pass adds an equal share of :arg:`samples_per_pixel` to every
+        pixel and rewrites the whole image file, so stopping the render at any
+        point leaves the result of the last finished pass behind.
 
         Arguments:
             world: The hittable objects for rendering.
-            out: The :type:`TextIO` output stream.
+            out: The file name of the image. It is replaced atomically after
+                every pass.
+            passes: The number of passes.
+            time_limit: Stop after the pass that exceeds this many seconds.
+            on_pass: Called with the number of finished passes after every
+                pass.
+
+        See :meth:`render` for the other arguments.
+
+        Returns:
+            int: The number of finished passes.
+
         '''
+        self._prepare(world, engine)
+        width, height = self.image_width, self.image_height
+        sums = array('d', bytes(8 * 3 * width * height))
+        counts = array('l', bytes(array('l').itemsize * width * height))
+        step = -(-self.samples_per_pixel // passes)
+        passes = -(-self.samples_per_pixel // step)
+        progress = progress if progress is not None else ProgressReporter()
+        progress.start(height * passes, width)
+        start_time = time.perf_counter()
+
+        done = 0
+        with self._pool(world, workers) as pool:
+            for first in range(0, self.samples_per_pixel, step):
+                last = min(first + step, self.samples_per_pixel)
+                jobs = self._band_jobs(band_height, first, last, False)
+                for job, (rows, row_counts, rays) in \
+                        zip(jobs, self._render_jobs(world, pool, jobs)):
+                    _accumulate(sums, counts, width, job[0], rows,
+                                row_counts)
+                    progress.update(len(rows), _total(row_counts), rays)
+                self._write_image(out, format, sums, counts)
+                done += 1
+                if on_pass is not None:
+                    on_pass(done)
+                if time_limit is not None and \
+                        time.perf_counter() - start_time > time_limit:
+                    break
+        progress.finish()
+        return done
+
+    def _prepare(self, world: "World", engine: str) -> None:
         self._initialize()
-        print(f"Start to render the image. The total batch number is "
-              f"{self.image_height * self.image_width}")
-        out.write(f"P3\n{self.image_width} {self.image_height}\n255\n")
-        for j in range(self.image_height):
+        self._ray_generator = RayGenerator(self, self.sample_pattern)
+        self._lights = [prim for prim in world.primitives()
+                        if isinstance(getattr(prim, 'mat', None),
+                                      DiffuseLight)] \
+            if self.light_sampling else list()
+        if engine == 'wavefront':
+            self._integrator = WavefrontIntegrator(world, self.max_depth,
+                                                   self.background,
+                                                   self.roulette_depth,
+                                                   self.light_sampling)
+        elif engine == 'scalar':
+            self._integrator = None
+        else:
+            raise RuntimeError(f"Unknown engine {engine}")
+
+    def _fingerprint(self, engine: str, world: "World") -> bytes:
+        return Checkpoint.settings_fingerprint(
+            self.image_width, self.image_height, self.samples_per_pixel,
+            self.max_depth, self.vfov, tuple(self.look_from),
+            tuple(self.look_at), tuple(self.vup), tuple(self.background),
+            self.adaptive_threshold, self.min_samples, self.adaptive_step,
+            self.roulette_depth, self.light_sampling, self.sample_pattern,
+            engine, Checkpoint.scene_digest(world))
+
+    def _write_image(self, out: str, format: Optional[str],
+                     sums: array, counts: array) -> None:
+        width = self.image_width
+        tmp = f"{out}.tmp"
+        with open(tmp, 'wb') as stream:
+            writer = open_writer(stream, width, self.image_height,
+                                 format or _format_of(out))
+            for j in range(self.image_height):
+                writer.write_row(encode_row(average_row(
+                    sums[3 * j * width:3 * (j + 1) * width],
+                    counts[j * width:(j + 1) * width])))
+            writer.close()
+        os.replace(tmp, out)
+
+    def _band_jobs(self, band_height: int, first_sample: int,
+                   last_sample: int, adaptive: bool,
+                   rows: Optional[List[int]] = None) -> \
+            List[Tuple[int, int, int, int, bool]]:
+        if rows is None:
+            rows = range(self.image_height)
+        # Split the ascending rows into runs of at most band_height
+        # consecutive scanlines.
+        jobs = list()
+        for j in rows:
+            if jobs and jobs[-1][1] == j and j - jobs[-1][0] < band_height:
+                jobs[-1] = (jobs[-1][0], j + 1, first_sample, last_sample,
+                            adaptive)
+            else:
+                jobs.append((j, j + 1, first_sample, last_sample, adaptive))
+        return jobs
+
+    def _pool(self, world: "World", workers: Union[int, "RenderFarm"]) -> \
+            ContextManager[Optional["multiprocessing.pool.Pool"]]:
+        if isinstance(workers, RenderFarm):
+            return workers.session(_init_worker, (self, world))
+        if workers <= 1:
+            return contextlib.nullcontext()
+        # Every worker receives the camera and the scene once, so a job is
+        # only a few scanline and sample indices.
+        return multiprocessing.Pool(workers, initializer=_init_worker,
+                                    initargs=(self, world))
+
+    def _render_jobs(self, world: "World",
+                     pool: Optional["multiprocessing.pool.Pool"],
+                     jobs: List[Tuple[int, int, int, int, bool]]) -> \
+            Iterator["Band"]:
+        if pool is None:
+            for job in jobs:
+                yield self._render_band(world, *job)
+        else:
+            yield from pool.imap(_render_band_worker, jobs)
+
+    def _render_band(self, world: "World", start: int, end: int,
+                     first_sample: int = 0,
+                     last_sample: Optional[int] = None,
+                     adaptive: bool = False) -> \
+            "Band":
+        '''
+        Render the samples from :arg:`first_sample` to :arg:`last_sample` of
+        the scanlines from :arg:`start` to :arg:`end`.
+
+        Returns:
+            :class:`Band`: The sample sums and counts of the rows, and the
+                rays cast.
+
+        '''
+        if last_sample is None:
+            last_sample = self.samples_per_pixel
+        if self._integrator is not None:
+            sums, counts, rays = self._integrator.render_band(
+                self, start, end, first_sample, last_sample, adaptive)
+            return Band([array('d', row.tobytes()) for row in sums],
+                        [array('l', row.tolist()) for row in counts], rays)
+        self._rays = 0
+        rows = list()
+        counts = list()
+        for j in range(start, end):
+            row = array('d')
+            row_counts = array('l')
+            if not adaptive:
+                # The rays of the whole row are generated in one batch.
+                rays = self._camera_rays(j * self.image_width,
+                                         self.image_width, first_sample,
+                                         last_sample)
             for i in range(self.image_width):
-                pixel_color = Color(0, 0, 0)
-                print(f"Rendering the {i + j * self.image_height}/"
-                      f"{self.image_height * self.image_width} batch")
-                for sample in range(0, self.samples_per_pixel):
-                    r = self._get_ray(i, j)
-                    pixel_color += self._ray_color(r, self.max_depth, world)
-                write_color(out, self.pixel_samples_scale * pixel_color)
-        out.flush()
-
-    def _get_ray(self, i: int, j: int) -> "Ray":
-        offset = self._sample_square()
-        pixel_sample = self.pixel00_loc + \
-            ((i + offset.x) * self.pixel_delta_u) + \
-            ((j + offset.y) * self.pixel_delta_v)
-        ray_origin = self.center
-        ray_direction = pixel_sample - ray_origin
-        ray_time = random_float()
-        return Ray(ray_origin, ray_direction, ray_time)
-
-    def _sample_square(self) -> "Vector3":
-        return Vector3(random_float() - 0.5, random_float() - 0.5, 0)
+                pixel = j * self.image_width + i
+                if adaptive:
+                    pixel_color, count = self._adaptive_pixel(
+                        world, pixel, last_sample)
+                else:
+                    pixel_color = Color(0, 0, 0)
+                    for _ in range(first_sample, last_sample):
+                        r, stream = next(rays)
+                        set_stream(stream)
+                        pixel_color += self._ray_color(r, self.max_depth,
+                                                       world)
+                    count = last_sample - first_sample
+                row.extend(pixel_color)
+                row_counts.append(count)
+            rows.append(row)
+            counts.append(row_counts)
+        set_stream(None)
+        return Band(rows, counts, self._rays)
+
+    def _adaptive_pixel(self, world: "World", pixel: int,
+                        max_samples: int) -> Tuple["Color", int]:
+        '''
+        Sample one pixel until its luminance is known to within
+        :arg:`adaptive_threshold`, or :arg:`max_samples` are taken.
+
+        '''
+        pixel_color = Color(0, 0, 0)
+        lum_sum = 0.0
+        lum_sq = 0.0
+        sample = 0
+        while sample < max_samples:
+            stop = min(max_samples,
+                       max(self.min_samples, sample + self.adaptive_step))
+            for r, stream in self._camera_rays(pixel, 1, sample, stop):
+                set_stream(stream)
+                color = self._ray_color(r, self.max_depth, world)
+                pixel_color += color
+                lum = luminance(color)
+                lum_sum += lum
+                lum_sq += lum * lum
+            sample = stop
+            if self._converged(sample, lum_sum, lum_sq):
+                break
+        return pixel_color, sample
+
+    def _converged(self, n: int, lum_sum: float, lum_sq: float) -> bool:
+        if n < 2:
+            return False
+        mean = lum_sum / n
+        variance = max(0.0, lum_sq - lum_sum * mean) / (n - 1)
+        return sqrt(variance / n) <= \
+            self.adaptive_threshold * max(mean, 1e-3)
+
+    def _camera_rays(self, pixel: int, count: int, first_sample: int,
+                     last_sample: int) -> Iterator[Tuple["Ray", "Stream"]]:
+        '''
+        Generate the camera rays of the samples from :arg:`first_sample` to
+        :arg:`last_sample` of :arg:`count` pixels from :arg:`pixel` on, pixel
+        by pixel, each with the :class:`Stream` which traces its path.
+
+        '''
+        spp = last_sample - first_sample
+        directions, times, keys = self._ray_generator.rays(
+            np.repeat(np.arange(pixel, pixel + count), spp),
+            np.tile(np.arange(first_sample, last_sample), count))
+        center = self.center
+        for (x, y, z), tm, key in zip(directions.tolist(), times.tolist(),
+                                      keys.tolist()):
+            yield Ray(center, Vector3(x, y, z), tm), \
+                Stream(key, CAMERA_COUNTERS)
 
     def _initialize(self):
         self.image_height = int(self.image_width / self.aspect_ratio)
@@ -126,20 +537,152 @@ class Camera:
 
         self.pixel_samples_scale = 1.0 / self.samples_per_pixel
 
+        self._base_seed = self.seed if self.seed is not None \
+            else random.getrandbits(64)
+        self._sampler = Sampler(self._base_seed)
+
     def _ray_color(self, ray: "Ray", depth: int, world: "World") -> "Color":
-        if depth <= 0:
-            return Color(0, 0, 0)
+        '''
+        Trace the path of :arg:`ray` for at most :arg:`depth` bounces.
+        The path is followed in a loop which keeps the product of the
+        attenuations so far as the throughput, and adds the light found at
+        every bounce weighted by it.
+
+        '''
+        radiance = Color(0, 0, 0)
+        throughput = Color(1, 1, 1)
+        # The density of the direction of the current ray, which is 0 for
+        # camera rays and specular bounces that light sampling cannot find.
+        scattering_pdf = 0.0
+        origin = ray.origin()
+        for bounce in range(depth):
+            self._rays += 1
+            t, prim = world.intersect(ray, Interval(0.001, INFINITY))
+            if prim is None:
+                radiance += throughput * self.background
+                break
+            rec = prim.shade(ray, t)
 
-        hit, rec = world.hit(ray, Interval(0.001, INFINITY))
+            emitted = rec.mat.emitted(rec.u, rec.v, rec.p)
+            if scattering_pdf > 0 and (emitted.x or emitted.y or emitted.z):
+                # The light sample of the last bounce could have found this
+                # light too.
+                emitted = emitted * _power_heuristic(
+                    scattering_pdf,
+                    self._light_pdf(origin, ray.direction(), ray.time()))
+            radiance += throughput * emitted
+
+            res, attenuation, scattered = rec.mat.scatter(ray, rec)
+            if not res:
+                break
+            if self._lights:
+                direct = self._direct_light(world, ray, rec)
+                if direct is not None:
+                    radiance += throughput * attenuation * direct
+                scattering_pdf = rec.mat.scattering_pdf(ray, rec, scattered)
+            origin = rec.p
+            ray = scattered
+            # The throughput is private to this path, so it can be scaled in
+            # place, unlike the attenuation which belongs to the material.
+            throughput *= attenuation
+
+            if self.roulette_depth is not None and \
+                    bounce + 1 >= self.roulette_depth:
+                survival = min(1.0, max(throughput.x, throughput.y,
+                                        throughput.z))
+                if random_float() >= survival:
+                    break
+                throughput /= survival
+        return radiance
+
+    def _direct_light(self, world: "World", ray: "Ray", rec: "HitRecord") -> \
+            Optional["Color"]:
+        '''
+        Sample one light from the hit point of :arg:`rec`.
+
+        Returns:
+            Color: The light reaching the hit point, weighted by the
+                scattering density and by multiple importance sampling, to be
+                scaled by the attenuation. ``None`` if the sample found no
+                light.
+
+        '''
+        lights = self._lights
+        light = lights[min(int(random_float() * len(lights)),
+                           len(lights) - 1)]
+        shadow = Ray(rec.p, light.random(rec.p, ray.time()), ray.time())
+        scattering_pdf = rec.mat.scattering_pdf(ray, rec, shadow)
+        if scattering_pdf <= 0:
+            return None
+        light_pdf = self._light_pdf(rec.p, shadow.direction(), ray.time())
+        if light_pdf <= 0:
+            return None
+
+        hit, light_rec = light.hit(shadow, Interval(0.001, INFINITY))
         if not hit:
-            return self.background
+            return None
+        self._rays += 1
+        # Stop the shadow ray just short of the light, which would otherwise
+        # occlude itself.
+        if world.occluded(shadow, Interval(0.001, light_rec.t * (1 - 1e-7))):
+            if len(lights) == 1:
+                return None
+            # The occluder may be another light, whose light is what this
+            # direction sees.
+            hit, light_rec = world.hit(shadow, Interval(0.001, INFINITY))
+        emitted = light_rec.mat.emitted(light_rec.u, light_rec.v,
+                                        light_rec.p)
+        return emitted * (scattering_pdf / light_pdf *
+                          _power_heuristic(light_pdf, scattering_pdf))
+
+    def _light_pdf(self, origin: "Point3", direction: "Vector3",
+                   time: float) -> float:
+        '''The density of :meth:`_direct_light` choosing :arg:`direction`.'''
+        return sum(light.pdf_value(origin, direction, time)
+                   for light in self._lights) / len(self._lights)
+
+
+_worker_state = dict()
+
+
+def _init_worker(camera: "Camera", world: "World") -> None:
+    _worker_state['camera'] = camera
+    _worker_state['world'] = world
+
+
+def _render_band_worker(job: Tuple[int, int, int, int, bool]) -> "Band":
+    camera = _worker_state['camera']
+    return camera._render_band(_worker_state['world'], *job)
+
+
+def _accumulate(sums: array, counts: array, width: int, start: int,
+                rows: List[array], row_counts: List[array]) -> None:
+    for j, (row, row_count) in enumerate(zip(rows, row_counts), start):
+        for k, value in enumerate(row, 3 * j * width):
+            sums[k] += value
+        for k, value in enumerate(row_count, j * width):
+            counts[k] += value
+
+
+def _write_done(writer: "ImageWriter", progress: "ProgressReporter",
+                done: Dict[int, Tuple[array, array]], start: int,
+                end: int) -> None:
+    '''Write the finished rows from :arg:`start` to :arg:`end`.'''
+    for j in range(start, end):
+        row, row_counts = done[j]
+        writer.write_row(encode_row(average_row(row, row_counts)))
+        progress.update(1, sum(row_counts), 0)
+
+
+def _total(counts: List[array]) -> int:
+    return sum(sum(row) for row in counts)
+
 
-        color_from_emission = rec.mat.emitted(rec.u, rec.v, rec.p)
+def _power_heuristic(pdf: float, other_pdf: float) -> float:
+    '''The multiple importance sampling weight of a strategy.'''
+    return pdf * pdf / (pdf * pdf + other_pdf * other_pdf)
 
-        res, attenuation, scattered = rec.mat.scatter(ray, rec)
-        if not res:
-            return color_from_emission
 
-        color_from_scatter = attenuation * \
-            self._ray_color(scattered, depth - 1, world)
-        return color_from_emission + color_from_scatter
+def _format_of(out: str) -> str:
+    ext = os.path.splitext(out)[1][1:].lower()
+    return 'png' if ext == 'png' else 'ppm'
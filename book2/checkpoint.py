@@ -0,0 +1,199 @@
+import hashlib
+import os
+import struct
+import time
+import zlib
+from array import array
+from typing import Any, Dict, List, Tuple
+import numpy as np
+
+
+__all__ = ['Checkpoint']
+
+
+_MAGIC = b'RTCK'
+_VERSION = 1
+# magic, version, width, height, seed, settings fingerprint
+_HEADER = struct.Struct('<4sHIIQ16s')
+# first row, row after the last one, payload length
+_RECORD = struct.Struct('<III')
+_CRC = struct.Struct('<I')
+_SEED_MASK = (1 << 64) - 1
+
+
+class Checkpoint:
+    '''
+    An append-only checkpoint of a render.
+    The file starts with a header holding the image size, the sampler seed
+    and a fingerprint of the render settings and the scene. Every finished
+    band is appended as one record: the flat ``r, g, b`` sums and the sample
+    counts of its pixels, followed by a CRC. Since the samples are drawn from
+    counter-based streams, the seed and the counts are the whole random
+    state, so a resumed render reproduces the rest of the image bit for bit.
+
+    Records are buffered and written at most once per :arg:`interval`
+    seconds. A record torn by a crash fails its CRC and is dropped on
+    :meth:`open`.
+
+    Attributes:
+        path: The checkpoint file.
+        width: The image width.
+        height: The image height.
+        seed: The seed of the sampler. It is stored in 64 bits, which is
+            all of it that :class:`Sampler` uses, and a seed from
+            ``-2 ** 63`` up to ``2 ** 63 - 1`` is read back as it was.
+        fingerprint: The digest of the render settings and the scene.
+        interval: The least number of seconds between two writes.
+
+    '''
+
+    def __init__(self, path: str, width: int, height: int, seed: int,
+                 fingerprint: bytes, interval: float = 60.0) -> None:
+        self.path = path
+        self.width = width
+        self.height = height
+        self.seed = seed
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self._pending: List[bytes] = list()
+        self._last_write = time.monotonic()
+
+    @classmethod
+    def create(cls, path: str, width: int, height: int, seed: int,
+               fingerprint: bytes, interval: float = 60.0) -> "Checkpoint":
+        '''Start a new checkpoint file, replacing any old one.'''
+        checkpoint = cls(path, width, height, seed, fingerprint, interval)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, width, height,
+                                 seed & _SEED_MASK, fingerprint))
+            f.flush()
+            os.fsync(f.fileno())
+        return checkpoint
+
+    @classmethod
+    def open(cls, path: str, interval: float = 60.0) -> \
+            Tuple["Checkpoint", Dict[int, Tuple[array, array]]]:
+        '''
+        Read a checkpoint and drop any torn record at its end.
+
+        Returns:
+            Checkpoint: The checkpoint, ready to append more records.
+            dict: The ``r, g, b`` sums and the sample counts of every
+                finished row, by row index.
+
+        '''
+        rows: Dict[int, Tuple[array, array]] = dict()
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise RuntimeError(f"{path} is not a render checkpoint")
+            magic, version, width, height, seed, fingerprint = \
+                _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                raise RuntimeError(f"{path} is not a render checkpoint")
+            if seed >> 63:
+                # A negative seed, stored in two's complement.
+                seed -= 1 << 64
+            good = f.tell()
+            row_size = 3 * width * 8 + width * 8
+            while True:
+                head = f.read(_RECORD.size)
+                if len(head) < _RECORD.size:
+                    break
+                start, end, length = _RECORD.unpack(head)
+                payload = f.read(length)
+                crc = f.read(_CRC.size)
+                if len(payload) < length or len(crc) < _CRC.size or \
+                        _CRC.unpack(crc)[0] != zlib.crc32(head + payload) or \
+                        length != (end - start) * row_size:
+                    break
+                for k, j in enumerate(range(start, end)):
+                    offset = k * row_size
+                    sums = array('d')
+                    sums.frombytes(payload[offset:offset + 3 * width * 8])
+                    counts = array('q')
+                    counts.frombytes(payload[offset + 3 * width * 8:
+                                             offset + row_size])
+                    rows[j] = sums, counts
+                good = f.tell()
+        # Cut the torn tail so new records follow the last good one.
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+        return cls(path, width, height, seed, fingerprint, interval), rows
+
+    def add(self, start: int, rows: List[array], counts: List[array]) -> \
+            None:
+        '''Queue the finished band starting at row :arg:`start`.'''
+        payload = b''.join(row.tobytes() + array('q', row_counts).tobytes()
+                           for row, row_counts in zip(rows, counts))
+        head = _RECORD.pack(start, start + len(rows), len(payload))
+        self._pending.append(head + payload +
+                             _CRC.pack(zlib.crc32(head + payload)))
+        if time.monotonic() - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self) -> None:
+        '''Append the queued records and sync them to disk.'''
+        if self._pending:
+            with open(self.path, 'ab') as f:
+                f.write(b''.join(self._pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = list()
+        self._last_write = time.monotonic()
+
+    @staticmethod
+    def settings_fingerprint(*settings: object) -> bytes:
+        '''Digest the settings a checkpoint must be resumed with.'''
+        return hashlib.md5(repr(settings).encode()).digest()
+
+    @staticmethod
+    def scene_digest(world: Any) -> str:
+        '''
+        Digest the primitives of a scene with their materials, textures
+        and every other public attribute they hold, so that a checkpoint is
+        not resumed with another scene. The acceleration structure is left
+        out, since every structure renders the same image.
+
+        '''
+        seen: Dict[int, str] = dict()
+        # The primitives are digested one by one and sorted, as a BVH
+        # reorders them.
+        primitives = sorted(_digest(prim, seen) for prim in world.primitives())
+        return hashlib.sha256(' '.join(primitives).encode()).hexdigest()
+
+
+def _digest(value: Any, seen: Dict[int, str]) -> str:
+    '''
+    Digest :arg:`value` and everything it holds. Objects, such as a material
+    shared by many primitives, are digested once and kept in :arg:`seen`.
+
+    '''
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return f"{type(value).__name__}:{value!r}"
+    if id(value) in seen:
+        return seen[id(value)]
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value).tobytes()
+        text = f"ndarray:{value.dtype}:{value.shape}:" \
+            f"{hashlib.sha256(data).hexdigest()}"
+    elif isinstance(value, array):
+        text = f"array:{value.typecode}:" \
+            f"{hashlib.sha256(value.tobytes()).hexdigest()}"
+    elif isinstance(value, (list, tuple)):
+        text = f"{type(value).__name__}(" + \
+            ','.join(_digest(item, seen) for item in value) + ')'
+    elif isinstance(value, dict):
+        text = 'dict(' + ','.join(
+            f"{_digest(key, seen)}={_digest(value[key], seen)}"
+            for key in sorted(value, key=repr)) + ')'
+    else:
+        names = sorted(vars(value)) if hasattr(value, '__dict__') else \
+            [name for cls in type(value).__mro__
+             for name in getattr(cls, '__slots__', ())]
+        # Private attributes are caches derived from the public ones.
+        text = f"{type(value).__name__}(" + ','.join(
+            f"{name}={_digest(getattr(value, name), seen)}"
+            for name in names if not name.startswith('_')) + ')'
+    seen[id(value)] = hashlib.sha256(text.encode()).hexdigest()
+    return seen[id(value)]
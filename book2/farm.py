@@ -0,0 +1,337 @@
+import argparse
+import collections
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, Iterable, Iterator, List, \
+    Optional, Tuple
+
+
+__all__ = ['RenderFarm', 'work']
+
+
+class RenderFarm:
+    '''
+    Spread the bands of a render over worker processes on other hosts.
+    The farm listens on a socket of :mod:`multiprocessing.connection`.
+    Workers started with :func:`work`, on any host which can reach the
+    socket, connect and ask for jobs one at a time. Pass the farm to
+    :meth:`Camera.render` as its ``workers``:
+
+    .. code-block:: python
+
+        with RenderFarm(('0.0.0.0', 5000), authkey=b'secret') as farm:
+            cam.render(world, 'image.png', workers=farm)
+            print(farm.stats())
+
+    Every worker first receives the camera and the scene, then band jobs.
+    A band comes back as a :class:`Band` of the binary ``r, g, b`` sums and
+    sample counts of its rows, which the camera writes in order. The farm
+    only reads its ``rows`` and ``rays`` for :meth:`stats`. A worker which
+    drops its connection, or holds a job for longer than :arg:`timeout`
+    seconds, is cut off and its job is given to another worker. Since every
+    sample is drawn from its own counter-based stream, a band rendered twice
+    is the same, so the image does not depend on which worker took which
+    band.
+
+    Attributes:
+        address: The address the farm listens on. With port ``0`` the port
+            is chosen by the system and filled in here.
+        authkey: The key the workers must know to connect, random if not
+            given.
+        timeout: The longest time a job may take before it is given to
+            another worker.
+        max_attempts: The number of times a job is tried before the render
+            fails.
+
+    '''
+
+    def __init__(self, address: Tuple[str, int] = ('localhost', 0),
+                 authkey: Optional[bytes] = None,
+                 timeout: float = 600.0,
+                 max_attempts: int = 3) -> None:
+        self.authkey = authkey if authkey is not None else os.urandom(16)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self._listener = Listener(address, authkey=self.authkey)
+        self.address = self._listener.address
+        self._cond = threading.Condition()
+        self._closing = False
+        self._session: Optional["_Session"] = None
+        self._workers = 0
+        self._stats: Dict[str, Dict[str, float]] = dict()
+        self._processes: List["multiprocessing.Process"] = list()
+        self._threads: List[threading.Thread] = list()
+        accept = threading.Thread(target=self._accept, daemon=True)
+        accept.start()
+
+    def __enter__(self) -> "RenderFarm":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def start_workers(self, count: int) -> None:
+        '''
+        Start :arg:`count` local worker processes, which stand in for the
+        nodes when the farm is tried on one host.
+
+        '''
+        for _ in range(count):
+            process = multiprocessing.Process(
+                target=work, args=(self.address, self.authkey), daemon=True)
+            process.start()
+            self._processes.append(process)
+
+    def session(self, initializer: Callable[..., None],
+                initargs: Tuple[Any, ...]) -> "_Session":
+        '''
+        Start a session, which stands in for a :class:`multiprocessing.Pool`
+        in :meth:`Camera.render`. Every worker calls ``initializer(*initargs)``
+        before its first job of the session.
+
+        '''
+        return _Session(self, initializer, initargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        '''
+        The throughput of every worker that has connected so far.
+
+        Returns:
+            dict: By worker name, the ``jobs`` and ``rows`` done, the
+                ``rays`` cast, the ``seconds`` spent rendering,
+                ``rays_per_sec``, and the number of ``failures``: jobs lost,
+                timed out or failed.
+
+        '''
+        with self._cond:
+            stats = {name: dict(worker) for name, worker in
+                     self._stats.items()}
+        for worker in stats.values():
+            worker['rays_per_sec'] = worker['rays'] / worker['seconds'] \
+                if worker['seconds'] > 0 else 0.0
+        return stats
+
+    def close(self) -> None:
+        '''Tell the workers to exit and stop listening.'''
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._listener.close()
+        for thread in self._threads:
+            thread.join(self.timeout)
+        for process in self._processes:
+            process.join(self.timeout)
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                # A closed listener, or a client with the wrong key.
+                if self._closing:
+                    return
+                continue
+            thread = threading.Thread(target=self._serve, args=(conn,),
+                                      daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _serve(self, conn: "Connection") -> None:
+        '''Feed the jobs of the sessions to one worker.'''
+        try:
+            name = conn.recv()
+        except (OSError, EOFError):
+            return
+        with self._cond:
+            self._workers += 1
+            stats = self._stats.setdefault(name, dict(
+                jobs=0, rows=0, rays=0, seconds=0.0, failures=0))
+        initialized = None
+        job = None
+        try:
+            while True:
+                with self._cond:
+                    while not self._closing and (
+                            self._session is None or
+                            not self._session.pending):
+                        self._cond.wait()
+                    if self._closing:
+                        conn.send(('exit',))
+                        return
+                    session = self._session
+                    job = session.take()
+                if initialized is not session:
+                    conn.send(('init', session.initializer,
+                               session.initargs))
+                    initialized = session
+                batch, index = job
+                conn.send(('job', index, session.func, session.jobs[index]))
+                if not conn.poll(self.timeout):
+                    raise TimeoutError(f"{name} timed out")
+                kind, index, result, seconds = conn.recv()
+                with self._cond:
+                    if kind == 'result':
+                        session.finish(job, result)
+                        stats['jobs'] += 1
+                        stats['rows'] += len(result.rows)
+                        stats['rays'] += result.rays
+                        stats['seconds'] += seconds
+                    else:
+                        session.retry(job, result)
+                        stats['failures'] += 1
+                    job = None
+                    self._cond.notify_all()
+        except (OSError, EOFError, TimeoutError) as e:
+            with self._cond:
+                if job is not None:
+                    session.retry(job, f"{name} was lost: {e!r}")
+                    stats['failures'] += 1
+                self._cond.notify_all()
+        finally:
+            with self._cond:
+                self._workers -= 1
+                self._cond.notify_all()
+            conn.close()
+
+
+class _Session:
+    '''
+    The jobs of one render on a :class:`RenderFarm`, handed out to whichever
+    worker asks next and given back in order by :meth:`imap`.
+
+    '''
+
+    def __init__(self, farm: "RenderFarm", initializer: Callable[..., None],
+                 initargs: Tuple[Any, ...]) -> None:
+        self.farm = farm
+        self.initializer = initializer
+        self.initargs = initargs
+        self.func: Optional[Callable[[Any], Any]] = None
+        self.jobs: List[Any] = list()
+        self.pending: collections.deque = collections.deque()
+        self.results: Dict[int, Any] = dict()
+        self.attempts: collections.Counter = collections.Counter()
+        self.error: Optional[str] = None
+        self._batch = 0
+
+    def __enter__(self) -> "_Session":
+        with self.farm._cond:
+            self.farm._session = self
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        with self.farm._cond:
+            self.farm._session = None
+            self.pending.clear()
+
+    def imap(self, func: Callable[[Any], Any], jobs: Iterable[Any]) -> \
+            Iterator[Any]:
+        '''Run ``func(job)`` for every job on the workers, in order.'''
+        cond = self.farm._cond
+        with cond:
+            self._batch += 1
+            self.func = func
+            self.jobs = list(jobs)
+            self.pending = collections.deque(
+                (self._batch, index) for index in range(len(self.jobs)))
+            self.results = dict()
+            self.attempts.clear()
+            cond.notify_all()
+        idle_since = time.monotonic()
+        for index in range(len(self.jobs)):
+            with cond:
+                while index not in self.results and self.error is None:
+                    cond.wait(1.0)
+                    if self.farm._workers:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since > self.farm.timeout:
+                        self.error = "No worker is connected to the farm"
+                if self.error is not None:
+                    raise RuntimeError(self.error)
+                result = self.results.pop(index)
+            yield result
+
+    def take(self) -> Tuple[int, int]:
+        return self.pending.popleft()
+
+    def finish(self, job: Tuple[int, int], result: Any) -> None:
+        batch, index = job
+        # A late result of an earlier batch, or of a job which was retried
+        # and finished already, is dropped.
+        if batch == self._batch:
+            self.results.setdefault(index, result)
+
+    def retry(self, job: Tuple[int, int], reason: str) -> None:
+        batch, index = job
+        if batch != self._batch or index in self.results:
+            return
+        self.attempts[index] += 1
+        if self.attempts[index] >= self.farm.max_attempts:
+            self.error = f"Job {self.jobs[index]!r} failed " \
+                f"{self.attempts[index]} times, last: {reason}"
+        else:
+            self.pending.appendleft(job)
+
+
+def work(address: Tuple[str, int], authkey: bytes,
+         name: Optional[str] = None) -> None:
+    '''
+    Render jobs of the :class:`RenderFarm` at :arg:`address` until it
+    closes.
+
+    Args:
+        address: The address of the farm.
+        authkey: The key of the farm.
+        name: The name of the worker in :meth:`RenderFarm.stats`, by
+            default the host name and the process id.
+
+    '''
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    with Client(address, authkey=authkey) as conn:
+        conn.send(name)
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return
+            if message[0] == 'init':
+                _, initializer, initargs = message
+                initializer(*initargs)
+            elif message[0] == 'job':
+                _, index, func, job = message
+                start = time.perf_counter()
+                try:
+                    result = func(job)
+                except Exception:
+                    conn.send(('error', index, traceback.format_exc(), 0.0))
+                    continue
+                conn.send(('result', index, result,
+                           time.perf_counter() - start))
+            else:
+                return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Render the jobs of a render farm.')
+    parser.add_argument('address', help='the HOST:PORT of the farm')
+    parser.add_argument('--authkey', required=True,
+                        help='the key of the farm')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='the number of worker processes to run')
+    args = parser.parse_args()
+
+    host, port = args.address.rsplit(':', 1)
+    address = (host, int(port))
+    processes = [multiprocessing.Process(
+        target=work, args=(address, args.authkey.encode()))
+        for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -1,5 +1,6 @@
-from typing import Any, Optional, Tuple
+from typing import Any, List, Optional, Tuple
 from aabb import AABB
+from constants import INFINITY
 from interval import Interval
 from ray import Ray
 from vec import Point3, Vector3
@@ -41,11 +42,20 @@ class HitRecord:
 
     def set_face_normal(self, ray: "Ray", outward_normal: "Vector3") -> None:
         '''Set the front face of the hit point.'''
-        front_face = ray.direction().dot(outward_normal)
-        self.normal = outward_normal if front_face < 0 else -outward_normal
+        self.front_face = ray.direction().dot(outward_normal) < 0
+        self.normal = outward_normal if self.front_face else -outward_normal
 
 
 class Hittable:
+    '''
+    The base of everything a ray can hit.
+    A closest hit query runs in two phases. :meth:`intersect` only finds the
+    distance of the closest hit and the primitive hit, which is all that the
+    traversal of a container needs, and :meth:`shade` then fills in the
+    :class:`HitRecord` of that one hit. A subclass implements either
+    :meth:`hit`, or :meth:`intersect` and :meth:`shade`.
+
+    '''
 
     def hit(self, ray: "Ray", interval: "Interval") -> \
             Tuple[bool, Optional["HitRecord"]]:
@@ -61,8 +71,106 @@ class Hittable:
             bool: If the ray can hit it.
             HitRecord: The :class:`HitRecord` of the hit point if hittable.
 
+        '''
+        t, prim = self.intersect(ray, interval)
+        if prim is None:
+            return False, None
+        return True, prim.shade(ray, t)
+
+    def intersect(self, ray: "Ray", interval: "Interval") -> \
+            Tuple[float, Optional["Hittable"]]:
+        '''
+        Find the closest hit of the :class:`Ray` within the interval without
+        building its :class:`HitRecord`.
+
+        Args:
+            ray: The ray equation for detecting.
+            interval: The given :class:`Interval`.
+
+        Returns:
+            float: The ``t`` of the hit, ``INFINITY`` if there is none.
+            Hittable: The object whose :meth:`shade` builds the
+                :class:`HitRecord`, or ``None`` if there is no hit.
+
+        '''
+        hit, rec = self.hit(ray, interval)
+        if not hit:
+            return INFINITY, None
+        return rec.t, _ShadedHit(rec)
+
+    def shade(self, ray: "Ray", t: float) -> "HitRecord":
+        '''
+        Build the :class:`HitRecord` of the hit found by :meth:`intersect` at
+        :arg:`t`.
+
         '''
         pass
 
+    def occluded(self, ray: "Ray", interval: "Interval") -> bool:
+        '''
+        Test if the :class:`Ray` hits anything within the interval. Unlike
+        :meth:`hit` the test stops at the first hit found, which need not be
+        the closest, and builds no :class:`HitRecord`. This is the query of
+        shadow rays.
+
+        Args:
+            ray: The ray equation for detecting.
+            interval: The given :class:`Interval`.
+
+        Returns:
+            bool: If the ray hits anything.
+
+        '''
+        return self.hit(ray, interval)[0]
+
     def bounding_box(self) -> "AABB":
         pass
+
+    def motion_boxes(self) -> Tuple["AABB", "AABB"]:
+        '''
+        The bounding boxes at the start and the end of the shutter. The box
+        at any time between is bounded by the interpolation of the two,
+        which is what :class:`MotionBVH` relies on. An object which does
+        not move returns its :meth:`bounding_box` twice.
+
+        '''
+        box = self.bounding_box()
+        return box, box
+
+    def pdf_value(self, origin: "Point3", direction: "Vector3",
+                  time: float = 0.0) -> float:
+        '''
+        The density, over solid angle, of :meth:`random` choosing
+        :arg:`direction` from :arg:`origin`.
+
+        '''
+        return 0.0
+
+    def random(self, origin: "Point3", time: float = 0.0) -> "Vector3":
+        '''
+        Choose a direction from :arg:`origin` towards the :class:`Hittable`,
+        which is how lights are sampled directly.
+
+        '''
+        return Vector3(1, 0, 0)
+
+    def primitives(self) -> List["Hittable"]:
+        '''
+        List the primitive shapes held by the :class:`Hittable`. A shape is
+        its own primitive, while containers return the shapes they hold.
+
+        '''
+        return [self]
+
+
+class _ShadedHit(Hittable):
+    '''
+    The hit of a :class:`Hittable` which only implements :meth:`hit`, whose
+    :class:`HitRecord` is built already.
+
+    '''
+    def __init__(self, rec: "HitRecord") -> None:
+        self.rec = rec
+
+    def shade(self, ray: "Ray", t: float) -> "HitRecord":
+        return self.rec
@@ -1,48 +1,97 @@
+import hashlib
+import os
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
 from PIL import Image
 
-from vec import Color
-
 
 class TextureImage:
     '''
     A tool class for loading image file.
+    The pixels are kept in one contiguous ``uint8`` array of shape
+    ``(height, width, 3)``. With a :arg:`cache_dir` the array is stored once
+    as a ``.npy`` file and memory-mapped, so worker processes share the pages
+    of a large texture instead of holding a copy each.
 
     Attributes:
         filename: The image file.
+        cache_dir: The directory of the memory-mapped cache, or ``None`` to
+            keep the pixels in memory.
+        data: The pixel array.
 
     '''
-    def __init__(self, filename: str) -> None:
+    def __init__(self, filename: str, cache_dir: Optional[str] = None) -> \
+            None:
+        self.filename = filename
+        self.cache_dir = cache_dir
         self._load(filename)
 
     def _load(self, filename: str) -> None:
-        image = Image.open(filename)
-        self.image_height = image.height
-        self.image_width = image.width
-        self.data = [[0 for i in range(self.image_width)]
-                     for j in range(self.image_height)]
-        _data = image.load()
-        for w in range(self.image_width):
-            for h in range(self.image_height):
-                r, g, b = _data[w, h]
-                self.data[h][w] = (r, g, b)
-
-    def pixel_data(self, x: int, y: int) -> "Color":
+        cache = self._cache_path(filename)
+        if cache is not None and os.path.exists(cache):
+            self.data = np.load(cache, mmap_mode='r')
+        else:
+            with Image.open(filename) as image:
+                data = np.asarray(image.convert('RGB'))
+            if cache is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Write to a private name first so that a concurrent reader
+                # never maps a half-written file.
+                tmp = f"{cache}.{os.getpid()}.npy"
+                np.save(tmp, data)
+                os.replace(tmp, cache)
+                data = np.load(cache, mmap_mode='r')
+            self.data = data
+        self.image_height, self.image_width = self.data.shape[:2]
+
+    def _cache_path(self, filename: str) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        stat = os.stat(filename)
+        key = f"{os.path.abspath(filename)}:{stat.st_size}:{stat.st_mtime_ns}"
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.npy")
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        if isinstance(self.data, np.memmap):
+            # The receiving process maps the cache file itself.
+            del state['data']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        if 'data' not in state:
+            self._load(self.filename)
+
+    def pixel_data(self, x: int, y: int) -> Tuple[int, int, int]:
         '''
-        Find pixel :class:`Color` with given coordinate.
+        Find pixel color with given coordinate.
 
         Args:
             x: The x coord.
             y: The y coord.
 
         Returns:
-            Color: The color info.
+            tuple: The ``r, g, b`` bytes of the pixel.
+
+        '''
+        x = self.clamp(x, 0, self.image_width - 1)
+        y = self.clamp(y, 0, self.image_height - 1)
+        r, g, b = self.data[y, x].tolist()
+        return r, g, b
+
+    def pixels(self, x: "np.ndarray", y: "np.ndarray") -> "np.ndarray":
+        '''
+        Find the pixels of arrays of coordinates at once.
+
+        Returns:
+            np.ndarray: The ``(n, 3)`` bytes of the pixels.
 
         '''
-        x = self.clamp(x, 0, self.image_width)
-        y = self.clamp(y, 0, self.image_height)
-        return Color(x=self.data[y][x][0],
-                     y=self.data[y][x][1],
-                     z=self.data[y][x][2])
+        x = np.clip(x, 0, self.image_width - 1)
+        y = np.clip(y, 0, self.image_height - 1)
+        return self.data[y, x]
 
     @staticmethod
     def clamp(x: int, low: int, high: int) -> int:
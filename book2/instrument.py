@@ -0,0 +1,446 @@
+import collections
+import json
+import time
+from array import array
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, \
+    Optional, Tuple, Union
+import bvh
+import mesh
+from aabb import AABB
+from bvh import BVHLeaf, BVHNode, FlatBVH, MotionBVH
+from camera import Camera
+from hittable import Hittable
+from material import Material
+from output import open_writer
+from tex import Texture
+from transform import Instance
+from world import World
+
+
+__all__ = ['Instrumentation', 'STAGES', 'COUNTS']
+
+
+# The stages the render time is split into. The time of a stage leaves out
+# the stages nested in it, so the stages add up to the time of the bands.
+STAGES = ('band', 'camera', 'path', 'intersect', 'shade', 'scatter',
+          'texture', 'light')
+
+# The events counted for the whole render and for every band.
+COUNTS = ('paths', 'rays', 'shadow_rays', 'hits', 'box_tests',
+          'primitive_tests')
+
+# Containers hand the ray on to what they hold, so their tests are not
+# primitive tests.
+_CONTAINERS = (World, BVHNode, BVHLeaf, FlatBVH, MotionBVH, Instance)
+
+_active: Optional["Instrumentation"] = None
+
+
+class Instrumentation:
+    '''
+    Count and time the work of the renders of a :class:`Camera`.
+    Nothing is instrumented until :meth:`enable`, which swaps the methods of
+    the camera, the boxes, the shapes, the materials and the textures for
+    counting versions. :meth:`disable` puts the originals back, so a render
+    without instrumentation runs exactly the code it always did.
+
+    .. code-block:: python
+
+        with Instrumentation() as stats:
+            cam.render(world, 'image.png')
+        stats.write_json('stats.json')
+        stats.write_heatmap('cost.png')
+
+    Only the work done in the current process is seen, so render with one
+    worker. The wavefront engine traces a whole band in arrays, so for it
+    only the times and rays of the bands are known.
+
+    The box tests are those of :meth:`AABB.slab`, which :class:`BVHNode`
+    runs, and the nodes visited by :func:`flat_leaves`, the traversal of
+    :class:`FlatBVH`, :class:`MotionBVH` and :class:`TriangleMesh`. The
+    triangles of a mesh count as one primitive test of the mesh.
+
+    Attributes:
+        counts: The number of every event of :data:`COUNTS`. ``rays`` are
+            the closest hit queries of the paths, of which ``hits`` hit
+            something, and ``shadow_rays`` the occlusion queries of light
+            sampling.
+        tests: The :meth:`Hittable.intersect` and
+            :meth:`Hittable.occluded` calls by class.
+        class_hits: The hits of those calls by class.
+        scatters: The :meth:`Material.scatter` calls by class.
+        textures: The :meth:`Texture.value` calls by class.
+        bounces: The number of paths by the number of their bounces.
+        seconds: The time of every stage of :data:`STAGES`.
+        tiles: A dict for every band rendered, with its ``start`` and
+            ``end`` rows, ``seconds``, ``samples`` and the :data:`COUNTS`
+            of the band.
+        width: The width of the image of :attr:`pixel_seconds`.
+        height: The height of the image of :attr:`pixel_seconds`.
+        pixel_seconds: The time spent tracing the paths of every pixel.
+        pixel_rays: The rays cast for every pixel.
+
+    '''
+
+    def __init__(self) -> None:
+        self.counts: collections.Counter = collections.Counter()
+        self.tests: collections.Counter = collections.Counter()
+        self.class_hits: collections.Counter = collections.Counter()
+        self.scatters: collections.Counter = collections.Counter()
+        self.textures: collections.Counter = collections.Counter()
+        self.bounces: collections.Counter = collections.Counter()
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self.tiles: List[Dict[str, Any]] = list()
+        self.width = 0
+        self.height = 0
+        self.pixel_seconds = array('d')
+        self.pixel_rays = array('l')
+        self._stage: Optional[str] = None
+        self._pixel: Optional[int] = None
+        self._patches: List[Tuple[Any, str, Callable[..., Any]]] = list()
+
+    def __enter__(self) -> "Instrumentation":
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.disable()
+
+    def reset(self) -> None:
+        '''Clear everything counted so far.'''
+        # The patched methods hold on to the counters, so they are cleared
+        # in place.
+        for counter in (self.counts, self.tests, self.class_hits,
+                        self.scatters, self.textures, self.bounces):
+            counter.clear()
+        self.seconds.update(dict.fromkeys(STAGES, 0.0))
+        self.tiles.clear()
+        self.width = 0
+        self.height = 0
+        self.pixel_seconds = array('d')
+        self.pixel_rays = array('l')
+
+    def enable(self) -> None:
+        '''Start counting, in every render until :meth:`disable`.'''
+        global _active
+        if _active is self:
+            return
+        if _active is not None:
+            raise RuntimeError("Another instrumentation is enabled")
+        for owner, name, wrapper in self._wrappers():
+            self._patches.append((owner, name, vars(owner)[name]))
+            setattr(owner, name, wrapper)
+        _active = self
+
+    def disable(self) -> None:
+        '''Stop counting and restore the original methods.'''
+        global _active
+        for owner, name, func in reversed(self._patches):
+            setattr(owner, name, func)
+        self._patches = list()
+        if _active is self:
+            _active = None
+
+    def summary(self) -> Dict[str, Any]:
+        '''
+        Everything counted, ready for :func:`json.dump`.
+
+        Returns:
+            dict: The ``counts``; the tests, box tests and time per ray as
+                ``per_ray``; the ``tests``, ``hits``, ``scatters`` and
+                ``textures`` by class; the ``bounces`` histogram and mean;
+                the ``seconds`` of every stage and the ``tiles``.
+
+        '''
+        counts = {key: self.counts[key] for key in COUNTS}
+        rays = counts['rays'] + counts['shadow_rays']
+        paths = counts['paths']
+        histogram = [self.bounces[n] for n in
+                     range(max(self.bounces, default=-1) + 1)]
+        return {
+            'counts': counts,
+            'per_ray': {
+                'box_tests': counts['box_tests'] / rays if rays else 0.0,
+                'primitive_tests':
+                    counts['primitive_tests'] / rays if rays else 0.0,
+                'seconds': sum(self.seconds.values()) / rays if rays
+                else 0.0,
+            },
+            'tests': dict(self.tests.most_common()),
+            'hits': dict(self.class_hits.most_common()),
+            'scatters': dict(self.scatters.most_common()),
+            'textures': dict(self.textures.most_common()),
+            'bounces': {
+                'mean': sum(n * count for n, count in
+                            enumerate(histogram)) / paths if paths else 0.0,
+                'histogram': histogram,
+            },
+            'seconds': dict(self.seconds),
+            'tiles': self.tiles,
+        }
+
+    def write_json(self, path: str) -> None:
+        '''Write the :meth:`summary` to a JSON file.'''
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def write_heatmap(self, out: Union[str, BinaryIO], cost: str = 'seconds',
+                      format: Optional[str] = None) -> None:
+        '''
+        Write the cost of every pixel as an image, from black for the
+        cheapest pixels through red and yellow to white for the dearest.
+
+        Args:
+            out: A file name or a binary stream.
+            cost: ``'seconds'`` for the time of the pixel or ``'rays'`` for
+                its rays.
+            format: The image format, see :func:`open_writer`.
+
+        '''
+        if cost not in ('seconds', 'rays'):
+            raise RuntimeError(f"Unknown pixel cost {cost}")
+        if not self.width:
+            raise RuntimeError("No pixel was traced with the scalar engine")
+        values = self.pixel_seconds if cost == 'seconds' else self.pixel_rays
+        scale = 1.0 / (max(values) or 1)
+        stream = open(out, 'wb') if isinstance(out, str) else out
+        try:
+            writer = open_writer(stream, self.width, self.height, format)
+            for j in range(self.height):
+                row = bytearray()
+                for value in values[j * self.width:(j + 1) * self.width]:
+                    row.extend(_heat(value * scale))
+                writer.write_row(bytes(row))
+            writer.close()
+        finally:
+            if stream is not out:
+                stream.close()
+
+    def _wrappers(self) -> Iterator[Tuple[Any, str, Callable[..., Any]]]:
+        '''
+        The classes and modules to patch, the names of their methods and
+        functions, and the replacements.
+
+        '''
+        yield AABB, 'slab', self._count(AABB.slab)
+        # Both modules call the traversal by its global name.
+        flat_leaves = self._flat_leaves(bvh.flat_leaves)
+        for module in (bvh, mesh):
+            yield module, 'flat_leaves', flat_leaves
+        for cls in _subclasses(Hittable):
+            primitive = not issubclass(cls, _CONTAINERS)
+            for name in ('intersect', 'occluded'):
+                if name in cls.__dict__:
+                    yield cls, name, self._test(cls.__dict__[name],
+                                                cls.__name__, primitive)
+            if 'shade' in cls.__dict__:
+                yield cls, 'shade', self._timed('shade', cls.shade)
+        for cls in [Material] + _subclasses(Material):
+            if 'scatter' in cls.__dict__:
+                yield cls, 'scatter', self._timed('scatter', _counted(
+                    self.scatters, cls.__name__, cls.scatter))
+        for cls in _subclasses(Texture):
+            if 'value' in cls.__dict__:
+                yield cls, 'value', self._timed('texture', _counted(
+                    self.textures, cls.__name__, cls.value))
+        yield Camera, '_render_band', self._render_band(Camera._render_band)
+        yield Camera, '_camera_rays', self._camera_rays(Camera._camera_rays)
+        yield Camera, '_ray_color', self._ray_color(Camera._ray_color)
+        yield Camera, '_direct_light', self._timed('light',
+                                                   Camera._direct_light)
+
+    def _timed(self, stage: str, func: Callable[..., Any]) -> \
+            Callable[..., Any]:
+        '''Add the time of every call of :arg:`func` to :arg:`stage`.'''
+        seconds = self.seconds
+        clock = time.perf_counter
+
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            outer = self._stage
+            self._stage = stage
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                self._stage = outer
+                seconds[stage] += elapsed
+                # The stage of the caller only keeps its own time.
+                if outer is not None:
+                    seconds[outer] -= elapsed
+        return timed
+
+    def _count(self, slab: Callable[..., Any]) -> Callable[..., Any]:
+        counts = self.counts
+
+        def count(box: "AABB", ray: Any, ray_t: Any) -> Tuple[float, float]:
+            counts['box_tests'] += 1
+            return slab(box, ray, ray_t)
+        return count
+
+    def _flat_leaves(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        counts = self.counts
+
+        def flat_leaves(bounds: Any, *args: Any, **kwargs: Any) -> Any:
+            return func(_CountingBounds(bounds, counts), *args, **kwargs)
+        return flat_leaves
+
+    def _test(self, func: Callable[..., Any], name: str,
+              primitive: bool) -> Callable[..., Any]:
+        counts = self.counts
+        tests = self.tests
+        hits = self.class_hits
+
+        def test(obj: "Hittable", ray: Any, interval: Any) -> Any:
+            tests[name] += 1
+            if primitive:
+                counts['primitive_tests'] += 1
+            result = func(obj, ray, interval)
+            # intersect gives the primitive hit, occluded a bool.
+            if result is True or \
+                    type(result) is tuple and result[1] is not None:
+                hits[name] += 1
+            return result
+        return test
+
+    def _render_band(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        timed = self._timed('band', func)
+        clock = time.perf_counter
+
+        def render_band(camera: "Camera", world: "Hittable", start: int,
+                        end: int, *args: Any, **kwargs: Any) -> Any:
+            if (self.width, self.height) != (camera.image_width,
+                                             camera.image_height):
+                self.width = camera.image_width
+                self.height = camera.image_height
+                size = self.width * self.height
+                self.pixel_seconds = array('d', [0.0]) * size
+                self.pixel_rays = array('l', [0]) * size
+            before = {key: self.counts[key] for key in COUNTS}
+            begin = clock()
+            band = timed(camera, _CountingWorld(world, self), start, end,
+                         *args, **kwargs)
+            rows, counts, rays = band
+            tile = dict(start=start, end=end, seconds=clock() - begin,
+                        samples=sum(sum(row) for row in counts))
+            for key in COUNTS:
+                tile[key] = self.counts[key] - before[key]
+            if camera._integrator is not None:
+                # The wavefront engine only reports its total.
+                tile['rays'] = rays
+            self.tiles.append(tile)
+            self._pixel = None
+            return band
+        return render_band
+
+    def _camera_rays(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        step = self._timed('camera', next)
+
+        def camera_rays(camera: "Camera", pixel: int, count: int,
+                        first_sample: int, last_sample: int) -> Iterator[Any]:
+            spp = last_sample - first_sample
+            rays = func(camera, pixel, count, first_sample, last_sample)
+            for k in range(count * spp):
+                item = step(rays)
+                # The paths traced next belong to this pixel.
+                self._pixel = pixel + k // spp
+                yield item
+        return camera_rays
+
+    def _ray_color(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        timed = self._timed('path', func)
+        counts = self.counts
+        bounces = self.bounces
+        clock = time.perf_counter
+
+        def ray_color(camera: "Camera", ray: Any, depth: int,
+                      world: "Hittable") -> Any:
+            rays = counts['rays']
+            cast = camera._rays
+            start = clock()
+            color = timed(camera, ray, depth, world)
+            elapsed = clock() - start
+            counts['paths'] += 1
+            # Every bounce casts one ray after the camera ray.
+            bounces[max(counts['rays'] - rays - 1, 0)] += 1
+            pixel = self._pixel
+            if pixel is not None:
+                self.pixel_seconds[pixel] += elapsed
+                self.pixel_rays[pixel] += camera._rays - cast
+            return color
+        return ray_color
+
+
+class _CountingWorld:
+    '''
+    Stand in for the scene of a band and count the queries of the paths,
+    which are the rays cast.
+
+    '''
+
+    def __init__(self, world: "Hittable",
+                 instrumentation: "Instrumentation") -> None:
+        self.world = world
+        self.counts = instrumentation.counts
+        self._intersect = instrumentation._timed('intersect', world.intersect)
+        self._occluded = instrumentation._timed('intersect', world.occluded)
+        self.hit = instrumentation._timed('intersect', world.hit)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.world, name)
+
+    def intersect(self, ray: Any, interval: Any) -> \
+            Tuple[float, Optional["Hittable"]]:
+        self.counts['rays'] += 1
+        t, prim = self._intersect(ray, interval)
+        if prim is not None:
+            self.counts['hits'] += 1
+        return t, prim
+
+    def occluded(self, ray: Any, interval: Any) -> bool:
+        self.counts['shadow_rays'] += 1
+        return self._occluded(ray, interval)
+
+
+class _CountingBounds:
+    '''
+    The node bounds of a flat BVH, which count a box test whenever the
+    traversal reads the first bound of a node.
+
+    '''
+
+    def __init__(self, bounds: Any, counts: collections.Counter) -> None:
+        self.bounds = bounds
+        self.counts = counts
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def __getitem__(self, index: int) -> float:
+        if index % 6 == 0:
+            self.counts['box_tests'] += 1
+        return self.bounds[index]
+
+
+def _counted(counter: collections.Counter, name: str,
+             func: Callable[..., Any]) -> Callable[..., Any]:
+    def counted(*args: Any, **kwargs: Any) -> Any:
+        counter[name] += 1
+        return func(*args, **kwargs)
+    return counted
+
+
+def _subclasses(cls: type) -> List[type]:
+    '''All the classes derived from :arg:`cls`, each once.'''
+    found = dict()
+    for sub in cls.__subclasses__():
+        found[sub] = None
+        found.update(dict.fromkeys(_subclasses(sub)))
+    return list(found)
+
+
+def _heat(x: float) -> Tuple[int, int, int]:
+    '''Map :arg:`x` in ``[0, 1]`` to a color from black to white.'''
+    x = min(max(x, 0.0), 1.0) * 3.0
+    return (int(255 * min(x, 1.0)), int(255 * min(max(x - 1.0, 0.0), 1.0)),
+            int(255 * max(x - 2.0, 0.0)))
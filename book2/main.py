@@ -36,4 +36,4 @@ if __name__ == '__main__':
     world = World(BVHNode(world=world))
 
     cam = Camera(aspect_ratio, image_width, samples_per_pixel, 50, 20, Point3(26, 3, 6), Point3(0, 2, 0), Vector3(0, 1, 0), Color(0.0, 0.0, 0.0))
-    cam.render(world, open("output7.ppm", "w"))
+    cam.render(world, "output7.ppm")
@@ -1,4 +1,5 @@
 from math import sqrt
+from constants import PI
 from typing import Tuple
 from tex import SolidColor, Texture
 from hittable import HitRecord
@@ -34,6 +35,16 @@ class Material:
         '''
         return False, None, None
 
+    def scattering_pdf(self, r_in: "Ray", rec: "HitRecord",
+                       scattered: "Ray") -> float:
+        '''
+        The density, over solid angle, of :meth:`scatter` choosing the
+        direction of :arg:`scattered`. Specular materials pick a single
+        direction and return ``0``, so they are never lit by light sampling.
+
+        '''
+        return 0.0
+
     def emitted(self, u: float, v: float, p: "Point3") -> "Color":
         '''
         Emmiting light if the material is glowing.
@@ -70,8 +81,14 @@ class Lambertian(Material):
         scatter_direction = rec.normal + random_unit_vector()
         if near_zero(scatter_direction):
             scatter_direction = rec.normal
-        return True, self.tex.value(rec.u, rec.v, rec.p),
-        Ray(rec.p, scatter_direction, r_in.time())
+        return True, self.tex.value(rec.u, rec.v, rec.p), \
+            Ray(rec.p, scatter_direction, r_in.time())
+
+    def scattering_pdf(self, r_in: Ray, rec: HitRecord, scattered: Ray) -> \
+            float:
+        # The scatter directions follow the cosine to the normal.
+        cos_theta = rec.normal.dot(scattered.direction().unit_vector())
+        return cos_theta / PI if cos_theta > 0 else 0.0
 
 
 class Metal(Material):
@@ -88,8 +105,8 @@ class Metal(Material):
         reflected = self._reflect(r_in.direction(), rec.normal)
         reflected = reflected.unit_vector() + self.fuzz * random_unit_vector()
         scattered = Ray(rec.p, reflected, r_in.time())
-        return scattered.direction().dot(rec.normal) > 0, self.albedo,
-        scattered
+        return scattered.direction().dot(rec.normal) > 0, self.albedo, \
+            scattered
 
 
 class Dielectric(Material):
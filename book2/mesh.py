@@ -0,0 +1,309 @@
+from array import array
+from typing import Iterable, Optional, Sequence, TextIO, Tuple, Union
+from aabb import AABB
+from bvh import build_flat, flat_leaves
+from constants import INFINITY
+from hittable import HitRecord, Hittable
+from interval import Interval
+from material import Material
+from ray import Ray
+from vec import Point3, Vector3
+
+
+__all__ = ['TriangleMesh', 'load_obj']
+
+
+_PAD = 0.0001
+
+
+class TriangleMesh(Hittable):
+    '''
+    A mesh of triangles kept in flat arrays.
+    The triangles are arranged in a BVH of their own, built like
+    :class:`FlatBVH` but over bare boxes, so no Python object exists per
+    triangle. Every triangle is stored once more in leaf order as its first
+    vertex and two edges, which is what the Möller–Trumbore test reads.
+
+    Attributes:
+        vertices: The flat ``x, y, z`` of the vertices.
+        indices: Three vertex indices per triangle, counter-clockwise seen
+            from the front.
+        mat: The material of the mesh.
+        normals: The flat ``x, y, z`` of the vertex normals, or ``None`` for
+            the flat normal of every triangle.
+        normal_indices: Three normal indices per triangle, by default the
+            same as :arg:`indices`.
+        uvs: The flat ``u, v`` texture coordinates, or ``None`` for the
+            barycentric coordinates of the hit.
+        uv_indices: Three texture coordinate indices per triangle, by
+            default the same as :arg:`indices`.
+        max_leaf_size: The largest number of triangles in one leaf.
+        strategy: ``'median'`` or ``'sah'``, see :class:`BVHNode`.
+        bbox: The bounding box of the mesh.
+
+    '''
+
+    def __init__(self,
+                 vertices: Sequence[float],
+                 indices: Sequence[int],
+                 mat: "Material" = Material(),
+                 normals: Optional[Sequence[float]] = None,
+                 normal_indices: Optional[Sequence[int]] = None,
+                 uvs: Optional[Sequence[float]] = None,
+                 uv_indices: Optional[Sequence[int]] = None,
+                 max_leaf_size: int = 4,
+                 strategy: str = 'sah') -> None:
+        if not indices or len(indices) % 3:
+            raise RuntimeError("A mesh needs three indices per triangle")
+        self.vertices = array('d', vertices)
+        self.indices = array('l', indices)
+        self.mat = mat
+        self.normals = array('d', normals) if normals is not None else None
+        self.normal_indices = array('l', normal_indices) \
+            if normal_indices is not None else self.indices
+        self.uvs = array('d', uvs) if uvs is not None else None
+        self.uv_indices = array('l', uv_indices) \
+            if uv_indices is not None else self.indices
+        self.max_leaf_size = max_leaf_size
+        self.strategy = strategy
+
+        verts = self.vertices
+        boxes = list()
+        for tri in range(len(self.indices) // 3):
+            a, b, c = (3 * k for k in self.indices[3 * tri:3 * tri + 3])
+            box = list()
+            for axis in range(3):
+                values = (verts[a + axis], verts[b + axis], verts[c + axis])
+                low = min(values)
+                high = max(values)
+                if high - low < _PAD:
+                    # Pad flat boxes like AABB does, or an axis-aligned
+                    # triangle would slip through the slab test.
+                    low -= _PAD / 2
+                    high += _PAD / 2
+                box.extend((low, high))
+            boxes.append(tuple(box))
+        self.bounds, self.offsets, self.counts, self.axes, order = \
+            build_flat(boxes, max_leaf_size, strategy)
+
+        # The triangles in leaf order: their index and p0, e1, e2.
+        self.triangles = array('l', order)
+        self._edges = array('d')
+        for tri in order:
+            a, b, c = (3 * k for k in self.indices[3 * tri:3 * tri + 3])
+            self._edges.extend((
+                verts[a], verts[a + 1], verts[a + 2],
+                verts[b] - verts[a], verts[b + 1] - verts[a + 1],
+                verts[b + 2] - verts[a + 2],
+                verts[c] - verts[a], verts[c + 1] - verts[a + 1],
+                verts[c + 2] - verts[a + 2]))
+
+        b = self.bounds
+        self.bbox = AABB(a=Point3(b[0], b[2], b[4]),
+                         b=Point3(b[1], b[3], b[5]))
+
+    def __len__(self) -> int:
+        return len(self.indices) // 3
+
+    def intersect(self, ray: "Ray", interval: "Interval") -> \
+            Tuple[float, Optional["Hittable"]]:
+        '''
+        Find the closest triangle hit by the :class:`Ray` within the
+        interval.
+        '''
+        hit = self._traverse(ray, interval, False)
+        if hit is None:
+            return INFINITY, None
+        t, slot, b1, b2 = hit
+        return t, _TriangleHit(self, self.triangles[slot], b1, b2)
+
+    def occluded(self, ray: "Ray", interval: "Interval") -> bool:
+        return self._traverse(ray, interval, True) is not None
+
+    def _traverse(self, ray: "Ray", interval: "Interval", any_hit: bool) -> \
+            Optional[Tuple[float, int, float, float]]:
+        '''
+        Walk the BVH of the mesh and test the triangles of the leaves.
+
+        Returns:
+            tuple: The ``t`` of the closest hit, or the first with
+                :arg:`any_hit`, the slot of the triangle in leaf order and
+                the barycentric coordinates of the second and third vertex.
+                ``None`` for a miss.
+
+        '''
+        orig = ray.origin()
+        dir = ray.direction()
+        ox, oy, oz = orig.x, orig.y, orig.z
+        dx, dy, dz = dir.x, dir.y, dir.z
+        edges = self._edges
+        t_min = interval.min
+        # Narrowed in place to the closest hit so far.
+        ray_t = Interval(t_min, interval.max)
+        found = None
+
+        for first, count in flat_leaves(self.bounds, self.offsets,
+                                        self.counts, self.axes, ray, ray_t):
+            closest = ray_t.max
+            for slot in range(first, first + count):
+                # Möller–Trumbore, on the stored first vertex and edges.
+                e = 9 * slot
+                e1x, e1y, e1z = edges[e + 3], edges[e + 4], edges[e + 5]
+                e2x, e2y, e2z = edges[e + 6], edges[e + 7], edges[e + 8]
+                px = dy * e2z - dz * e2y
+                py = dz * e2x - dx * e2z
+                pz = dx * e2y - dy * e2x
+                det = e1x * px + e1y * py + e1z * pz
+                if -1e-12 < det < 1e-12:
+                    continue
+                inv_det = 1.0 / det
+                tx = ox - edges[e]
+                ty = oy - edges[e + 1]
+                tz = oz - edges[e + 2]
+                b1 = (tx * px + ty * py + tz * pz) * inv_det
+                if b1 < 0.0 or b1 > 1.0:
+                    continue
+                qx = ty * e1z - tz * e1y
+                qy = tz * e1x - tx * e1z
+                qz = tx * e1y - ty * e1x
+                b2 = (dx * qx + dy * qy + dz * qz) * inv_det
+                if b2 < 0.0 or b1 + b2 > 1.0:
+                    continue
+                t = (e2x * qx + e2y * qy + e2z * qz) * inv_det
+                if t_min < t < closest:
+                    closest = ray_t.max = t
+                    found = (t, slot, b1, b2)
+                    if any_hit:
+                        return found
+        return found
+
+    def shade_triangle(self, ray: "Ray", t: float, tri: int, b1: float,
+                       b2: float) -> "HitRecord":
+        '''
+        Build the :class:`HitRecord` of the hit of triangle :arg:`tri` at
+        the barycentric coordinates :arg:`b1` and :arg:`b2`.
+
+        '''
+        b0 = 1.0 - b1 - b2
+        verts = self.vertices
+        a, b, c = (3 * k for k in self.indices[3 * tri:3 * tri + 3])
+        p0 = Vector3(verts[a], verts[a + 1], verts[a + 2])
+        e1 = Vector3(verts[b], verts[b + 1], verts[b + 2]) - p0
+        e2 = Vector3(verts[c], verts[c + 1], verts[c + 2]) - p0
+
+        rec = HitRecord()
+        rec.t = t
+        rec.p = ray.at(t)
+        rec.mat = self.mat
+        rec.set_face_normal(ray, e1.cross(e2).unit_vector())
+        if self.normals is not None:
+            ns = self.normals
+            a, b, c = (3 * k for k in
+                       self.normal_indices[3 * tri:3 * tri + 3])
+            normal = Vector3(
+                b0 * ns[a] + b1 * ns[b] + b2 * ns[c],
+                b0 * ns[a + 1] + b1 * ns[b + 1] + b2 * ns[c + 1],
+                b0 * ns[a + 2] + b1 * ns[b + 2] + b2 * ns[c + 2])
+            if normal.length_squared() > 0:
+                # The shading normal faces the ray like the flat one.
+                normal = normal.unit_vector()
+                rec.normal = normal if normal.dot(rec.normal) >= 0 \
+                    else -normal
+        if self.uvs is not None:
+            uvs = self.uvs
+            a, b, c = (2 * k for k in self.uv_indices[3 * tri:3 * tri + 3])
+            rec.u = b0 * uvs[a] + b1 * uvs[b] + b2 * uvs[c]
+            rec.v = b0 * uvs[a + 1] + b1 * uvs[b + 1] + b2 * uvs[c + 1]
+        else:
+            rec.u = b1
+            rec.v = b2
+        return rec
+
+    def bounding_box(self) -> "AABB":
+        return self.bbox
+
+
+class _TriangleHit(Hittable):
+    '''The closest hit of a :class:`TriangleMesh`, shaded on demand.'''
+
+    def __init__(self, mesh: "TriangleMesh", tri: int, b1: float,
+                 b2: float) -> None:
+        self.mesh = mesh
+        self.tri = tri
+        self.b1 = b1
+        self.b2 = b2
+
+    def shade(self, ray: "Ray", t: float) -> "HitRecord":
+        return self.mesh.shade_triangle(ray, t, self.tri, self.b1, self.b2)
+
+
+def load_obj(obj: Union[str, TextIO, Iterable[str]],
+             mat: "Material" = Material(), **options) -> "TriangleMesh":
+    '''
+    Load the triangles of a Wavefront ``.obj`` file into one
+    :class:`TriangleMesh`.
+    The file is read line by line straight into flat arrays, and polygons
+    are split into fans of triangles. Only ``v``, ``vt``, ``vn`` and ``f``
+    are read; groups and materials are ignored.
+
+    Args:
+        obj: A file name, or an open text file.
+        mat: The material of the mesh.
+        options: Passed to :class:`TriangleMesh`.
+
+    '''
+    if isinstance(obj, str):
+        with open(obj) as f:
+            return load_obj(f, mat, **options)
+
+    vertices = array('d')
+    normals = array('d')
+    uvs = array('d')
+    indices = array('l')
+    uv_indices = array('l')
+    normal_indices = array('l')
+    # The columns of every corner of the current face: v, vt and vn.
+    face = ([], [], [])
+
+    for line in obj:
+        fields = line.split()
+        if not fields:
+            continue
+        kind = fields[0]
+        if kind == 'v':
+            vertices.extend(map(float, fields[1:4]))
+        elif kind == 'vn':
+            normals.extend(map(float, fields[1:4]))
+        elif kind == 'vt':
+            uvs.extend(map(float, fields[1:3]))
+        elif kind == 'f':
+            counts = (len(vertices) // 3, len(uvs) // 2, len(normals) // 3)
+            for column in face:
+                column.clear()
+            for corner in fields[1:]:
+                refs = corner.split('/')
+                for k in range(3):
+                    ref = refs[k] if k < len(refs) else ''
+                    if ref:
+                        n = int(ref)
+                        # OBJ counts from 1, and from the end when negative.
+                        face[k].append(n - 1 if n > 0 else counts[k] + n)
+            for column, out in zip(face, (indices, uv_indices,
+                                          normal_indices)):
+                if len(column) != len(fields) - 1:
+                    continue
+                for k in range(1, len(column) - 1):
+                    out.append(column[0])
+                    out.append(column[k])
+                    out.append(column[k + 1])
+
+    complete = len(indices)
+    has_normals = bool(normals) and len(normal_indices) == complete
+    has_uvs = bool(uvs) and len(uv_indices) == complete
+    return TriangleMesh(
+        vertices, indices, mat,
+        normals=normals if has_normals else None,
+        normal_indices=normal_indices if has_normals else None,
+        uvs=uvs if has_uvs else None,
+        uv_indices=uv_indices if has_uvs else None,
+        **options)
@@ -0,0 +1,166 @@
+import io
+import os
+import struct
+import zlib
+from typing import BinaryIO, List, Optional, TextIO, Union
+
+
+__all__ = ['ImageWriter', 'P3Writer', 'P6Writer', 'PNGWriter',
+           'open_writer']
+
+
+class ImageWriter:
+    '''
+    Write an image row by row.
+    The rows are packed RGB bytes. They are buffered and handed to the
+    stream every :arg:`flush_rows` rows, so only a few rows are in memory
+    however large the image is.
+
+    Attributes:
+        out: The output stream.
+        width: The image width.
+        height: The image height.
+        flush_rows: The number of rows buffered before they are written.
+
+    '''
+
+    def __init__(self, out: Union[BinaryIO, TextIO], width: int,
+                 height: int, flush_rows: int = 16) -> None:
+        self.out = out
+        self.width = width
+        self.height = height
+        self.flush_rows = flush_rows
+        self._rows: List[bytes] = list()
+        self._header()
+
+    def write_row(self, row: bytes) -> None:
+        '''Queue one row of ``3 * width`` bytes.'''
+        self._rows.append(row)
+        if len(self._rows) >= self.flush_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._rows:
+            self._write(self._rows)
+            self._rows = list()
+        self.out.flush()
+
+    def close(self) -> None:
+        '''Write the queued rows and the trailer of the format.'''
+        self.flush()
+        self._footer()
+        self.out.flush()
+
+    def _header(self) -> None:
+        pass
+
+    def _write(self, rows: List[bytes]) -> None:
+        pass
+
+    def _footer(self) -> None:
+        pass
+
+
+class P3Writer(ImageWriter):
+    '''
+    The plain text ``P3`` PPM format, one ``"r g b"`` line per pixel.
+
+    '''
+
+    def _header(self) -> None:
+        self.out.write(f"P3\n{self.width} {self.height}\n255\n")
+
+    def _write(self, rows: List[bytes]) -> None:
+        lines = list()
+        for row in rows:
+            for k in range(0, len(row), 3):
+                lines.append(f"{row[k]} {row[k + 1]} {row[k + 2]}\n")
+        self.out.write(''.join(lines))
+
+
+class P6Writer(ImageWriter):
+    '''
+    The binary ``P6`` PPM format.
+
+    '''
+
+    def _header(self) -> None:
+        self.out.write(f"P6\n{self.width} {self.height}\n255\n".encode())
+
+    def _write(self, rows: List[bytes]) -> None:
+        self.out.write(b''.join(rows))
+
+
+class PNGWriter(ImageWriter):
+    '''
+    The PNG format. The rows are deflated as they arrive and every flush
+    emits one ``IDAT`` chunk, so the image is never held in memory.
+
+    '''
+
+    def _header(self) -> None:
+        self._compressor = zlib.compressobj(6)
+        self.out.write(b'\x89PNG\r\n\x1a\n')
+        # 8 bits per channel, truecolor, no interlacing.
+        self._chunk(b'IHDR', struct.pack('>IIBBBBB', self.width,
+                                         self.height, 8, 2, 0, 0, 0))
+
+    def _write(self, rows: List[bytes]) -> None:
+        # Every scanline starts with its filter type, 0 for none.
+        data = self._compressor.compress(
+            b''.join(b'\x00' + bytes(row) for row in rows))
+        if data:
+            self._chunk(b'IDAT', data)
+
+    def _footer(self) -> None:
+        self._chunk(b'IDAT', self._compressor.flush())
+        self._chunk(b'IEND', b'')
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self.out.write(struct.pack('>I', len(data)))
+        self.out.write(kind)
+        self.out.write(data)
+        self.out.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind))))
+
+
+_WRITERS = {
+    'p3': P3Writer,
+    'ppm': P6Writer,
+    'p6': P6Writer,
+    'png': PNGWriter,
+}
+
+
+def open_writer(out: Union[BinaryIO, TextIO], width: int, height: int,
+                format: Optional[str] = None,
+                flush_rows: int = 16) -> "ImageWriter":
+    '''
+    Pick the :class:`ImageWriter` for the output.
+
+    Args:
+        out: A binary or a text stream. A text stream can only take ``P3``.
+        width: The image width.
+        height: The image height.
+        format: ``'p3'``, ``'ppm'`` (or ``'p6'``) or ``'png'``. When omitted
+            it is taken from the extension of the stream name, and a text
+            stream defaults to ``'p3'``.
+        flush_rows: The number of rows buffered before they are written.
+
+    Returns:
+        ImageWriter: The writer, which has written the header already.
+
+    '''
+    if format is None:
+        if isinstance(out, io.TextIOBase):
+            format = 'p3'
+        else:
+            name = getattr(out, 'name', '')
+            ext = os.path.splitext(name)[1] if isinstance(name, str) else ''
+            format = ext[1:].lower() if ext[1:].lower() in _WRITERS \
+                else 'ppm'
+    format = format.lower()
+    if format not in _WRITERS:
+        raise RuntimeError(f"Unknown image format {format}")
+    if isinstance(out, io.TextIOBase) and format != 'p3':
+        raise RuntimeError(f"The {format} format needs a binary stream")
+    return _WRITERS[format](out, width, height, flush_rows)
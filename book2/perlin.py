@@ -1,8 +1,8 @@
+import random
 from math import fabs, floor
-from random import randint
-from typing import List
-from vec import Point3, Vector3
-from utils import random_vector
+from typing import List, Optional
+import numpy as np
+from vec import Point3
 
 
 __all__ = ["Perlin"]
@@ -14,20 +14,31 @@ class Perlin:
     The main idea of Perlin noise if to map the input point to randomish
     number.
 
+    The lattice tables are built once from their own random generator, so a
+    :class:`Perlin` with the same :arg:`seed` always yields the same noise.
+
     Attributes:
         point_count: The number of random point.
-        randvec: The vectors stored for Perlin Algorithm.
+        randvec: The unit vectors stored for Perlin Algorithm, as ``(x, y, z)``
+            tuples.
         perm_x, perm_y, perm_z: A list for generating random vectors.
+        seed: The seed of the lattice tables. ``None`` seeds from the system.
 
     '''
 
-    def __init__(self) -> None:
+    def __init__(self, seed: Optional[int] = None) -> None:
         self.point_count = 256
-        self.perm_x = self._perlin_generate_perm()
-        self.perm_y = self._perlin_generate_perm()
-        self.perm_z = self._perlin_generate_perm()
-        self.randvec = [random_vector(-1, 1).unit_vector()
+        self.seed = seed
+        rng = random.Random(seed)
+        self.perm_x = self._perlin_generate_perm(rng)
+        self.perm_y = self._perlin_generate_perm(rng)
+        self.perm_z = self._perlin_generate_perm(rng)
+        self.randvec = [self._random_unit_vector(rng)
                         for i in range(self.point_count)]
+        # The same tables as arrays for the batched evaluators.
+        self._perm = np.array([self.perm_x, self.perm_y, self.perm_z],
+                              dtype=np.int64)
+        self._randvec = np.array(self.randvec, dtype=float)
 
     def noise(self, p: "Point3") -> float:
         '''
@@ -37,26 +48,12 @@ class Perlin:
             p: The position of the hit point.
 
         '''
-        u = p.x - floor(p.x)
-        v = p.y - floor(p.y)
-        w = p.z - floor(p.z)
-
-        i = int(floor(p.x))
-        j = int(floor(p.y))
-        k = int(floor(p.z))
-        c = [[[0, 0] for i in range(2)] for j in range(2)]
-
-        for di in range(2):
-            for dj in range(2):
-                for dk in range(2):
-                    c[di][dj][dk] = self.randvec[self.perm_x[(i + di) & 255] ^
-                                                 self.perm_y[(j + dj) & 255] ^
-                                                 self.perm_z[(k + dk) & 255]]
-        return self._perlin_interp(c, u, v, w)
+        return self._noise(p.x, p.y, p.z)
 
     def turb(self, p: "Point3", depth: int) -> float:
         '''
-        An effect to make the noise look like the turbulence.
+        An effect to make the noise look like the turbulence. Every octave
+        doubles the frequency and halves the weight of the noise.
 
         p: The hit point.
         depth: The scale of turbulence.
@@ -64,40 +61,105 @@ class Perlin:
         '''
         accum = 0.0
         weight = 1.0
-        tmp = p
+        x, y, z = p.x, p.y, p.z
 
         for i in range(depth):
-            accum += weight * self.noise(p)
+            accum += weight * self._noise(x, y, z)
             weight *= 0.5
-            tmp *= 2
+            x, y, z = x * 2, y * 2, z * 2
         return fabs(accum)
 
-    def _perlin_generate_perm(self) -> List[int]:
+    def noise_batch(self, points: "np.ndarray") -> "np.ndarray":
+        '''
+        Evaluate :meth:`noise` for an ``(n, 3)`` array of points at once.
+
+        '''
+        points = np.asarray(points, dtype=float)
+        cells = np.floor(points)
+        frac = points - cells
+        cells = cells.astype(np.int64)
+        smooth = frac * frac * (3 - 2 * frac)
+
+        accum = np.zeros(len(points))
+        for di in range(2):
+            wx = smooth[:, 0] if di else 1 - smooth[:, 0]
+            hx = self._perm[0][(cells[:, 0] + di) & 255]
+            for dj in range(2):
+                wy = smooth[:, 1] if dj else 1 - smooth[:, 1]
+                hy = hx ^ self._perm[1][(cells[:, 1] + dj) & 255]
+                for dk in range(2):
+                    wz = smooth[:, 2] if dk else 1 - smooth[:, 2]
+                    g = self._randvec[
+                        hy ^ self._perm[2][(cells[:, 2] + dk) & 255]]
+                    dot = g[:, 0] * (frac[:, 0] - di) + \
+                        g[:, 1] * (frac[:, 1] - dj) + \
+                        g[:, 2] * (frac[:, 2] - dk)
+                    accum += wx * wy * wz * dot
+        return accum
+
+    def turb_batch(self, points: "np.ndarray", depth: int) -> "np.ndarray":
+        '''
+        Evaluate :meth:`turb` for an ``(n, 3)`` array of points at once.
+
+        '''
+        points = np.asarray(points, dtype=float)
+        accum = np.zeros(len(points))
+        weight = 1.0
+        for i in range(depth):
+            accum += weight * self.noise_batch(points)
+            weight *= 0.5
+            points = points * 2
+        return np.abs(accum)
+
+    def _noise(self, x: float, y: float, z: float) -> float:
+        fx = floor(x)
+        fy = floor(y)
+        fz = floor(z)
+        u = x - fx
+        v = y - fy
+        w = z - fz
+        i = int(fx)
+        j = int(fy)
+        k = int(fz)
+        uu = u * u * (3 - 2 * u)
+        vv = v * v * (3 - 2 * v)
+        ww = w * w * (3 - 2 * w)
+
+        perm_y = self.perm_y
+        perm_z = self.perm_z
+        randvec = self.randvec
+        accum = 0.0
+        for di in (0, 1):
+            wx = uu if di else 1 - uu
+            hx = self.perm_x[(i + di) & 255]
+            for dj in (0, 1):
+                wxy = wx * (vv if dj else 1 - vv)
+                hy = hx ^ perm_y[(j + dj) & 255]
+                for dk in (0, 1):
+                    gx, gy, gz = randvec[hy ^ perm_z[(k + dk) & 255]]
+                    accum += wxy * (ww if dk else 1 - ww) * \
+                        (gx * (u - di) + gy * (v - dj) + gz * (w - dk))
+        return accum
+
+    def _perlin_generate_perm(self, rng: "random.Random") -> List[int]:
         p = [i for i in range(self.point_count)]
-        p = self._permute(p, self.point_count)
+        p = self._permute(p, self.point_count, rng)
         return p
 
     @staticmethod
-    def _permute(p: List[int], n: int):
+    def _permute(p: List[int], n: int, rng: "random.Random"):
         for i in range(n - 1, -1, -1):
-            target = randint(0, i)
+            target = rng.randint(0, i)
             p[i], p[target] = p[target], p[i]
         return p
 
     @staticmethod
-    def _perlin_interp(c: List[List[List["Vector3"]]],
-                       u: float, v: float, w: float):
-        uu = u * u * (3 - 2 * u)
-        vv = v * v * (3 - 2 * v)
-        ww = w * w * (3 - 2 * w)
-
-        accum = 0.0
-        for i in range(2):
-            for j in range(2):
-                for k in range(2):
-                    weight = Vector3(u - i, v - j, w - k)
-                    accum += (i * uu + (1-i) * (1-uu)) * \
-                        (j * vv + (1-j) * (1-vv)) * \
-                        (k * ww + (1-k) * (1-ww)) * \
-                        weight.dot(c[i][j][k])
-        return accum
+    def _random_unit_vector(rng: "random.Random"):
+        while True:
+            x = rng.uniform(-1, 1)
+            y = rng.uniform(-1, 1)
+            z = rng.uniform(-1, 1)
+            length_squared = x * x + y * y + z * z
+            if 1e-160 < length_squared:
+                length = length_squared ** 0.5
+                return (x / length, y / length, z / length)
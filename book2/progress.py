@@ -0,0 +1,118 @@
+import sys
+import time
+from typing import Any, Callable, Dict, Optional, TextIO
+
+
+__all__ = ['ProgressReporter']
+
+
+class ProgressReporter:
+    '''
+    Report the progress of a render.
+    :class:`Camera` tells the reporter about every finished band of rows.
+    A report is made at most once per :arg:`interval` seconds, or once per
+    :arg:`every_rows` rows if that is given, and once more when the render
+    finishes.
+
+    Attributes:
+        interval: The least number of seconds between two reports.
+        every_rows: Report after this many rows instead of by time.
+        silent: Do not print the reports.
+        callback: Called with the metrics of every report, see
+            :meth:`metrics`.
+        stream: The stream the reports are printed to.
+
+    '''
+
+    def __init__(self,
+                 interval: float = 1.0,
+                 every_rows: Optional[int] = None,
+                 silent: bool = False,
+                 callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 stream: Optional[TextIO] = None) -> None:
+        self.interval = interval
+        self.every_rows = every_rows
+        self.silent = silent
+        self.callback = callback
+        self.stream = stream
+
+    def start(self, total_rows: int, width: int) -> None:
+        '''Begin a render of :arg:`total_rows` rows of :arg:`width` pixels.'''
+        self.total_rows = total_rows
+        self.width = width
+        self.rows = 0
+        self.samples = 0
+        self.rays = 0
+        self.start_time = time.perf_counter()
+        self._last_time = self.start_time
+        self._last_rows = 0
+        self._print(f"Start to render the image of {width}x{total_rows} "
+                    f"pixels.")
+
+    def update(self, rows: int, samples: int, rays: int) -> None:
+        '''Add :arg:`rows` finished rows which cast the given work.'''
+        self.rows += rows
+        self.samples += samples
+        self.rays += rays
+        now = time.perf_counter()
+        if self.every_rows is not None:
+            due = self.rows - self._last_rows >= self.every_rows
+        else:
+            due = now - self._last_time >= self.interval
+        if due and self.rows < self.total_rows:
+            self._last_time = now
+            self._last_rows = self.rows
+            self._report(self.metrics())
+
+    def finish(self) -> None:
+        '''Make the final report.'''
+        metrics = self.metrics()
+        metrics['done'] = True
+        self._report(metrics)
+
+    def metrics(self) -> Dict[str, Any]:
+        '''
+        Collect the current metrics.
+
+        Returns:
+            dict: ``rows`` and ``total_rows``, ``percent`` complete, the
+                ``samples`` and ``rays`` cast so far, ``elapsed`` seconds,
+                ``samples_per_sec``, ``rays_per_sec`` and the ``eta`` in
+                seconds.
+
+        '''
+        elapsed = time.perf_counter() - self.start_time
+        fraction = self.rows / self.total_rows if self.total_rows else 1.0
+        eta = elapsed * (1 - fraction) / fraction if fraction > 0 else None
+        return {
+            'rows': self.rows,
+            'total_rows': self.total_rows,
+            'percent': 100.0 * fraction,
+            'samples': self.samples,
+            'rays': self.rays,
+            'elapsed': elapsed,
+            'samples_per_sec': self.samples / elapsed if elapsed > 0 else 0.0,
+            'rays_per_sec': self.rays / elapsed if elapsed > 0 else 0.0,
+            'eta': eta,
+            'done': False,
+        }
+
+    def _report(self, metrics: Dict[str, Any]) -> None:
+        if self.callback is not None:
+            self.callback(metrics)
+        if metrics['done']:
+            self._print(f"Rendered {metrics['rows']} rows in "
+                        f"{metrics['elapsed']:.1f}s, "
+                        f"{metrics['rays_per_sec']:.0f} rays/s, "
+                        f"{metrics['samples_per_sec']:.0f} samples/s")
+        else:
+            eta = metrics['eta']
+            self._print(f"Rendered {metrics['rows']}/{metrics['total_rows']} "
+                        f"rows ({metrics['percent']:.1f}%), "
+                        f"{metrics['rays_per_sec']:.0f} rays/s, "
+                        f"{metrics['samples_per_sec']:.0f} samples/s, "
+                        f"ETA {eta:.1f}s")
+
+    def _print(self, message: str) -> None:
+        if not self.silent:
+            print(message, file=self.stream or sys.stdout, flush=True)
@@ -1,15 +1,18 @@
 from math import fabs
-from typing import Tuple
+from typing import Optional, Tuple
 from aabb import AABB
 from hittable import HitRecord
+from constants import INFINITY
 from interval import Interval
 from ray import Ray
 from material import Material
+from utils import random_float
 from vec import Point3, Vector3
 from hittable import Hittable
+from world import World
 
 
-__all__ = ["Quad"]
+__all__ = ["Quad", "box"]
 
 
 class Quad(Hittable):
@@ -25,6 +28,7 @@ class Quad(Hittable):
         d: The D value of the quadrilateral since a quadrilateral can be noted
             as Ax + By + Cz = D, or n * v = D.
         w: The w value of the quadrilateral, usually is n / (n * n).
+        area: The area of the quadrilateral.
 
     '''
 
@@ -40,6 +44,7 @@ class Quad(Hittable):
         self.d = self.normal.dot(self.q)
 
         self.w = n / n.dot(n)
+        self.area = n.length()
 
         self._set_bounding_box()
 
@@ -51,39 +56,94 @@ class Quad(Hittable):
     def bounding_box(self) -> AABB:
         return self.bbox
 
-    def hit(self, ray: Ray, interval: Interval) -> \
-            Tuple[bool, HitRecord | None]:
-        ''' The hit method from :class:`Hittable`. '''
+    def intersect(self, ray: Ray, interval: Interval) -> \
+            Tuple[float, Optional["Hittable"]]:
+        ''' The intersect method from :class:`Hittable`. '''
         denom = self.normal.dot(ray.direction())
         if fabs(denom) < 1e-8:
-            return False, None
+            return INFINITY, None
 
         t = (self.d - self.normal.dot(ray.origin())) / denom
         if not interval.contains(t):
-            return False, None
+            return INFINITY, None
 
-        intersection = ray.at(t)
-        planar_hitpt_vector = intersection - self.q
+        planar_hitpt_vector = ray.at(t) - self.q
         alpha = self.w.dot(planar_hitpt_vector.cross(self.v))
+        if not 0 <= alpha <= 1:
+            return INFINITY, None
         beta = self.w.dot(self.u.cross(planar_hitpt_vector))
+        if not 0 <= beta <= 1:
+            return INFINITY, None
+        return t, self
 
-        res, rec = self._is_interior(alpha, beta)
-        if not res:
-            return False, None
+    def shade(self, ray: Ray, t: float) -> HitRecord:
+        ''' The shade method from :class:`Hittable`. '''
+        rec = HitRecord()
         rec.t = t
-        rec.p = intersection
+        rec.p = ray.at(t)
+        rec.u, rec.v = self._plane_coords(rec.p)
         rec.mat = self.mat
         rec.set_face_normal(ray, self.normal)
+        return rec
 
-        return True, rec
+    def occluded(self, ray: Ray, interval: Interval) -> bool:
+        denom = self.normal.dot(ray.direction())
+        if fabs(denom) < 1e-8:
+            return False
+        t = (self.d - self.normal.dot(ray.origin())) / denom
+        if not interval.contains(t):
+            return False
+        alpha, beta = self._plane_coords(ray.at(t))
+        return 0 <= alpha <= 1 and 0 <= beta <= 1
+
+    def pdf_value(self, origin: "Point3", direction: "Vector3",
+                  time: float = 0.0) -> float:
+        '''
+        The :meth:`Hittable.pdf_value` of a point chosen uniformly over the
+        area, converted to solid angle.
+
+        '''
+        t, hit = self.intersect(Ray(origin, direction, time),
+                                Interval(0.001, INFINITY))
+        if hit is None:
+            return 0.0
+        distance_squared = t * t * direction.length_squared()
+        cosine = fabs(direction.dot(self.normal)) / direction.length()
+        return distance_squared / (cosine * self.area)
+
+    def random(self, origin: "Point3", time: float = 0.0) -> "Vector3":
+        '''Aim at a point chosen uniformly over the area.'''
+        return self.q.mul_add(self.u, random_float()) \
+            .iadd_scaled(self.v, random_float()) - origin
+
+    def _plane_coords(self, p: "Point3") -> Tuple[float, float]:
+        '''The coordinates of :arg:`p` along :arg:`u` and :arg:`v`.'''
+        planar_hitpt_vector = p - self.q
+        alpha = self.w.dot(planar_hitpt_vector.cross(self.v))
+        beta = self.w.dot(self.u.cross(planar_hitpt_vector))
+        return alpha, beta
 
-    @staticmethod
-    def _is_interior(alpha: float, beta: float) -> Tuple[bool, "HitRecord"]:
-        unit_interval = Interval(0, 1)
-        if (not unit_interval.contains(alpha)) or \
-                (not unit_interval.contains(beta)):
-            return False, None
-        rec = HitRecord()
-        rec.u = alpha
-        rec.v = beta
-        return True, rec
+
+def box(a: "Point3", b: "Point3", mat: "Material") -> "World":
+    '''
+    Build the box with the two opposite vertices :arg:`a` and :arg:`b` out of
+    six :class:`Quad` sides.
+
+    '''
+    sides = World()
+
+    low = Point3(min(a.x, b.x), min(a.y, b.y), min(a.z, b.z))
+    high = Point3(max(a.x, b.x), max(a.y, b.y), max(a.z, b.z))
+
+    dx = Vector3(high.x - low.x, 0, 0)
+    dy = Vector3(0, high.y - low.y, 0)
+    dz = Vector3(0, 0, high.z - low.z)
+
+    sides.add(Quad(Point3(low.x, low.y, high.z), dx, dy, mat))
+    sides.add(Quad(Point3(high.x, low.y, high.z), -dz, dy, mat))
+    sides.add(Quad(Point3(high.x, low.y, low.z), -dx, dy, mat))
+    sides.add(Quad(Point3(low.x, low.y, low.z), dz, dy, mat))
+    sides.add(Quad(Point3(low.x, high.y, high.z), dx, -dz, mat))
+    sides.add(Quad(Point3(low.x, low.y, low.z), dx, dz, mat))
+
+    return sides
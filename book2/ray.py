@@ -1,3 +1,5 @@
+from math import copysign
+from constants import INFINITY
 from vec import Point3, Vector3
 
 
@@ -14,6 +16,10 @@ class Ray:
         orig: The origin point of the ray.
         dir: The direction of the ray.
         time: The time when the ray hit.
+        inv_dir: The reciprocals of the direction components, with an
+            infinity of the same sign for a zero component, precomputed for
+            the slab tests of :meth:`AABB.slab`.
+        sign: For every axis, if the direction component is negative.
 
     '''
 
@@ -24,6 +30,11 @@ class Ray:
         self.orig = orig
         self.dir = dir
         self.tm = time
+        x, y, z = dir.x, dir.y, dir.z
+        self.inv_dir = (1.0 / x if x else copysign(INFINITY, x),
+                        1.0 / y if y else copysign(INFINITY, y),
+                        1.0 / z if z else copysign(INFINITY, z))
+        self.sign = (x < 0, y < 0, z < 0)
 
     def origin(self) -> "Point3":
         return self.orig
@@ -39,4 +50,4 @@ class Ray:
         Calculate the hit point with the given :args:`t`.
 
         '''
-        return self.orig + self.dir * t
+        return self.orig.mul_add(self.dir, t)
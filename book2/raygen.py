@@ -0,0 +1,217 @@
+from typing import Any, Tuple
+import numpy as np
+from sampler import Sampler
+
+
+__all__ = ['RayGenerator', 'PATTERNS']
+
+
+PATTERNS = ('random', 'stratified', 'halton', 'sobol')
+
+# The stream counters of the pixel offsets and the time of a camera ray.
+# Tracing a path draws from the counters after these.
+CAMERA_COUNTERS = 3
+
+_SCALE32 = 2.0 ** -32
+
+
+class RayGenerator:
+    '''
+    Generate the primary rays of a :class:`Camera` in batches.
+    The pixel grid is precomputed once, so a batch of any pixels and sample
+    indices costs a few array operations. Both the scalar and the wavefront
+    integrators take their camera rays from here.
+
+    Each sample takes three numbers in ``[0, 1)``, the offsets within the
+    pixel and the time, following one of the :data:`PATTERNS`:
+
+    * ``random``: independent numbers of the sample stream.
+    * ``stratified``: every dimension is split into ``samples_per_pixel``
+      strata, and each sample falls in its own stratum of each dimension,
+      jittered. The strata are shuffled per pixel and per dimension.
+    * ``halton``: the Halton sequence in the bases 2, 3 and 5, shifted per
+      pixel.
+    * ``sobol``: the first three dimensions of the Sobol sequence, with the
+      bits scrambled per pixel.
+
+    The pattern is randomized per pixel in every case, so each sample on its
+    own is still uniform over the pixel and the image is unbiased for any
+    number of samples, including the adaptive and progressive renders which
+    only take some of them.
+
+    Attributes:
+        pattern: One of :data:`PATTERNS`.
+        samples_per_pixel: The number of samples of a pixel.
+        center: The origin of all the rays.
+
+    '''
+
+    def __init__(self, camera: Any, pattern: str = 'random') -> None:
+        if pattern not in PATTERNS:
+            raise RuntimeError(f"Unknown sample pattern {pattern}")
+        self.pattern = pattern
+        self.samples_per_pixel = camera.samples_per_pixel
+        self.center = _point(camera.center)
+        self._sampler = camera._sampler
+        self._width = camera.image_width
+        self._pixel00 = _point(camera.pixel00_loc)
+        self._delta_u = _point(camera.pixel_delta_u)
+        self._delta_v = _point(camera.pixel_delta_v)
+
+    def rays(self, pixels: "np.ndarray", samples: "np.ndarray") -> \
+            Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        '''
+        The camera rays of the given samples.
+
+        Args:
+            pixels: The ``(n,)`` pixel indices, ``j * image_width + i``.
+            samples: The ``(n,)`` sample indices within the pixels.
+
+        Returns:
+            np.ndarray: The ``(n, 3)`` ray directions. All rays start from
+                :attr:`center`.
+            np.ndarray: The ``(n,)`` ray times.
+            np.ndarray: The ``(n,)`` :class:`Sampler` stream keys of the
+                samples. The first :data:`CAMERA_COUNTERS` numbers of each
+                stream may be taken already.
+
+        '''
+        pixels = np.asarray(pixels, dtype=np.int64)
+        samples = np.asarray(samples, dtype=np.int64)
+        keys = self._sampler.keys(pixels, samples)
+        offset_x, offset_y, times = self.samples(pixels, samples, keys)
+        # pixel00_loc is the center of the first pixel.
+        i = pixels % self._width + (offset_x - 0.5)
+        j = pixels // self._width + (offset_y - 0.5)
+        directions = self._pixel00 - self.center + \
+            i[:, None] * self._delta_u + j[:, None] * self._delta_v
+        return directions, times, keys
+
+    def samples(self, pixels: "np.ndarray", samples: "np.ndarray",
+                keys: "np.ndarray") -> \
+            Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        '''
+        The offsets from the pixel corner, in pixels, and the times of the
+        given samples, whose stream keys are :arg:`keys`.
+
+        '''
+        if self.pattern == 'random':
+            return tuple(Sampler.uniform(keys, counter)
+                         for counter in range(1, 4))
+        pixel_keys = self._sampler.pixel_keys(pixels)
+        if self.pattern == 'stratified':
+            n = self.samples_per_pixel
+            return tuple(
+                (_permute(samples, n, _bits(pixel_keys, counter)) +
+                 Sampler.uniform(keys, counter)) / n
+                for counter in range(1, 4))
+        if self.pattern == 'halton':
+            return tuple(
+                (_radical_inverse(samples, base) +
+                 Sampler.uniform(pixel_keys, counter)) % 1.0
+                for counter, base in zip(range(1, 4), (2, 3, 5)))
+        return tuple(
+            (_sobol(samples, directions) ^ _bits(pixel_keys, counter)) *
+            _SCALE32
+            for counter, directions in zip(range(1, 4), _SOBOL_DIRECTIONS))
+
+
+def _bits(keys: "np.ndarray", counter: int) -> "np.ndarray":
+    '''32 random bits of the :arg:`counter`-th number of the streams.'''
+    return (Sampler.uniform(keys, counter) * 2.0 ** 32).astype(np.uint32)
+
+
+def _permute(i: "np.ndarray", n: int, seed: "np.ndarray") -> "np.ndarray":
+    '''
+    Map every index of :arg:`i`, below :arg:`n`, through the permutation of
+    ``range(n)`` chosen by its :arg:`seed`. This is the hashed permutation of
+    Kensler's "Correlated Multi-Jittered Sampling", which walks the cycles of
+    a permutation of the next power of two until it lands below :arg:`n`.
+
+    '''
+    i = np.asarray(i).astype(np.uint32)
+    p = np.broadcast_to(seed, i.shape).astype(np.uint32)
+    w = n - 1
+    for shift in (1, 2, 4, 8, 16):
+        w |= w >> shift
+    w = np.uint32(w)
+    result = np.empty_like(i)
+    todo = np.arange(len(i))
+    while len(todo):
+        x, q = i[todo], p[todo]
+        x ^= q
+        x *= np.uint32(0xe170893d)
+        x ^= q >> np.uint32(16)
+        x ^= (x & w) >> np.uint32(4)
+        x ^= q >> np.uint32(8)
+        x *= np.uint32(0x0929eb3f)
+        x ^= q >> np.uint32(23)
+        x ^= (x & w) >> np.uint32(1)
+        x *= np.uint32(1) | q >> np.uint32(27)
+        x *= np.uint32(0x6935fa69)
+        x ^= (x & w) >> np.uint32(11)
+        x *= np.uint32(0x74dcb303)
+        x ^= (x & w) >> np.uint32(2)
+        x *= np.uint32(0x9e501cc3)
+        x ^= (x & w) >> np.uint32(2)
+        x *= np.uint32(0xc860a3df)
+        x &= w
+        x ^= x >> np.uint32(5)
+        i[todo] = x
+        done = x < n
+        result[todo[done]] = (x[done] + q[done] % n) % np.uint32(n)
+        todo = todo[~done]
+    return result
+
+
+def _radical_inverse(i: "np.ndarray", base: int) -> "np.ndarray":
+    '''Mirror the digits of :arg:`i` in :arg:`base` about the point.'''
+    i = np.asarray(i, dtype=np.int64).copy()
+    result = np.zeros(len(i))
+    scale = 1.0 / base
+    while i.any():
+        result += (i % base) * scale
+        i //= base
+        scale /= base
+    return result
+
+
+def _sobol(i: "np.ndarray", directions: "np.ndarray") -> "np.ndarray":
+    '''The 32 bit Sobol points of the indices :arg:`i` in one dimension.'''
+    i = np.asarray(i, dtype=np.int64)
+    result = np.zeros(len(i), dtype=np.uint32)
+    bit = 0
+    while (i >> bit).any():
+        result ^= np.where((i >> bit) & 1 == 1, directions[bit],
+                           np.uint32(0))
+        bit += 1
+    return result
+
+
+def _sobol_directions(degree: int, a: int, m: Tuple[int, ...]) -> \
+        "np.ndarray":
+    '''
+    The direction numbers of a Sobol dimension from its primitive polynomial
+    of :arg:`degree` with the inner coefficients :arg:`a`, and the initial
+    numbers :arg:`m`, as tabulated by Joe and Kuo.
+
+    '''
+    v = [m[k] << (31 - k) for k in range(degree)]
+    for k in range(degree, 32):
+        x = v[k - degree] ^ (v[k - degree] >> degree)
+        for b in range(1, degree):
+            if (a >> (degree - 1 - b)) & 1:
+                x ^= v[k - b]
+        v.append(x)
+    return np.array(v, dtype=np.uint32)
+
+
+_SOBOL_DIRECTIONS = (
+    np.array([1 << (31 - k) for k in range(32)], dtype=np.uint32),
+    _sobol_directions(1, 0, (1,)),
+    _sobol_directions(2, 1, (1, 3)),
+)
+
+
+def _point(p: Any) -> "np.ndarray":
+    return np.array([p.x, p.y, p.z], dtype=float)
@@ -0,0 +1,126 @@
+import random as _random
+from typing import Optional
+import numpy as np
+
+
+__all__ = ['Sampler', 'Stream', 'set_stream', 'current_stream', 'random']
+
+
+_MASK = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_SCALE = 2.0 ** -53
+
+
+class Sampler:
+    '''
+    A counter-based random number generator.
+    Every ``(pixel, sample)`` pair owns an independent :class:`Stream` whose
+    n-th number is a hash of the seed, the pair and ``n``. No state is shared
+    between the streams, so any pixel can be rendered again, in any process
+    and in any order, and get the same numbers.
+
+    Attributes:
+        seed: The seed of all the streams.
+
+    '''
+
+    def __init__(self, seed: int) -> None:
+        self.seed = seed & _MASK
+        self._seed_key = _mix(self.seed)
+
+    def key(self, pixel: int, sample: int) -> int:
+        '''The key of the stream of the ``(pixel, sample)`` pair.'''
+        return _mix((_mix((self._seed_key + pixel) & _MASK) + sample) &
+                    _MASK)
+
+    def stream(self, pixel: int, sample: int) -> "Stream":
+        '''The :class:`Stream` of the ``(pixel, sample)`` pair.'''
+        return Stream(self.key(pixel, sample))
+
+    def keys(self, pixels: "np.ndarray", samples: "np.ndarray") -> \
+            "np.ndarray":
+        '''Compute :meth:`key` for arrays of pixels and samples.'''
+        samples = np.asarray(samples).astype(np.uint64)
+        return _mix_array(self.pixel_keys(pixels) + samples)
+
+    def pixel_keys(self, pixels: "np.ndarray") -> "np.ndarray":
+        '''
+        The keys of streams shared by all the samples of each pixel, which
+        decorrelate the sample patterns of neighbouring pixels.
+
+        '''
+        pixels = np.asarray(pixels).astype(np.uint64)
+        return _mix_array(np.uint64(self._seed_key) + pixels)
+
+    @staticmethod
+    def uniform(keys: "np.ndarray", counter: int) -> "np.ndarray":
+        '''
+        The :arg:`counter`-th number of the streams with the given keys, the
+        same as the :arg:`counter`-th call of :meth:`Stream.random`.
+
+        '''
+        keys = np.asarray(keys, dtype=np.uint64)
+        z = _mix_array(keys + np.uint64((counter * _GOLDEN) & _MASK))
+        return (z >> np.uint64(11)).astype(float) * _SCALE
+
+
+class Stream:
+    '''
+    One stream of uniform numbers of a :class:`Sampler`.
+
+    Attributes:
+        key: The key of the stream.
+        counter: The number of values drawn so far.
+
+    '''
+
+    __slots__ = ('key', 'counter')
+
+    def __init__(self, key: int, counter: int = 0) -> None:
+        self.key = key
+        self.counter = counter
+
+    def random(self) -> float:
+        '''Return the next float in ``[0, 1)``.'''
+        self.counter += 1
+        return (_mix((self.key + self.counter * _GOLDEN) & _MASK) >> 11) * \
+            _SCALE
+
+
+_current: Optional["Stream"] = None
+
+
+def set_stream(stream: Optional["Stream"]) -> None:
+    '''
+    Make :arg:`stream` the source of :func:`random`, and so of
+    :func:`utils.random_float`. ``None`` falls back to the :mod:`random`
+    module.
+
+    '''
+    global _current
+    _current = stream
+
+
+def current_stream() -> Optional["Stream"]:
+    return _current
+
+
+def random() -> float:
+    '''Return the next float in ``[0, 1)`` of the current stream.'''
+    if _current is None:
+        return _random.random()
+    return _current.random()
+
+
+def _mix(z: int) -> int:
+    z = ((z ^ (z >> 30)) * _MIX1) & _MASK
+    z = ((z ^ (z >> 27)) * _MIX2) & _MASK
+    return z ^ (z >> 31)
+
+
+def _mix_array(z: "np.ndarray") -> "np.ndarray":
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(_MIX1)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(_MIX2)
+    return z ^ (z >> np.uint64(31))
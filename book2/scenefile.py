@@ -0,0 +1,286 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional, Tuple, Union
+from bvh import BVHNode, FlatBVH, MotionBVH
+from camera import Camera
+from hittable import Hittable
+from material import Dielectric, DiffuseLight, Lambertian, Material, Metal
+from mesh import load_obj
+from quad import Quad, box
+from sphere import Sphere
+from tex import CheckerTexture, ImageTexture, NoiseTexture, SolidColor, \
+    Texture
+from transform import Instance, Transform
+from vec import Color, Point3, Vector3
+from world import World
+
+
+__all__ = ['load_scene', 'build_scene', 'build_camera']
+
+
+# Bump this whenever the pickled classes change, so old caches are ignored.
+CACHE_VERSION = 2
+
+_CAMERA_VECTORS = {'look_from': Point3, 'look_at': Point3, 'vup': Vector3,
+                   'background': Color}
+
+
+def load_scene(path: str, cache_dir: Optional[str] = None) -> \
+        Tuple["Hittable", "Camera"]:
+    '''
+    Load a scene from a JSON scene file.
+
+    The file holds one object with these keys, all optional except
+    ``objects``:
+
+    * ``camera``: the arguments of :class:`Camera`, with the points and
+      colors as ``[x, y, z]`` lists.
+    * ``textures``: named textures, each ``{"type": ...}`` with the type
+      ``solid`` (``color``), ``checker`` (``scale``, ``even``, ``odd``),
+      ``noise`` (``scale``, ``seed``) or ``image`` (``file``).
+    * ``materials``: named materials of the type ``lambertian`` (``albedo``
+      or ``texture``), ``metal`` (``albedo``, ``fuzz``), ``dielectric``
+      (``refraction_index``) or ``light`` (``emit`` or ``texture``).
+    * ``objects``: a list of ``sphere`` (``center``, ``radius``, ``center2``
+      for a moving sphere), ``quad`` (``q``, ``u``, ``v``), ``box`` (``a``,
+      ``b``), ``mesh`` (``file`` of a ``.obj`` and any :class:`TriangleMesh`
+      option) and ``instance`` (``object``, ``transform``) objects, each with
+      a ``material``. A transform is a list of ``{"translate": [x, y, z]}``,
+      ``{"scale": s}`` or ``{"rotate": [x, y, z], "degrees": d}`` steps,
+      applied in order.
+    * ``accelerator``: how the objects are held, ``{"type": "bvh"}`` for a
+      :class:`BVHNode`, ``"flat"`` for a :class:`FlatBVH`, ``"motion"`` for a
+      :class:`MotionBVH` or ``"list"`` for a plain :class:`World`, with the
+      build options of the class. The default is a :class:`BVHNode` split by
+      the SAH.
+
+    A texture or material can be given inline or by name, and a color can
+    stand for a solid texture. Relative file names are relative to the scene
+    file.
+
+    With a :arg:`cache_dir` the built objects, acceleration structure
+    included, are pickled under a hash of everything but the camera and of
+    the contents of the files it refers to. Loading the scene again, even
+    with other camera settings, then only unpickles the cache.
+
+    Args:
+        path: The scene file.
+        cache_dir: The directory of the scene cache, or ``None`` to build the
+            scene every time. Image textures keep their pixel cache there as
+            well.
+
+    Returns:
+        Hittable: The scene, ready to render.
+        Camera: The camera of the scene.
+
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    try:
+        description = json.loads(data)
+    except ValueError as e:
+        raise RuntimeError(f"{path} is not a scene file: {e}")
+    base_dir = os.path.dirname(os.path.abspath(path))
+    camera = build_camera(description.get('camera', dict()))
+    if cache_dir is None:
+        return build_scene(description, base_dir), camera
+
+    cache = os.path.join(cache_dir,
+                         f"{_scene_digest(description, base_dir)}.scene")
+    if os.path.exists(cache):
+        with open(cache, 'rb') as f:
+            return pickle.load(f), camera
+    world = build_scene(description, base_dir, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write to a private name first so that a concurrent reader never loads
+    # a half-written file.
+    tmp = f"{cache}.{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        pickle.dump(world, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, cache)
+    return world, camera
+
+
+def build_camera(settings: Dict[str, Any]) -> "Camera":
+    '''Build the :class:`Camera` of the ``camera`` part of a scene.'''
+    known = inspect.signature(Camera).parameters
+    arguments = dict()
+    for name, value in settings.items():
+        if name not in known:
+            raise RuntimeError(f"Unknown camera setting {name}")
+        if name in _CAMERA_VECTORS:
+            value = _CAMERA_VECTORS[name](*value)
+        arguments[name] = value
+    return Camera(**arguments)
+
+
+def build_scene(description: Dict[str, Any], base_dir: str = '.',
+                cache_dir: Optional[str] = None) -> "Hittable":
+    '''
+    Build the objects of a scene description, see :func:`load_scene`, and
+    wrap them in its accelerator.
+
+    '''
+    return _SceneBuilder(description, base_dir, cache_dir).build()
+
+
+class _SceneBuilder:
+    '''
+    Build one scene description. Named textures and materials are built once
+    and shared by everything which refers to them.
+
+    '''
+
+    def __init__(self, description: Dict[str, Any], base_dir: str,
+                 cache_dir: Optional[str]) -> None:
+        self.description = description
+        self.base_dir = base_dir
+        self.cache_dir = cache_dir
+        self._textures: Dict[str, "Texture"] = dict()
+        self._materials: Dict[str, "Material"] = dict()
+
+    def build(self) -> "Hittable":
+        world = World()
+        for spec in self.description.get('objects', list()):
+            world.add(self.object(spec))
+        options = dict(self.description.get('accelerator', dict(type='bvh')))
+        kind = options.pop('type', 'bvh')
+        if kind == 'bvh':
+            options.setdefault('strategy', 'sah')
+            return World(BVHNode(world=world, **options))
+        if kind == 'flat':
+            options.setdefault('strategy', 'sah')
+            return FlatBVH(world=world, **options)
+        if kind == 'motion':
+            return MotionBVH(world=world, **options)
+        if kind == 'list':
+            return world
+        raise RuntimeError(f"Unknown accelerator {kind}")
+
+    def object(self, spec: Dict[str, Any]) -> "Hittable":
+        kind = spec.get('type')
+        if kind == 'instance':
+            return Instance(self.object(spec['object']),
+                            _transform(spec.get('transform', list())))
+        mat = self.material(spec.get('material', dict(type='none')))
+        if kind == 'sphere':
+            center2 = spec.get('center2')
+            return Sphere(Point3(*spec['center']), spec['radius'], mat,
+                          Point3(*center2) if center2 is not None else None)
+        if kind == 'quad':
+            return Quad(Point3(*spec['q']), Vector3(*spec['u']),
+                        Vector3(*spec['v']), mat)
+        if kind == 'box':
+            return box(Point3(*spec['a']), Point3(*spec['b']), mat)
+        if kind == 'mesh':
+            options = {name: value for name, value in spec.items()
+                       if name not in ('type', 'file', 'material')}
+            return load_obj(self.path(spec['file']), mat, **options)
+        raise RuntimeError(f"Unknown object type {kind}")
+
+    def material(self, spec: Union[str, Dict[str, Any]]) -> "Material":
+        if isinstance(spec, str):
+            if spec not in self._materials:
+                self._materials[spec] = self.material(
+                    self._named('materials', spec))
+            return self._materials[spec]
+        kind = spec.get('type')
+        if kind == 'lambertian':
+            if 'albedo' in spec:
+                return Lambertian(Color(*spec['albedo']))
+            return Lambertian(texture=self.texture(spec['texture']))
+        if kind == 'metal':
+            return Metal(Color(*spec['albedo']), spec.get('fuzz', 0))
+        if kind == 'dielectric':
+            return Dielectric(spec['refraction_index'])
+        if kind == 'light':
+            if 'emit' in spec:
+                return DiffuseLight(emit=Color(*spec['emit']))
+            return DiffuseLight(tex=self.texture(spec['texture']))
+        if kind == 'none':
+            return Material()
+        raise RuntimeError(f"Unknown material type {kind}")
+
+    def texture(self, spec: Union[str, List[float], Dict[str, Any]]) -> \
+            "Texture":
+        if isinstance(spec, str):
+            if spec not in self._textures:
+                self._textures[spec] = self.texture(
+                    self._named('textures', spec))
+            return self._textures[spec]
+        if isinstance(spec, list):
+            return SolidColor(albedo=Color(*spec))
+        kind = spec.get('type')
+        if kind == 'solid':
+            return SolidColor(albedo=Color(*spec['color']))
+        if kind == 'checker':
+            return CheckerTexture(spec['scale'],
+                                  even=self.texture(spec['even']),
+                                  odd=self.texture(spec['odd']))
+        if kind == 'noise':
+            return NoiseTexture(spec.get('scale', 1), seed=spec.get('seed'))
+        if kind == 'image':
+            return ImageTexture(self.path(spec['file']),
+                                cache_dir=self.cache_dir)
+        raise RuntimeError(f"Unknown texture type {kind}")
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.base_dir, filename)
+
+    def _named(self, kind: str, name: str) -> Dict[str, Any]:
+        try:
+            return self.description[kind][name]
+        except KeyError:
+            raise RuntimeError(f"Unknown {kind[:-1]} {name}")
+
+
+def _transform(steps: List[Dict[str, Any]]) -> "Transform":
+    transform = Transform()
+    for step in steps:
+        if 'translate' in step:
+            t = Transform.translate(Vector3(*step['translate']))
+        elif 'scale' in step:
+            scale = step['scale']
+            t = Transform.scale(*scale) if isinstance(scale, list) else \
+                Transform.scale(scale)
+        elif 'rotate' in step:
+            t = Transform.rotate(Vector3(*step['rotate']), step['degrees'])
+        else:
+            raise RuntimeError(f"Unknown transform {step}")
+        # Every step applies after the ones before it.
+        transform = t @ transform
+    return transform
+
+
+def _scene_digest(description: Dict[str, Any], base_dir: str) -> str:
+    '''
+    Hash what the built scene depends on: the description without its
+    camera, and the contents of the texture and mesh files it names.
+
+    '''
+    digest = hashlib.sha256(f"scene:{CACHE_VERSION}:".encode())
+    geometry = {key: value for key, value in description.items()
+                if key != 'camera'}
+    digest.update(json.dumps(geometry, sort_keys=True).encode())
+    for filename in sorted(set(_files(geometry))):
+        digest.update(filename.encode())
+        with open(os.path.join(base_dir, filename), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _files(spec: Any) -> List[str]:
+    '''List the files named by the textures and meshes of :arg:`spec`.'''
+    if isinstance(spec, list):
+        return [name for item in spec for name in _files(item)]
+    if not isinstance(spec, dict):
+        return list()
+    files = [spec['file']] if spec.get('type') in ('image', 'mesh') else \
+        list()
+    for value in spec.values():
+        files.extend(_files(value))
+    return files
@@ -0,0 +1,167 @@
+import random
+from typing import Callable, Dict, Tuple
+from camera import Camera
+from material import Dielectric, DiffuseLight, Lambertian, Metal
+from quad import Quad, box
+from sphere import Sphere
+from tex import CheckerTexture, NoiseTexture
+from vec import Color, Point3, Vector3
+from world import World
+
+
+__all__ = ['SCENES', 'materials', 'checker_light', 'many_spheres',
+           'bouncing_spheres', 'cornell_box', 'noise']
+
+
+def materials() -> Tuple["World", "Camera"]:
+    '''The three materials scene of the first book.'''
+    world = World()
+    world.add(Sphere(Point3(0.0, -100.5, -1.0), 100.0,
+                     Lambertian(Color(0.8, 0.8, 0.0))))
+    world.add(Sphere(Point3(0.0, 0.0, -1.2), 0.5,
+                     Lambertian(Color(0.1, 0.2, 0.5))))
+    world.add(Sphere(Point3(-1.0, 0.0, -1.2), 0.5, Dielectric(1.5)))
+    world.add(Sphere(Point3(1.0, 0.0, -1.2), 0.5,
+                     Metal(Color(0.8, 0.6, 0.2))))
+    cam = Camera(16.0 / 9.0, 400, 100, 50, 20, Point3(-2, 2, 1),
+                 Point3(0, 0, -1), Vector3(0, 1, 0), Color(0.7, 0.8, 1.0))
+    return world, cam
+
+
+def checker_light() -> Tuple["World", "Camera"]:
+    '''The checkered sphere lit by a quad light of ``main.py``.'''
+    checker = CheckerTexture(0.32, c1=Color(0.2, 0.3, 0.1),
+                             c2=Color(0.9, 0.9, 0.9))
+    world = World()
+    world.add(Sphere(Point3(0.0, 2, -1.2), 2, Lambertian(texture=checker)))
+    world.add(Quad(q=Point3(-2, 0, 5), u=Vector3(4, 0, 0),
+                   v=Vector3(0, 4, 0), mat=DiffuseLight(emit=Color(4, 4, 4))))
+    cam = Camera(16.0 / 9.0, 400, 100, 50, 20, Point3(26, 3, 6),
+                 Point3(0, 2, 0), Vector3(0, 1, 0), Color(0, 0, 0))
+    return world, cam
+
+
+def many_spheres(seed: int = 7) -> Tuple["World", "Camera"]:
+    '''The random sphere field on the cover of the first book.'''
+    rng = random.Random(seed)
+    world = World()
+    world.add(Sphere(Point3(0, -1000, 0), 1000,
+                     Lambertian(Color(0.5, 0.5, 0.5))))
+    for a in range(-11, 11):
+        for b in range(-11, 11):
+            choose_mat = rng.random()
+            center = Point3(a + 0.9 * rng.random(), 0.2,
+                            b + 0.9 * rng.random())
+            if (center - Point3(4, 0.2, 0)).length() <= 0.9:
+                continue
+            if choose_mat < 0.8:
+                albedo = Color(rng.random() * rng.random(),
+                               rng.random() * rng.random(),
+                               rng.random() * rng.random())
+                mat = Lambertian(albedo)
+            elif choose_mat < 0.95:
+                albedo = Color(rng.uniform(0.5, 1), rng.uniform(0.5, 1),
+                               rng.uniform(0.5, 1))
+                mat = Metal(albedo, rng.uniform(0, 0.5))
+            else:
+                mat = Dielectric(1.5)
+            world.add(Sphere(center, 0.2, mat))
+    world.add(Sphere(Point3(0, 1, 0), 1.0, Dielectric(1.5)))
+    world.add(Sphere(Point3(-4, 1, 0), 1.0,
+                     Lambertian(Color(0.4, 0.2, 0.1))))
+    world.add(Sphere(Point3(4, 1, 0), 1.0, Metal(Color(0.7, 0.6, 0.5))))
+    cam = Camera(16.0 / 9.0, 400, 100, 50, 20, Point3(13, 2, 3),
+                 Point3(0, 0, 0), Vector3(0, 1, 0), Color(0.7, 0.8, 1.0))
+    return world, cam
+
+
+def bouncing_spheres(seed: int = 7, bounce: float = 0.5) -> \
+        Tuple["World", "Camera"]:
+    '''
+    The sphere field of the second book, whose diffuse spheres bounce up by
+    up to :arg:`bounce` during the shutter.
+
+    '''
+    rng = random.Random(seed)
+    checker = CheckerTexture(0.32, c1=Color(0.2, 0.3, 0.1),
+                             c2=Color(0.9, 0.9, 0.9))
+    world = World()
+    world.add(Sphere(Point3(0, -1000, 0), 1000, Lambertian(texture=checker)))
+    for a in range(-11, 11):
+        for b in range(-11, 11):
+            choose_mat = rng.random()
+            center = Point3(a + 0.9 * rng.random(), 0.2,
+                            b + 0.9 * rng.random())
+            if (center - Point3(4, 0.2, 0)).length() <= 0.9:
+                continue
+            if choose_mat < 0.8:
+                albedo = Color(rng.random() * rng.random(),
+                               rng.random() * rng.random(),
+                               rng.random() * rng.random())
+                center2 = center + Vector3(0, rng.uniform(0, bounce), 0)
+                world.add(Sphere(center, 0.2, Lambertian(albedo), center2))
+            elif choose_mat < 0.95:
+                albedo = Color(rng.uniform(0.5, 1), rng.uniform(0.5, 1),
+                               rng.uniform(0.5, 1))
+                world.add(Sphere(center, 0.2,
+                                 Metal(albedo, rng.uniform(0, 0.5))))
+            else:
+                world.add(Sphere(center, 0.2, Dielectric(1.5)))
+    world.add(Sphere(Point3(0, 1, 0), 1.0, Dielectric(1.5)))
+    world.add(Sphere(Point3(-4, 1, 0), 1.0,
+                     Lambertian(Color(0.4, 0.2, 0.1))))
+    world.add(Sphere(Point3(4, 1, 0), 1.0, Metal(Color(0.7, 0.6, 0.5))))
+    cam = Camera(16.0 / 9.0, 400, 100, 50, 20, Point3(13, 2, 3),
+                 Point3(0, 0, 0), Vector3(0, 1, 0), Color(0.7, 0.8, 1.0))
+    return world, cam
+
+
+def cornell_box() -> Tuple["World", "Camera"]:
+    '''The Cornell box of the second book, built only from quads.'''
+    red = Lambertian(Color(0.65, 0.05, 0.05))
+    white = Lambertian(Color(0.73, 0.73, 0.73))
+    green = Lambertian(Color(0.12, 0.45, 0.15))
+    light = DiffuseLight(emit=Color(15, 15, 15))
+
+    world = World()
+    world.add(Quad(Point3(555, 0, 0), Vector3(0, 555, 0),
+                   Vector3(0, 0, 555), green))
+    world.add(Quad(Point3(0, 0, 0), Vector3(0, 555, 0),
+                   Vector3(0, 0, 555), red))
+    world.add(Quad(Point3(343, 554, 332), Vector3(-130, 0, 0),
+                   Vector3(0, 0, -105), light))
+    world.add(Quad(Point3(0, 0, 0), Vector3(555, 0, 0),
+                   Vector3(0, 0, 555), white))
+    world.add(Quad(Point3(555, 555, 555), Vector3(-555, 0, 0),
+                   Vector3(0, 0, -555), white))
+    world.add(Quad(Point3(0, 0, 555), Vector3(555, 0, 0),
+                   Vector3(0, 555, 0), white))
+    for side in box(Point3(130, 0, 65), Point3(295, 165, 230), white).objects:
+        world.add(side)
+    for side in box(Point3(265, 0, 295), Point3(430, 330, 460),
+                    white).objects:
+        world.add(side)
+    cam = Camera(1.0, 400, 100, 50, 40, Point3(278, 278, -800),
+                 Point3(278, 278, 0), Vector3(0, 1, 0), Color(0, 0, 0))
+    return world, cam
+
+
+def noise(seed: int = 7) -> Tuple["World", "Camera"]:
+    '''The two Perlin noise spheres of the second book.'''
+    pertext = NoiseTexture(4, seed=seed)
+    world = World()
+    world.add(Sphere(Point3(0, -1000, 0), 1000, Lambertian(texture=pertext)))
+    world.add(Sphere(Point3(0, 2, 0), 2, Lambertian(texture=pertext)))
+    cam = Camera(16.0 / 9.0, 400, 100, 50, 20, Point3(13, 2, 3),
+                 Point3(0, 0, 0), Vector3(0, 1, 0), Color(0.7, 0.8, 1.0))
+    return world, cam
+
+
+SCENES: Dict[str, Callable[[], Tuple["World", "Camera"]]] = {
+    'materials': materials,
+    'checker_light': checker_light,
+    'many_spheres': many_spheres,
+    'bouncing_spheres': bouncing_spheres,
+    'cornell_box': cornell_box,
+    'noise': noise,
+}
@@ -1,11 +1,12 @@
-from math import acos, atan2, sqrt
+from math import acos, atan2, cos, sin, sqrt
 from typing import Optional, Tuple
 from aabb import AABB
-from constants import PI
+from constants import INFINITY, PI
 from hittable import HitRecord, Hittable
 from interval import Interval
 from material import Material
 from ray import Ray
+from utils import random_float
 from vec import Point3, Vector3
 
 
@@ -46,9 +47,11 @@ class Sphere(Hittable):
             aabb1 = AABB(a=center1 - rvec, b=center1 + rvec)
             aabb2 = AABB(a=center2 - rvec, b=center2 + rvec)
             self.bbox = AABB(box0=aabb1, box1=aabb2)
+            self._motion_boxes = (aabb1, aabb2)
         else:
             self.is_moving = False
             self.bbox = AABB(a=center1 - rvec, b=center1 + rvec)
+            self._motion_boxes = (self.bbox, self.bbox)
 
     def sphere_center(self, time: float) -> "Point3":
         '''
@@ -69,8 +72,8 @@ class Sphere(Hittable):
         rec.u = phi / (2 * PI)
         rec.v = theta / PI
 
-    def hit(self, ray: Ray, interval: "Interval") -> \
-            Tuple[bool, Optional[HitRecord]]:
+    def intersect(self, ray: Ray, interval: "Interval") -> \
+            Tuple[float, Optional["Hittable"]]:
         '''
         Detect if the ray can hit the sphere within the given
         :class:`Interval`.
@@ -80,39 +83,98 @@ class Sphere(Hittable):
             interval: The detect region of the ray.
 
         Returns:
-            :type:`bool`: If the ray can hit the sphere.
-            :class:`HitRecord`: The :class:`HitRecord` of the hit detection if
-                the ray can hit the sphere.
+            float: The ``t`` of the hit.
+            :class:`Sphere`: The sphere itself if the ray can hit it,
+                otherwise ``None``.
 
         '''
-        self.center = self.sphere_center(ray.time()) \
+        center = self.sphere_center(ray.time()) \
             if self.is_moving else self.center1
 
-        oc = ray.origin() - self.center
+        oc = ray.origin() - center
         a = ray.direction().length_squared()
         half_b = oc.dot(ray.direction())
         c = oc.length_squared() - self.radius * self.radius
         discriminant = half_b * half_b - a * c
 
         if discriminant < 0:
-            return (False, None)
+            return INFINITY, None
 
         sqrtd = sqrt(discriminant)
         root = (-half_b - sqrtd) / a
         if not interval.surrounds(root):
             root = (-half_b + sqrtd) / a
             if not interval.surrounds(root):
-                return (False, None)
+                return INFINITY, None
+        return root, self
 
+    def shade(self, ray: Ray, t: float) -> HitRecord:
+        '''Fill in the :class:`HitRecord` of the hit at :arg:`t`.'''
+        center = self.sphere_center(ray.time()) \
+            if self.is_moving else self.center1
         rec = HitRecord()
-        rec.t = root
-        rec.p = ray.at(rec.t)
-        outward_normal = (rec.p - self.center) / self.radius
+        rec.t = t
+        rec.p = ray.at(t)
+        outward_normal = (rec.p - center) / self.radius
         rec.set_face_normal(ray=ray, outward_normal=outward_normal)
         self.get_sphere_uv(outward_normal, rec)
         rec.mat = self.mat
+        return rec
 
-        return (True, rec)
+    def occluded(self, ray: Ray, interval: "Interval") -> bool:
+        center = self.sphere_center(ray.time()) \
+            if self.is_moving else self.center1
+        direction = ray.direction()
+        oc = ray.origin() - center
+        a = direction.length_squared()
+        half_b = oc.dot(direction)
+        c = oc.length_squared() - self.radius * self.radius
+        discriminant = half_b * half_b - a * c
+        if discriminant < 0:
+            return False
+        sqrtd = sqrt(discriminant)
+        return interval.surrounds((-half_b - sqrtd) / a) or \
+            interval.surrounds((-half_b + sqrtd) / a)
 
     def bounding_box(self) -> AABB:
         return self.bbox
+
+    def motion_boxes(self) -> Tuple[AABB, AABB]:
+        return self._motion_boxes
+
+    def pdf_value(self, origin: "Point3", direction: "Vector3",
+                  time: float = 0.0) -> float:
+        '''
+        The :meth:`Hittable.pdf_value` of a direction chosen uniformly within
+        the cone the sphere covers as seen from :arg:`origin`.
+
+        '''
+        if not self.occluded(Ray(origin, direction, time),
+                             Interval(0.001, INFINITY)):
+            return 0.0
+        cos_theta_max = self._cos_theta_max(origin, time)
+        return 1 / (2 * PI * (1 - cos_theta_max))
+
+    def random(self, origin: "Point3", time: float = 0.0) -> "Vector3":
+        '''Aim uniformly within the cone the sphere covers.'''
+        center = self.sphere_center(time) if self.is_moving else self.center1
+        cos_theta_max = self._cos_theta_max(origin, time)
+        z = 1 + random_float() * (cos_theta_max - 1)
+        phi = 2 * PI * random_float()
+        r = sqrt(max(0.0, 1 - z * z))
+
+        # An orthonormal basis around the direction to the center.
+        w = (center - origin).unit_vector()
+        a = Vector3(0, 1, 0) if abs(w.x) > 0.9 else Vector3(1, 0, 0)
+        v = w.cross(a).unit_vector()
+        u = w.cross(v)
+        return (r * cos(phi) * u).iadd_scaled(v, r * sin(phi)) \
+            .iadd_scaled(w, z)
+
+    def _cos_theta_max(self, origin: "Point3", time: float) -> float:
+        center = self.sphere_center(time) if self.is_moving else self.center1
+        distance_squared = (center - origin).length_squared()
+        if distance_squared <= self.radius * self.radius:
+            # Seen from inside, the sphere covers every direction.
+            return -1.0
+        return sqrt(1 - self.radius * self.radius / distance_squared)
@@ -1,4 +1,6 @@
 from math import floor
+from typing import Optional
+import numpy as np
 from perlin import Perlin
 from interval import Interval
 from image import TextureImage
@@ -96,11 +98,14 @@ class ImageTexture(Texture):
 
     Attributes:
         filename: The location of rendered texture image.
+        cache_dir: The directory of the memory-mapped pixel cache, see
+            :class:`TextureImage`.
 
     '''
 
-    def __init__(self, filename: str) -> None:
-        self.image = TextureImage(filename=filename)
+    def __init__(self, filename: str, cache_dir: Optional[str] = None) -> \
+            None:
+        self.image = TextureImage(filename=filename, cache_dir=cache_dir)
 
     def value(self, u: float, v: float, p: "Point3") -> "Color":
         if self.image.image_height < 0:
@@ -115,19 +120,47 @@ class ImageTexture(Texture):
                      color_scale * pixel[1],
                      color_scale * pixel[2])
 
+    def values(self, u: "np.ndarray", v: "np.ndarray") -> "np.ndarray":
+        '''
+        Evaluate :meth:`value` for arrays of uv pairs.
+
+        Returns:
+            np.ndarray: The ``(n, 3)`` colors.
+
+        '''
+        u = np.clip(u, 0, 1)
+        v = 1.0 - np.clip(v, 0, 1)
+        i = (u * self.image.image_width).astype(np.int64)
+        j = (v * self.image.image_height).astype(np.int64)
+        return self.image.pixels(i, j) * (1.0 / 255)
+
 
 class NoiseTexture(Texture):
     '''
-    The noise texture (Perlin noise).
+    The noise texture (Perlin noise), gray turbulence.
 
     Attributes:
-        scale: The intensity of the noise.
+        scale: The frequency of the noise, which scales the hit point before
+            the lookup.
+        noise: The :class:`Perlin` generator, built once for the texture.
 
     '''
 
-    def __init__(self, scale: float = 1) -> None:
+    def __init__(self, scale: float = 1, seed: Optional[int] = None) -> None:
         self.scale = scale
+        self.noise = Perlin(seed=seed)
 
     def value(self, u: float, v: float, p: "Point3") -> "Color":
-        noise = Perlin()
-        return Color(1, 1, 1) * noise.turb(p, 7)
+        return Color(1, 1, 1) * self.noise.turb(self.scale * p, 7)
+
+    def values(self, p: "np.ndarray") -> "np.ndarray":
+        '''
+        Evaluate :meth:`value` for an ``(n, 3)`` array of hit points.
+
+        Returns:
+            np.ndarray: The ``(n, 3)`` colors.
+
+        '''
+        p = np.asarray(p, dtype=float)
+        gray = self.noise.turb_batch(self.scale * p, 7)
+        return np.repeat(gray[:, None], 3, axis=1)
@@ -0,0 +1,199 @@
+from itertools import product
+from math import cos, sin
+from typing import Optional, Tuple
+from aabb import AABB
+from constants import INFINITY
+from hittable import HitRecord, Hittable
+from interval import Interval
+from ray import Ray
+from utils import degrees_to_radians
+from vec import Point3, Vector3
+
+
+__all__ = ['Transform', 'Instance']
+
+
+Matrix = Tuple[Tuple[float, float, float], ...]
+
+
+class Transform:
+    '''
+    An affine transform, ``p -> m * p + offset``.
+    The inverse is computed once with the transform, since every ray is
+    mapped through it.
+
+    Transforms compose like matrices: ``a @ b`` applies ``b`` first, so
+    ``Transform.translate(v) @ Transform.rotate(axis, 30)`` turns an object
+    around its own origin before moving it.
+
+    Attributes:
+        m: The rows of the linear part.
+        offset: The translation.
+
+    '''
+
+    def __init__(self, m: Matrix = ((1.0, 0.0, 0.0), (0.0, 1.0, 0.0),
+                                    (0.0, 0.0, 1.0)),
+                 offset: "Vector3" = Vector3(0, 0, 0),
+                 inverse: Optional["Transform"] = None) -> None:
+        self.m = tuple(tuple(float(value) for value in row) for row in m)
+        self.offset = Vector3(offset.x, offset.y, offset.z)
+        if inverse is None:
+            inv_m = _inverse(self.m)
+            inverse = Transform(inv_m, -_apply(inv_m, self.offset), self)
+        self._inverse = inverse
+
+    @staticmethod
+    def translate(offset: "Vector3") -> "Transform":
+        return Transform(offset=offset)
+
+    @staticmethod
+    def scale(x: float, y: Optional[float] = None,
+              z: Optional[float] = None) -> "Transform":
+        '''Scale along the axes, uniformly if only :arg:`x` is given.'''
+        y = x if y is None else y
+        z = x if z is None else z
+        return Transform(((x, 0, 0), (0, y, 0), (0, 0, z)))
+
+    @staticmethod
+    def rotate(axis: "Vector3", degrees: float) -> "Transform":
+        '''Rotate by :arg:`degrees` about :arg:`axis` through the origin.'''
+        x, y, z = axis.unit_vector()
+        theta = degrees_to_radians(degrees)
+        c = cos(theta)
+        s = sin(theta)
+        t = 1 - c
+        return Transform(
+            ((t * x * x + c, t * x * y - s * z, t * x * z + s * y),
+             (t * x * y + s * z, t * y * y + c, t * y * z - s * x),
+             (t * x * z - s * y, t * y * z + s * x, t * z * z + c)))
+
+    def inverse(self) -> "Transform":
+        return self._inverse
+
+    def __matmul__(self, other: "Transform") -> "Transform":
+        m = tuple(tuple(sum(self.m[i][k] * other.m[k][j] for k in range(3))
+                        for j in range(3)) for i in range(3))
+        return Transform(m, self.point(other.offset))
+
+    def point(self, p: "Point3") -> "Point3":
+        return _apply(self.m, p) + self.offset
+
+    def vector(self, v: "Vector3") -> "Vector3":
+        return _apply(self.m, v)
+
+    def normal(self, n: "Vector3") -> "Vector3":
+        '''
+        Map a surface normal, which follows the inverse transpose so that it
+        stays perpendicular to the mapped surface. The result is not
+        normalized.
+
+        '''
+        inv = self._inverse.m
+        return Vector3(inv[0][0] * n.x + inv[1][0] * n.y + inv[2][0] * n.z,
+                       inv[0][1] * n.x + inv[1][1] * n.y + inv[2][1] * n.z,
+                       inv[0][2] * n.x + inv[1][2] * n.y + inv[2][2] * n.z)
+
+    def box(self, box: "AABB") -> "AABB":
+        '''The bounding box of the eight mapped corners of :arg:`box`.'''
+        low = [INFINITY] * 3
+        high = [-INFINITY] * 3
+        for corner in product((box.x.min, box.x.max), (box.y.min, box.y.max),
+                              (box.z.min, box.z.max)):
+            p = self.point(Point3(*corner))
+            for axis, value in enumerate(p):
+                low[axis] = min(low[axis], value)
+                high[axis] = max(high[axis], value)
+        return AABB(a=Point3(*low), b=Point3(*high))
+
+    def __repr__(self) -> str:
+        return f"Transform({self.m!r}, {self.offset!r})"
+
+
+class Instance(Hittable):
+    '''
+    A :class:`Hittable` placed in the world by a :class:`Transform`.
+    Rays are mapped into the space of the object and its hits are mapped
+    back, so any number of instances can share one object, including a whole
+    :class:`BVHNode` or :class:`FlatBVH`, without copying its geometry.
+
+    The direction of a mapped ray is not renormalized, so a hit keeps the same
+    ``t`` in both spaces.
+
+    Attributes:
+        obj: The shared object.
+        transform: The transform from object to world space.
+        bbox: The bounding box in world space.
+
+    '''
+
+    def __init__(self, obj: "Hittable", transform: "Transform") -> None:
+        self.obj = obj
+        self.transform = transform
+        self._to_object = transform.inverse()
+        self.bbox = transform.box(obj.bounding_box())
+
+    def _object_ray(self, ray: "Ray") -> "Ray":
+        to_object = self._to_object
+        return Ray(to_object.point(ray.origin()),
+                   to_object.vector(ray.direction()), ray.time())
+
+    def intersect(self, ray: "Ray", interval: "Interval") -> \
+            Tuple[float, Optional["Hittable"]]:
+        object_ray = self._object_ray(ray)
+        t, prim = self.obj.intersect(object_ray, interval)
+        if prim is None:
+            return INFINITY, None
+        return t, _InstanceHit(self, prim, object_ray)
+
+    def occluded(self, ray: "Ray", interval: "Interval") -> bool:
+        return self.obj.occluded(self._object_ray(ray), interval)
+
+    def bounding_box(self) -> "AABB":
+        return self.bbox
+
+    def motion_boxes(self) -> Tuple["AABB", "AABB"]:
+        # The transform is affine, so it keeps the moving box between the
+        # two mapped ends.
+        box0, box1 = self.obj.motion_boxes()
+        return self.transform.box(box0), self.transform.box(box1)
+
+
+class _InstanceHit(Hittable):
+    '''
+    A hit inside an :class:`Instance`, shaded in object space and mapped
+    back to world space.
+
+    '''
+    def __init__(self, instance: "Instance", prim: "Hittable",
+                 object_ray: "Ray") -> None:
+        self.instance = instance
+        self.prim = prim
+        self.object_ray = object_ray
+
+    def shade(self, ray: "Ray", t: float) -> "HitRecord":
+        rec = self.prim.shade(self.object_ray, t)
+        rec.p = ray.at(t)
+        # The sign of the normal against the ray survives the mapping, so
+        # front_face holds as it is.
+        rec.normal = self.instance.transform.normal(rec.normal).unit_vector()
+        return rec
+
+
+def _apply(m: Matrix, v: "Vector3") -> "Vector3":
+    return Vector3(m[0][0] * v.x + m[0][1] * v.y + m[0][2] * v.z,
+                   m[1][0] * v.x + m[1][1] * v.y + m[1][2] * v.z,
+                   m[2][0] * v.x + m[2][1] * v.y + m[2][2] * v.z)
+
+
+def _inverse(m: Matrix) -> Matrix:
+    (a, b, c), (d, e, f), (g, h, i) = m
+    co_a = e * i - f * h
+    co_b = f * g - d * i
+    co_c = d * h - e * g
+    det = a * co_a + b * co_b + c * co_c
+    if det == 0:
+        raise RuntimeError("The transform is not invertible")
+    return ((co_a / det, (c * h - b * i) / det, (b * f - c * e) / det),
+            (co_b / det, (a * i - c * g) / det, (c * d - a * f) / det),
+            (co_c / det, (b * g - a * h) / det, (a * e - b * d) / det))
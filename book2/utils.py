@@ -1,8 +1,7 @@
 from math import sqrt
-import random
-from typing import TextIO
+from typing import List, Sequence
 from constants import PI
-from interval import Interval
+import sampler
 from vec import Color, Vector3
 
 
@@ -11,8 +10,12 @@ def degrees_to_radians(degrees: float):
 
 
 def random_float(min: float = 0, max: float = 1) -> float:
-    ''' Return a random float. '''
-    return min + random.random() * (max - min)
+    '''
+    Return a random float from the current :class:`sampler.Stream`, see
+    :func:`sampler.set_stream`.
+
+    '''
+    return min + sampler.random() * (max - min)
 
 
 def random_vector(min: float = 0, max: float = 1) -> "Vector3":
@@ -43,12 +46,29 @@ def near_zero(vector: "Vector3") -> bool:
     return abs(vector.x) < s and abs(vector.y) < s and abs(vector.z) < s
 
 
-def write_color(text_io: TextIO, pixel_color: Color) -> None:
-    r = linear_to_gamma(pixel_color.x)
-    g = linear_to_gamma(pixel_color.y)
-    b = linear_to_gamma(pixel_color.z)
-    intensity = Interval(0.000, 0.999)
-    rbyte = int(256 * intensity.clamp(r))
-    gbyte = int(256 * intensity.clamp(g))
-    bbyte = int(256 * intensity.clamp(b))
-    text_io.write(f"{rbyte} {gbyte} {bbyte}\n")
+def luminance(color: Color) -> float:
+    ''' The relative luminance of a linear color. '''
+    return 0.2126 * color.x + 0.7152 * color.y + 0.0722 * color.z
+
+
+def average_row(sums: Sequence[float], counts: Sequence[int]) -> List[float]:
+    '''
+    Divide a row of flat ``r, g, b`` sums by the sample count of every pixel.
+
+    '''
+    row = list()
+    for k, count in enumerate(counts):
+        scale = 1.0 / count if count else 0.0
+        row.append(sums[3 * k] * scale)
+        row.append(sums[3 * k + 1] * scale)
+        row.append(sums[3 * k + 2] * scale)
+    return row
+
+
+def encode_row(row: Sequence[float]) -> bytes:
+    '''
+    Convert a row of flat linear ``r, g, b`` floats to gamma-corrected bytes.
+
+    '''
+    return bytes(int(256 * min(sqrt(c), 0.999)) if c > 0 else 0
+                 for c in row)
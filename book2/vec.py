@@ -1,11 +1,25 @@
 import math
-from typing import Union
+from typing import Iterator, Union
 
 
-__all__ = ['Vector3', 'Point3']
+__all__ = ['Vector3', 'Point3', 'Color']
 
 
 class Vector3:
+    '''
+    A three-component vector.
+    The components live in ``__slots__``, so a vector carries no per-instance
+    ``__dict__``. The augmented operators (``+=``, ``-=``, ``*=``, ``/=``)
+    update the vector in place, while the plain operators return new vectors.
+
+    Attributes:
+        x: The first component.
+        y: The second component.
+        z: The third component.
+
+    '''
+
+    __slots__ = ('x', 'y', 'z')
 
     def __init__(self, x: float = 0, y: float = 0, z: float = 0) -> None:
         self.x = x
@@ -16,14 +30,15 @@ class Vector3:
         return Vector3(-self.x, -self.y, -self.z)
 
     def __getitem__(self, key: int) -> float:
-        if key == 0:
-            return self.x
-        elif key == 1:
-            return self.y
-        elif key == 2:
-            return self.z
-        else:
-            raise IndexError("Index out of bound")
+        return (self.x, self.y, self.z)[key]
+
+    def __iter__(self) -> Iterator[float]:
+        yield self.x
+        yield self.y
+        yield self.z
+
+    def __len__(self) -> int:
+        return 3
 
     def __add__(self, vector3: "Vector3") -> "Vector3":
         return Vector3(
@@ -33,11 +48,10 @@ class Vector3:
         )
 
     def __iadd__(self, vector3: "Vector3") -> "Vector3":
-        return Vector3(
-            self.x + vector3.x,
-            self.y + vector3.y,
-            self.z + vector3.z
-        )
+        self.x += vector3.x
+        self.y += vector3.y
+        self.z += vector3.z
+        return self
 
     def __sub__(self, vector3: "Vector3") -> "Vector3":
         return Vector3(
@@ -46,6 +60,12 @@ class Vector3:
             self.z - vector3.z
         )
 
+    def __isub__(self, vector3: "Vector3") -> "Vector3":
+        self.x -= vector3.x
+        self.y -= vector3.y
+        self.z -= vector3.z
+        return self
+
     def __mul__(self, other: Union["Vector3", float]) -> "Vector3":
         if isinstance(other, Vector3):
             return Vector3(
@@ -67,12 +87,16 @@ class Vector3:
             self.z * other
         )
 
-    def __imul__(self, other: float) -> "Vector3":
-        return Vector3(
-            self.x * other,
-            self.y * other,
-            self.z * other
-        )
+    def __imul__(self, other: Union["Vector3", float]) -> "Vector3":
+        if isinstance(other, Vector3):
+            self.x *= other.x
+            self.y *= other.y
+            self.z *= other.z
+        else:
+            self.x *= other
+            self.y *= other
+            self.z *= other
+        return self
 
     def __truediv__(self, other: float) -> "Vector3":
         return Vector3(
@@ -84,6 +108,30 @@ class Vector3:
     def __itruediv__(self, other: float) -> "Vector3":
         return self.__imul__(1/other)
 
+    def copy(self) -> "Vector3":
+        return Vector3(self.x, self.y, self.z)
+
+    def mul_add(self, vector3: "Vector3", scale: float) -> "Vector3":
+        '''
+        Return ``self + vector3 * scale`` without the temporary vector.
+
+        '''
+        return Vector3(
+            self.x + vector3.x * scale,
+            self.y + vector3.y * scale,
+            self.z + vector3.z * scale
+        )
+
+    def iadd_scaled(self, vector3: "Vector3", scale: float) -> "Vector3":
+        '''
+        Add ``vector3 * scale`` to the vector in place.
+
+        '''
+        self.x += vector3.x * scale
+        self.y += vector3.y * scale
+        self.z += vector3.z * scale
+        return self
+
     def dot(self, vector3: "Vector3") -> float:
         return self.x * vector3.x + self.y * vector3.y + self.z * vector3.z
 
@@ -0,0 +1,796 @@
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from aabb import slab_test
+from bvh import FlatBVH
+from constants import INFINITY, PI
+from hittable import Hittable
+from material import Dielectric, DiffuseLight, Lambertian, Material, Metal
+from quad import Quad
+from sampler import Sampler
+from sphere import Sphere
+from tex import CheckerTexture, ImageTexture, NoiseTexture, SolidColor, \
+    Texture
+from vec import Color
+
+
+__all__ = ['WavefrontIntegrator']
+
+
+MAT_NONE = 0
+MAT_LAMBERTIAN = 1
+MAT_METAL = 2
+MAT_DIELECTRIC = 3
+MAT_LIGHT = 4
+
+# The smallest scene traced through a BVH, see :class:`WavefrontIntegrator`.
+MIN_BVH_SIZE = 32
+
+
+class WavefrontIntegrator:
+    '''
+    An integrator tracing whole batches of rays at once.
+    All active rays of a band are stored as structure-of-arrays buffers. Each
+    bounce intersects the rays in bulk, scatters the hits material by
+    material and drops the terminated paths.
+
+    A scene of at least :arg:`min_bvh_size` primitives is arranged in a
+    :class:`FlatBVH`, which all the rays walk together: every step tests
+    the pairs of a ray and a node it has entered with :func:`slab_test`,
+    replaces the interior nodes by their children and tests the primitives
+    of the leaves, which shortens the rays before the next step. Smaller
+    scenes test every ray against every primitive, which takes fewer NumPy
+    calls than the steps of the walk: on batches of 1000 to 4000 rays the
+    walk only wins from about 32 spheres on.
+
+    Attributes:
+        max_depth: Maximum number of ray bounces into scene.
+        background: The background color.
+        roulette_depth: The number of bounces after which paths are ended by
+            Russian roulette, or ``None``.
+        light_sampling: Light the diffuse hits directly from the
+            :class:`DiffuseLight` shapes, with multiple importance sampling.
+        chunk_size: The upper bound of ray-primitive pairs tested in one
+            NumPy operation, which bounds the temporary memory.
+        min_bvh_size: The number of primitives from which the rays are
+            traced through a :class:`FlatBVH`.
+        materials: The distinct materials of the scene. The primitive arrays
+            refer to them by index.
+
+    '''
+
+    def __init__(self, world: "Hittable", max_depth: int,
+                 background: "Color", roulette_depth: Optional[int] = None,
+                 light_sampling: bool = False,
+                 chunk_size: int = 1 << 20,
+                 min_bvh_size: int = MIN_BVH_SIZE) -> None:
+        self.max_depth = max_depth
+        self.roulette_depth = roulette_depth
+        self.light_sampling = light_sampling
+        self.background = np.array([background.x, background.y,
+                                    background.z])
+        self.chunk_size = chunk_size
+        self.min_bvh_size = min_bvh_size
+        self.materials: List["Material"] = list()
+        self._material_ids: Dict[int, int] = dict()
+
+        spheres = list()
+        quads = list()
+        for prim in world.primitives():
+            if isinstance(prim, Sphere):
+                spheres.append(prim)
+            elif isinstance(prim, Quad):
+                quads.append(prim)
+            else:
+                raise RuntimeError(f"Unsupported hittable {prim!r}")
+        self._build_spheres(spheres)
+        self._build_quads(quads)
+        self._build_bvh(spheres + quads)
+        self._build_materials()
+        self._build_lights()
+
+    def _material_id(self, mat: "Material") -> int:
+        key = id(mat)
+        if key not in self._material_ids:
+            self._material_ids[key] = len(self.materials)
+            self.materials.append(mat)
+        return self._material_ids[key]
+
+    def _build_spheres(self, spheres: List["Sphere"]) -> None:
+        self.sphere_center = _points([s.center1 for s in spheres])
+        self.sphere_motion = _points([s.center_vec if s.is_moving
+                                      else Color(0, 0, 0) for s in spheres])
+        self.sphere_radius = np.array([s.radius for s in spheres],
+                                      dtype=float)
+        self.sphere_mat = np.array([self._material_id(s.mat)
+                                    for s in spheres], dtype=np.int64)
+
+    def _build_quads(self, quads: List["Quad"]) -> None:
+        self.quad_q = _points([q.q for q in quads])
+        self.quad_u = _points([q.u for q in quads])
+        self.quad_v = _points([q.v for q in quads])
+        self.quad_w = _points([q.w for q in quads])
+        self.quad_normal = _points([q.normal for q in quads])
+        self.quad_vw = np.cross(self.quad_v, self.quad_w)
+        self.quad_wu = np.cross(self.quad_w, self.quad_u)
+        self.quad_d = np.array([q.d for q in quads], dtype=float)
+        self.quad_area = np.array([q.area for q in quads], dtype=float)
+        self.quad_mat = np.array([self._material_id(q.mat) for q in quads],
+                                 dtype=np.int64)
+
+    def _build_bvh(self, prims: List["Hittable"]) -> None:
+        # The primitives are numbered with the spheres first, then the quads.
+        if len(prims) < self.min_bvh_size:
+            self.bvh = None
+            return
+        self.bvh = FlatBVH(objects=prims, max_leaf_size=4, strategy='sah')
+        index = {id(prim): k for k, prim in enumerate(prims)}
+        self.node_bounds = np.array(self.bvh.bounds,
+                                    dtype=float).reshape(-1, 6)
+        self.node_offsets = np.array(self.bvh.offsets, dtype=np.int64)
+        self.node_counts = np.array(self.bvh.counts, dtype=np.int64)
+        self.leaf_prims = np.array([index[id(prim)]
+                                    for prim in self.bvh.objects],
+                                   dtype=np.int64)
+
+    def _build_materials(self) -> None:
+        kinds = list()
+        for mat in self.materials:
+            if isinstance(mat, Lambertian):
+                kinds.append(MAT_LAMBERTIAN)
+            elif isinstance(mat, Metal):
+                kinds.append(MAT_METAL)
+            elif isinstance(mat, Dielectric):
+                kinds.append(MAT_DIELECTRIC)
+            elif isinstance(mat, DiffuseLight):
+                kinds.append(MAT_LIGHT)
+            elif type(mat) is Material:
+                kinds.append(MAT_NONE)
+            else:
+                raise RuntimeError(f"Unsupported material {mat!r}")
+        self.material_kind = np.array(kinds, dtype=np.int64)
+
+    def _build_lights(self) -> None:
+        # The lights are the spheres then the quads of a light material.
+        if self.light_sampling:
+            self.light_spheres = np.flatnonzero(
+                self.material_kind[self.sphere_mat] == MAT_LIGHT)
+            self.light_quads = np.flatnonzero(
+                self.material_kind[self.quad_mat] == MAT_LIGHT)
+        else:
+            self.light_spheres = np.zeros(0, dtype=np.int64)
+            self.light_quads = np.zeros(0, dtype=np.int64)
+        self.light_count = len(self.light_spheres) + len(self.light_quads)
+
+    def render_band(self, camera: Any, start: int, end: int,
+                    first_sample: int = 0, last_sample: Optional[int] = None,
+                    adaptive: bool = False) -> \
+            Tuple["np.ndarray", "np.ndarray", int]:
+        '''
+        Render the samples from :arg:`first_sample` to :arg:`last_sample` of
+        the scanlines from :arg:`start` to :arg:`end`.
+
+        Args:
+            camera: The initialized :class:`Camera`.
+            start: The first scanline.
+            end: The scanline after the last one.
+            first_sample: The first sample index.
+            last_sample: The sample index after the last one, by default
+                ``samples_per_pixel``.
+            adaptive: Stop sampling the converged pixels early, following the
+                adaptive settings of the camera.
+
+        Returns:
+            np.ndarray: The summed linear colors in the shape of
+                ``(end - start, image_width, 3)``.
+            np.ndarray: The sample count of every pixel.
+            int: The number of rays traced.
+
+        '''
+        if last_sample is None:
+            last_sample = camera.samples_per_pixel
+        width = camera.image_width
+        pixel_count = (end - start) * width
+        sums = np.zeros((pixel_count, 3))
+        counts = np.zeros(pixel_count, dtype=np.int64)
+        lum_sum = np.zeros(pixel_count)
+        lum_sq = np.zeros(pixel_count)
+        active = np.arange(pixel_count)
+        rays = 0
+
+        sample = first_sample
+        while sample < last_sample and len(active):
+            stop = last_sample if not adaptive else \
+                min(last_sample,
+                    max(camera.min_samples, sample + camera.adaptive_step))
+            radiance, pix, traced = self._trace_samples(
+                camera, start, active, sample, stop)
+            rays += traced
+            np.add.at(sums, pix, radiance)
+            counts[active] += stop - sample
+            sample = stop
+            if adaptive:
+                lum = radiance @ np.array([0.2126, 0.7152, 0.0722])
+                np.add.at(lum_sum, pix, lum)
+                np.add.at(lum_sq, pix, lum * lum)
+                n = counts[active]
+                mean = lum_sum[active] / n
+                variance = np.maximum(
+                    0.0, lum_sq[active] - lum_sum[active] * mean) / \
+                    np.maximum(n - 1, 1)
+                converged = (n >= 2) & (np.sqrt(variance / n) <=
+                                        camera.adaptive_threshold *
+                                        np.maximum(mean, 1e-3))
+                active = active[~converged]
+
+        return sums.reshape(end - start, width, 3), \
+            counts.reshape(end - start, width), rays
+
+    def _trace_samples(self, camera: Any, start: int, pixels: "np.ndarray",
+                       first_sample: int, last_sample: int) -> \
+            Tuple["np.ndarray", "np.ndarray", int]:
+        '''
+        Trace the samples from :arg:`first_sample` to :arg:`last_sample` of
+        the given pixels of the band, and return the radiance of every sample
+        with the pixel it belongs to.
+
+        '''
+        spp = last_sample - first_sample
+        pix = np.repeat(pixels, spp)
+        generator = camera._ray_generator
+        directions, times, keys = generator.rays(
+            pix + start * camera.image_width,
+            np.tile(np.arange(first_sample, last_sample), len(pixels)))
+        origins = np.broadcast_to(generator.center, (len(pix), 3)).copy()
+
+        radiance, rays = self.trace(origins, directions, times,
+                                    np.arange(len(pix)), keys, len(pix))
+        return radiance, pix, rays
+
+    def trace(self, origins: "np.ndarray", directions: "np.ndarray",
+              times: "np.ndarray", pix: "np.ndarray", keys: "np.ndarray",
+              pixel_count: int) -> Tuple["np.ndarray", int]:
+        '''
+        Trace a batch of rays and accumulate their radiance.
+
+        Args:
+            origins: The ``(n, 3)`` ray origins.
+            directions: The ``(n, 3)`` ray directions.
+            times: The ``(n,)`` ray times.
+            pix: The ``(n,)`` pixel index every ray contributes to.
+            keys: The ``(n,)`` :class:`Sampler` stream keys of the rays. The
+                first three numbers of a stream belong to the camera, and
+                every bounce takes the next eight: two for the scattered
+                direction, one for the dielectric, one for the Russian
+                roulette and three for the light sample.
+            pixel_count: The size of the accumulation buffer.
+
+        Returns:
+            np.ndarray: The ``(pixel_count, 3)`` summed radiance.
+            int: The number of rays traced over all bounces.
+
+        '''
+        radiance = np.zeros((pixel_count, 3))
+        throughput = np.ones((len(pix), 3))
+        # The density of the direction of every ray and where it starts,
+        # for weighing the lights it finds against the light samples.
+        scattering_pdf = np.zeros(len(pix))
+        rays = 0
+
+        for depth in range(self.max_depth):
+            if len(pix) == 0:
+                break
+            rays += len(pix)
+            counter = 4 + 8 * depth
+            t, sphere_idx, quad_idx = self._intersect(origins, directions,
+                                                      times)
+            missed = (sphere_idx < 0) & (quad_idx < 0)
+            np.add.at(radiance, pix[missed],
+                      throughput[missed] * self.background)
+
+            hit = ~missed
+            origins, directions, times = \
+                origins[hit], directions[hit], times[hit]
+            pix, throughput, t = pix[hit], throughput[hit], t[hit]
+            keys, scattering_pdf = keys[hit], scattering_pdf[hit]
+            sphere_idx, quad_idx = sphere_idx[hit], quad_idx[hit]
+
+            p, normal, front_face, u, v, mat = self._shade(
+                origins, directions, times, t, sphere_idx, quad_idx)
+            kind = self.material_kind[mat]
+
+            emitting = kind == MAT_LIGHT
+            if emitting.any():
+                emitted = self._material_color(
+                    mat[emitting], u[emitting], v[emitting], p[emitting])
+                weight = np.ones(len(emitted))
+                mis = scattering_pdf[emitting] > 0
+                if mis.any():
+                    # The light sample of the last bounce could have found
+                    # these lights too.
+                    pdf = scattering_pdf[emitting][mis]
+                    light_pdf = self._light_pdf(
+                        origins[emitting][mis], directions[emitting][mis],
+                        times[emitting][mis])
+                    weight[mis] = pdf * pdf / (pdf * pdf +
+                                               light_pdf * light_pdf)
+                np.add.at(radiance, pix[emitting],
+                          throughput[emitting] * emitted * weight[:, None])
+
+            new_dirs = np.zeros_like(directions)
+            new_pdf = np.zeros(len(pix))
+            attenuation = np.ones_like(throughput)
+            alive = np.zeros(len(pix), dtype=bool)
+
+            sel = kind == MAT_LAMBERTIAN
+            if sel.any():
+                scatter = normal[sel] + \
+                    _random_unit_vectors(keys[sel], counter)
+                degenerate = np.all(np.abs(scatter) < 1e-8, axis=1)
+                scatter[degenerate] = normal[sel][degenerate]
+                new_dirs[sel] = scatter
+                attenuation[sel] = self._material_color(
+                    mat[sel], u[sel], v[sel], p[sel])
+                alive[sel] = True
+                if self.light_count:
+                    # The scatter directions follow the cosine to the normal.
+                    new_pdf[sel] = np.maximum(
+                        0.0, _dot(normal[sel], _unit(scatter))) / PI
+                    direct, traced = self._direct_light(
+                        p[sel], normal[sel], times[sel], keys[sel],
+                        counter + 4)
+                    rays += traced
+                    np.add.at(radiance, pix[sel],
+                              throughput[sel] * attenuation[sel] * direct)
+
+            sel = kind == MAT_METAL
+            if sel.any():
+                n_sel = normal[sel]
+                reflected = _unit(_reflect(directions[sel], n_sel))
+                fuzz = np.array([self.materials[m].fuzz for m in mat[sel]])
+                reflected += fuzz[:, None] * \
+                    _random_unit_vectors(keys[sel], counter)
+                new_dirs[sel] = reflected
+                attenuation[sel] = self._material_color(
+                    mat[sel], u[sel], v[sel], p[sel])
+                alive[sel] = _dot(reflected, n_sel) > 0
+
+            sel = kind == MAT_DIELECTRIC
+            if sel.any():
+                n_sel = normal[sel]
+                index = np.array([self.materials[m].refraction_index
+                                  for m in mat[sel]])
+                ri = np.where(front_face[sel], 1.0 / index, index)
+                unit_direction = _unit(directions[sel])
+                cos_theta = np.minimum(_dot(-unit_direction, n_sel), 1.0)
+                sin_theta = np.sqrt(1.0 - cos_theta * cos_theta)
+                r0 = ((1 - ri) / (1 + ri)) ** 2
+                reflectance = r0 + (1 - r0) * (1 - cos_theta) ** 5
+                reflect = (ri * sin_theta > 1.0) | \
+                    (reflectance > Sampler.uniform(keys[sel], counter + 2))
+                r_out_prep = ri[:, None] * \
+                    (unit_direction + cos_theta[:, None] * n_sel)
+                r_out_parallel = -np.sqrt(np.abs(
+                    1.0 - _dot(r_out_prep, r_out_prep)))[:, None] * n_sel
+                new_dirs[sel] = np.where(
+                    reflect[:, None], _reflect(unit_direction, n_sel),
+                    r_out_prep + r_out_parallel)
+                alive[sel] = True
+
+            # Compact the buffers so the next bounce only sees live paths.
+            origins = p[alive]
+            directions = new_dirs[alive]
+            times = times[alive]
+            pix = pix[alive]
+            keys = keys[alive]
+            scattering_pdf = new_pdf[alive]
+            throughput = throughput[alive] * attenuation[alive]
+
+            if self.roulette_depth is not None and \
+                    depth + 1 >= self.roulette_depth:
+                survival = np.minimum(1.0, throughput.max(axis=1))
+                live = Sampler.uniform(keys, counter + 3) < survival
+                origins, directions, times = \
+                    origins[live], directions[live], times[live]
+                pix, keys = pix[live], keys[live]
+                scattering_pdf = scattering_pdf[live]
+                throughput = throughput[live] / survival[live][:, None]
+
+        return radiance, rays
+
+    def _direct_light(self, p: "np.ndarray", normal: "np.ndarray",
+                      times: "np.ndarray", keys: "np.ndarray",
+                      counter: int) -> Tuple["np.ndarray", int]:
+        '''
+        Sample one light from every diffuse hit.
+
+        Returns:
+            np.ndarray: The ``(n, 3)`` light reaching the hits, weighted by
+                the scattering density and by multiple importance sampling,
+                to be scaled by the attenuation.
+            int: The number of shadow rays traced.
+
+        '''
+        n = len(p)
+        n_spheres = len(self.light_spheres)
+        choice = np.minimum(
+            (Sampler.uniform(keys, counter) * self.light_count)
+            .astype(np.int64), self.light_count - 1)
+        r1 = Sampler.uniform(keys, counter + 1)
+        r2 = Sampler.uniform(keys, counter + 2)
+        directions = np.empty((n, 3))
+        sel = choice < n_spheres
+        if sel.any():
+            directions[sel] = self._sample_spheres(
+                self.light_spheres[choice[sel]], p[sel], times[sel],
+                r1[sel], r2[sel])
+        sel = ~sel
+        if sel.any():
+            q = self.light_quads[choice[sel] - n_spheres]
+            directions[sel] = self.quad_q[q] + r1[sel, None] * \
+                self.quad_u[q] + r2[sel, None] * self.quad_v[q] - p[sel]
+
+        scattering_pdf = np.maximum(
+            0.0, _dot(normal, _unit(directions))) / PI
+        light_pdf = self._light_pdf(p, directions, times)
+        direct = np.zeros((n, 3))
+        shadow = np.flatnonzero((scattering_pdf > 0) & (light_pdf > 0))
+        if len(shadow) == 0:
+            return direct, 0
+
+        origins, directions, times = \
+            p[shadow], directions[shadow], times[shadow]
+        t, sphere_idx, quad_idx = self._intersect(origins, directions, times)
+        hit = (sphere_idx >= 0) | (quad_idx >= 0)
+        shadow = shadow[hit]
+        hit_p, _, _, u, v, mat = self._shade(
+            origins[hit], directions[hit], times[hit], t[hit],
+            sphere_idx[hit], quad_idx[hit])
+        emitting = self.material_kind[mat] == MAT_LIGHT
+        shadow = shadow[emitting]
+        pdf = scattering_pdf[shadow]
+        light = light_pdf[shadow]
+        weight = pdf / light * (light * light / (light * light + pdf * pdf))
+        direct[shadow] = self._material_color(
+            mat[emitting], u[emitting], v[emitting], hit_p[emitting]) * \
+            weight[:, None]
+        return direct, len(origins)
+
+    def _sample_spheres(self, s: "np.ndarray", origins: "np.ndarray",
+                        times: "np.ndarray", r1: "np.ndarray",
+                        r2: "np.ndarray") -> "np.ndarray":
+        '''The batched :meth:`Sphere.random`.'''
+        centers = self.sphere_center[s] + \
+            times[:, None] * self.sphere_motion[s]
+        cos_theta_max = self._cos_theta_max(centers - origins,
+                                            self.sphere_radius[s])
+        z = 1 + r1 * (cos_theta_max - 1)
+        phi = 2 * PI * r2
+        r = np.sqrt(np.maximum(0.0, 1 - z * z))
+        w = _unit(centers - origins)
+        a = np.where((np.abs(w[:, 0]) > 0.9)[:, None],
+                     np.array([0.0, 1.0, 0.0]), np.array([1.0, 0.0, 0.0]))
+        v = _unit(np.cross(w, a))
+        u = np.cross(w, v)
+        return (r * np.cos(phi))[:, None] * u + \
+            (r * np.sin(phi))[:, None] * v + z[:, None] * w
+
+    @staticmethod
+    def _cos_theta_max(to_center: "np.ndarray", radius: "np.ndarray") -> \
+            "np.ndarray":
+        distance_squared = _dot(to_center, to_center)
+        inside = distance_squared <= radius * radius
+        # Seen from inside, the sphere covers every direction.
+        return np.where(inside, -1.0, np.sqrt(np.maximum(
+            0.0, 1 - radius * radius / np.where(inside, 1.0,
+                                                distance_squared))))
+
+    def _light_pdf(self, origins: "np.ndarray", directions: "np.ndarray",
+                   times: "np.ndarray") -> "np.ndarray":
+        '''The density of :meth:`_direct_light` choosing the directions.'''
+        total = np.zeros(len(origins))
+        a = _dot(directions, directions)
+        for s in self.light_spheres:
+            center = self.sphere_center[s] + \
+                times[:, None] * self.sphere_motion[s]
+            oc = origins - center
+            half_b = _dot(oc, directions)
+            c = _dot(oc, oc) - self.sphere_radius[s] ** 2
+            discriminant = half_b * half_b - a * c
+            sqrtd = np.sqrt(np.maximum(discriminant, 0))
+            hit = (discriminant >= 0) & (((-half_b - sqrtd) / a > 0.001) |
+                                         ((-half_b + sqrtd) / a > 0.001))
+            cos_theta_max = self._cos_theta_max(
+                -oc, np.full(len(oc), self.sphere_radius[s]))
+            total += np.where(hit, 1 / (2 * PI * (1 - cos_theta_max)), 0.0)
+        for q in self.light_quads:
+            normal = self.quad_normal[q]
+            denom = directions @ normal
+            safe = np.where(np.abs(denom) < 1e-8, 1.0, denom)
+            t = (self.quad_d[q] - origins @ normal) / safe
+            planar = origins + t[:, None] * directions - self.quad_q[q]
+            alpha = np.cross(planar, self.quad_v[q]) @ self.quad_w[q]
+            beta = np.cross(self.quad_u[q], planar) @ self.quad_w[q]
+            hit = (np.abs(denom) >= 1e-8) & (t >= 0.001) & \
+                (alpha >= 0) & (alpha <= 1) & (beta >= 0) & (beta <= 1)
+            cosine = np.abs(denom) / np.sqrt(a)
+            total += np.where(hit, t * t * a / (cosine * self.quad_area[q]),
+                              0.0)
+        return total / self.light_count
+
+    def _intersect(self, origins: "np.ndarray", directions: "np.ndarray",
+                   times: "np.ndarray") -> \
+            Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        '''
+        Find the closest hit of every ray.
+
+        Returns:
+            np.ndarray: The ``t`` of the hits, ``INFINITY`` for a miss.
+            np.ndarray: The sphere hit, or ``-1``.
+            np.ndarray: The quad hit, or ``-1``.
+
+        '''
+        if self.bvh is not None:
+            return self._traverse(origins, directions, times)
+        n = len(origins)
+        closest = np.full(n, INFINITY)
+        sphere_idx = np.full(n, -1, dtype=np.int64)
+        quad_idx = np.full(n, -1, dtype=np.int64)
+        t_min = 0.001
+
+        a = _dot(directions, directions)
+        step = max(1, self.chunk_size // max(n, 1))
+        for first in range(0, len(self.sphere_radius), step):
+            last = first + step
+            centers = self.sphere_center[None, first:last] + \
+                times[:, None, None] * self.sphere_motion[None, first:last]
+            oc = origins[:, None, :] - centers
+            half_b = np.einsum('nsk,nk->ns', oc, directions)
+            c = np.einsum('nsk,nsk->ns', oc, oc) - \
+                self.sphere_radius[None, first:last] ** 2
+            discriminant = half_b * half_b - a[:, None] * c
+            sqrtd = np.sqrt(np.maximum(discriminant, 0))
+            upper = closest[:, None]
+            root = (-half_b - sqrtd) / a[:, None]
+            valid = (root > t_min) & (root < upper)
+            far = (-half_b + sqrtd) / a[:, None]
+            root = np.where(valid, root, far)
+            valid = (discriminant >= 0) & (root > t_min) & (root < upper)
+            root = np.where(valid, root, INFINITY)
+            best = np.argmin(root, axis=1)
+            best_t = root[np.arange(n), best]
+            closer = best_t < closest
+            closest[closer] = best_t[closer]
+            sphere_idx[closer] = best[closer] + first
+
+        for first in range(0, len(self.quad_d), step):
+            last = first + step
+            normal = self.quad_normal[first:last]
+            denom = directions @ normal.T
+            safe = np.where(np.abs(denom) < 1e-8, 1.0, denom)
+            t = (self.quad_d[None, first:last] - origins @ normal.T) / safe
+            valid = (np.abs(denom) >= 1e-8) & (t >= t_min) & \
+                (t <= closest[:, None])
+            planar = origins[:, None, :] + t[:, :, None] * \
+                directions[:, None, :] - self.quad_q[None, first:last]
+            alpha = np.einsum('sk,nsk->ns', self.quad_w[first:last],
+                              np.cross(planar, self.quad_v[None, first:last]))
+            beta = np.einsum('sk,nsk->ns', self.quad_w[first:last],
+                             np.cross(self.quad_u[None, first:last], planar))
+            valid &= (alpha >= 0) & (alpha <= 1) & (beta >= 0) & (beta <= 1)
+            t = np.where(valid, t, INFINITY)
+            best = np.argmin(t, axis=1)
+            best_t = t[np.arange(n), best]
+            closer = best_t < closest
+            closest[closer] = best_t[closer]
+            quad_idx[closer] = best[closer] + first
+            sphere_idx[closer] = -1
+
+        return closest, sphere_idx, quad_idx
+
+    def _traverse(self, origins: "np.ndarray", directions: "np.ndarray",
+                  times: "np.ndarray") -> \
+            Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        '''The :meth:`_intersect` of a scene in a :class:`FlatBVH`.'''
+        n = len(origins)
+        closest = np.full(n, INFINITY)
+        prim = np.full(n, -1, dtype=np.int64)
+        t_min = 0.001
+        with np.errstate(divide='ignore'):
+            inv_dirs = 1.0 / directions
+
+        # The pairs of a ray and a node whose box is still to be tested.
+        rays = np.arange(n)
+        nodes = np.zeros(n, dtype=np.int64)
+        while len(rays):
+            t_enter, t_exit = slab_test(self.node_bounds[nodes],
+                                        origins[rays], inv_dirs[rays], t_min)
+            entered = t_enter < np.minimum(t_exit, closest[rays])
+            rays, nodes = rays[entered], nodes[entered]
+
+            counts = self.node_counts[nodes]
+            leaf = counts > 0
+            if leaf.any():
+                # One pair for every primitive of the leaves entered.
+                counts = counts[leaf]
+                firsts = np.repeat(self.node_offsets[nodes[leaf]] -
+                                   np.cumsum(counts) + counts, counts)
+                self._hit_pairs(
+                    np.repeat(rays[leaf], counts),
+                    self.leaf_prims[firsts + np.arange(len(firsts))],
+                    origins, directions, times, closest, prim)
+
+            inner = ~leaf
+            rays = np.concatenate([rays[inner], rays[inner]])
+            nodes = np.concatenate([nodes[inner] + 1,
+                                    self.node_offsets[nodes[inner]]])
+
+        n_spheres = len(self.sphere_radius)
+        on_sphere = (prim >= 0) & (prim < n_spheres)
+        sphere_idx = np.where(on_sphere, prim, -1)
+        quad_idx = np.where(prim >= n_spheres, prim - n_spheres, -1)
+        return closest, sphere_idx, quad_idx
+
+    def _hit_pairs(self, rays: "np.ndarray", prims: "np.ndarray",
+                   origins: "np.ndarray", directions: "np.ndarray",
+                   times: "np.ndarray", closest: "np.ndarray",
+                   prim: "np.ndarray") -> None:
+        '''
+        Test every ray of :arg:`rays` against the primitive next to it in
+        :arg:`prims`, and move :arg:`closest` and :arg:`prim` of the rays
+        to the closer hits.
+
+        '''
+        t_min = 0.001
+        t = np.full(len(rays), INFINITY)
+        upper = closest[rays]
+        o, d = origins[rays], directions[rays]
+
+        n_spheres = len(self.sphere_radius)
+        sel = prims < n_spheres
+        if sel.any():
+            s = prims[sel]
+            d_sel = d[sel]
+            centers = self.sphere_center[s] + \
+                times[rays[sel], None] * self.sphere_motion[s]
+            oc = o[sel] - centers
+            a = _dot(d_sel, d_sel)
+            half_b = _dot(oc, d_sel)
+            c = _dot(oc, oc) - self.sphere_radius[s] ** 2
+            discriminant = half_b * half_b - a * c
+            sqrtd = np.sqrt(np.maximum(discriminant, 0))
+            root = (-half_b - sqrtd) / a
+            valid = (root > t_min) & (root < upper[sel])
+            root = np.where(valid, root, (-half_b + sqrtd) / a)
+            valid = (discriminant >= 0) & (root > t_min) & \
+                (root < upper[sel])
+            t[sel] = np.where(valid, root, INFINITY)
+
+        sel = ~sel
+        if sel.any():
+            q = prims[sel] - n_spheres
+            o_sel, d_sel = o[sel], d[sel]
+            normal = self.quad_normal[q]
+            denom = _dot(d_sel, normal)
+            safe = np.where(np.abs(denom) < 1e-8, 1.0, denom)
+            t_q = (self.quad_d[q] - _dot(o_sel, normal)) / safe
+            planar = o_sel + t_q[:, None] * d_sel - self.quad_q[q]
+            # w . (p x v) = p . (v x w) and w . (u x p) = p . (w x u).
+            alpha = _dot(planar, self.quad_vw[q])
+            beta = _dot(planar, self.quad_wu[q])
+            valid = (np.abs(denom) >= 1e-8) & (t_q >= t_min) & \
+                (t_q <= upper[sel]) & (alpha >= 0) & (alpha <= 1) & \
+                (beta >= 0) & (beta <= 1)
+            t[sel] = np.where(valid, t_q, INFINITY)
+
+        np.minimum.at(closest, rays, t)
+        won = (t < INFINITY) & (t == closest[rays])
+        prim[rays[won]] = prims[won]
+
+    def _shade(self, origins: "np.ndarray", directions: "np.ndarray",
+               times: "np.ndarray", t: "np.ndarray",
+               sphere_idx: "np.ndarray", quad_idx: "np.ndarray") -> \
+            Tuple["np.ndarray", ...]:
+        p = origins + t[:, None] * directions
+        n = len(t)
+        outward = np.zeros((n, 3))
+        u = np.zeros(n)
+        v = np.zeros(n)
+        mat = np.zeros(n, dtype=np.int64)
+
+        on_sphere = sphere_idx >= 0
+        if on_sphere.any():
+            s = sphere_idx[on_sphere]
+            centers = self.sphere_center[s] + \
+                times[on_sphere, None] * self.sphere_motion[s]
+            normal = (p[on_sphere] - centers) / self.sphere_radius[s, None]
+            outward[on_sphere] = normal
+            theta = np.arccos(np.clip(-normal[:, 1], -1.0, 1.0))
+            phi = np.arctan2(-normal[:, 2], normal[:, 0]) + PI
+            u[on_sphere] = phi / (2 * PI)
+            v[on_sphere] = theta / PI
+            mat[on_sphere] = self.sphere_mat[s]
+
+        on_quad = ~on_sphere
+        if on_quad.any():
+            q = quad_idx[on_quad]
+            planar = p[on_quad] - self.quad_q[q]
+            outward[on_quad] = self.quad_normal[q]
+            u[on_quad] = _dot(self.quad_w[q], np.cross(planar,
+                                                       self.quad_v[q]))
+            v[on_quad] = _dot(self.quad_w[q], np.cross(self.quad_u[q],
+                                                       planar))
+            mat[on_quad] = self.quad_mat[q]
+
+        front_face = _dot(directions, outward) < 0
+        normal = np.where(front_face[:, None], outward, -outward)
+        return p, normal, front_face, u, v, mat
+
+    def _material_color(self, mat: "np.ndarray", u: "np.ndarray",
+                        v: "np.ndarray", p: "np.ndarray") -> "np.ndarray":
+        '''
+        Evaluate the albedo, or the emission of lights, for every hit.
+
+        '''
+        colors = np.zeros((len(mat), 3))
+        for m in np.unique(mat):
+            sel = mat == m
+            material = self.materials[m]
+            if isinstance(material, Metal):
+                colors[sel] = _point(material.albedo)
+            else:
+                colors[sel] = _texture_values(material.tex, u[sel], v[sel],
+                                              p[sel])
+        return colors
+
+
+def _texture_values(tex: "Texture", u: "np.ndarray", v: "np.ndarray",
+                    p: "np.ndarray") -> "np.ndarray":
+    if isinstance(tex, SolidColor):
+        return np.broadcast_to(_point(tex.albedo), (len(u), 3))
+    if isinstance(tex, CheckerTexture):
+        cells = np.floor(tex.inv_scale * p).astype(np.int64).sum(axis=1)
+        is_even = cells % 2 == 0
+        colors = np.empty((len(u), 3))
+        if is_even.any():
+            colors[is_even] = _texture_values(tex.even, u[is_even],
+                                              v[is_even], p[is_even])
+        if (~is_even).any():
+            colors[~is_even] = _texture_values(tex.odd, u[~is_even],
+                                               v[~is_even], p[~is_even])
+        return colors
+    if isinstance(tex, NoiseTexture):
+        return tex.values(p)
+    if isinstance(tex, ImageTexture):
+        return tex.values(u, v)
+    # Any other texture is evaluated point by point.
+    colors = [tex.value(uu, vv, Color(*pp))
+              for uu, vv, pp in zip(u.tolist(), v.tolist(), p.tolist())]
+    return np.array([[c.x, c.y, c.z] for c in colors]).reshape(-1, 3)
+
+
+def _random_unit_vectors(keys: "np.ndarray", counter: int) -> "np.ndarray":
+    z = 1 - 2 * Sampler.uniform(keys, counter)
+    r = np.sqrt(np.maximum(0, 1 - z * z))
+    phi = 2 * PI * Sampler.uniform(keys, counter + 1)
+    return np.stack([r * np.cos(phi), r * np.sin(phi), z], axis=1)
+
+
+def _reflect(v: "np.ndarray", n: "np.ndarray") -> "np.ndarray":
+    return v - 2 * _dot(v, n)[:, None] * n
+
+
+def _unit(v: "np.ndarray") -> "np.ndarray":
+    return v / np.linalg.norm(v, axis=1)[:, None]
+
+
+def _dot(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    return np.einsum('nk,nk->n', a, b)
+
+
+def _point(p: "Color") -> "np.ndarray":
+    return np.array([p.x, p.y, p.z], dtype=float)
+
+
+def _points(points: List["Color"]) -> "np.ndarray":
+    return np.array([[p.x, p.y, p.z] for p in points],
+                    dtype=float).reshape(-1, 3)
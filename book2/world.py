@@ -1,6 +1,7 @@
 from typing import List, Tuple
 from aabb import AABB
-from hittable import HitRecord, Hittable
+from constants import INFINITY
+from hittable import Hittable
 from interval import Interval
 from ray import Ray
 
@@ -36,21 +37,29 @@ class World(Hittable):
     def clear(self) -> None:
         self.objects.clear()
 
-    def hit(self, ray: Ray, interval: "Interval") -> \
-            Tuple[bool, HitRecord | None]:
-        '''Detect if the objects in the world are hittable respectively.'''
-        hit_anything = False
-        return_rec = None
-        closest_so_far = interval.max
-
+    def intersect(self, ray: Ray, interval: "Interval") -> \
+            Tuple[float, Hittable | None]:
+        '''Find the closest of the objects in the world hit by the ray.'''
+        closest = INFINITY
+        closest_prim = None
+        # The interval is private, so it is narrowed in place as closer hits
+        # are found.
+        bounds = Interval(interval.min, interval.max)
         for obj in self.objects:
-            hit, rec = obj.hit(ray, Interval(interval.min, closest_so_far))
-            if hit:
-                hit_anything = True
-                closest_so_far = rec.t
-                return_rec = rec
+            t, prim = obj.intersect(ray, bounds)
+            if prim is not None:
+                closest = bounds.max = t
+                closest_prim = prim
+        return closest, closest_prim
 
-        return (hit_anything, return_rec)
+    def occluded(self, ray: Ray, interval: "Interval") -> bool:
+        for obj in self.objects:
+            if obj.occluded(ray, interval):
+                return True
+        return False
 
     def bounding_box(self) -> AABB:
         return self.bbox
+
+    def primitives(self) -> List[Hittable]:
+        return [prim for obj in self.objects for prim in obj.primitives()]